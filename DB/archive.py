@@ -0,0 +1,188 @@
+"""
+DB/archive.py
+
+Hot/cold partitioning for cyber_incidents and it_tickets.
+
+Dashboards and services work on open and in-progress records, but closed
+ones pile up forever and every query scans them. archive_closed() moves
+records whose status is Resolved/Closed and whose closing date (or,
+failing that, opening date) is older than the retention window into
+<table>_archive. The rows keep their id and gain an archived_at stamp.
+
+- The hot tables stay small; all service queries keep using them.
+- <table>_all views (hot UNION ALL archive) serve historical analytics.
+- Rows are moved in batches; each batch is copied and deleted in one
+  transaction, so a record is never in both partitions or in neither.
+
+Usage:
+    python -m DB.archive                    # default retention window
+    python -m DB.archive --retention-days 30 --dry-run
+"""
+
+import argparse
+import os
+from datetime import date, datetime, timedelta
+
+from DB.db import DatabaseManager, domain_for
+from DB.crud import ARCHIVE_TABLES, DATE_COLUMNS, KEY_COLUMNS, TABLE_COLUMNS
+
+RETENTION_DAYS = int(os.getenv("ARCHIVE_RETENTION_DAYS", "90"))
+ARCHIVED_STATUSES = ("Resolved", "Closed")
+BATCH_SIZE = 1000
+
+# table -> (closing date, opening date); a record's age is taken from the
+# closing date when it has one
+AGE_COLUMNS = {
+    "cyber_incidents": ("resolved_at", "reported_at"),
+    "it_tickets": ("closed_at", "opened_at"),
+}
+
+
+def view_name(table: str) -> str:
+    return f"{table}_all"
+
+
+def ensure_archive_tables(db: DatabaseManager):
+    """Create the archive tables, their indexes and the union views."""
+    c = db.cursor()
+    for table, archive in ARCHIVE_TABLES.items():
+        c.execute(f"PRAGMA table_info({table})")
+        info = c.fetchall()
+        if not info:
+            continue
+
+        # same columns as the hot table; ids are copied, not generated
+        defs = [
+            "id INTEGER PRIMARY KEY" if col["name"] == "id" else f"{col['name']} {col['type']}"
+            for col in info
+        ]
+        c.execute(f"CREATE TABLE IF NOT EXISTS {archive} ({', '.join(defs)}, archived_at TEXT)")
+        columns = TABLE_COLUMNS[table]
+        key = KEY_COLUMNS[table]
+        c.execute(f"CREATE UNIQUE INDEX IF NOT EXISTS ux_{archive}_{key} ON {archive} ({key})")
+        for col in DATE_COLUMNS.get(table, ()):
+            c.execute(f"CREATE INDEX IF NOT EXISTS ix_{archive}_{col} ON {archive} ({col})")
+
+        cols = ", ".join(columns)
+        c.execute(f"""
+            CREATE VIEW IF NOT EXISTS {view_name(table)} AS
+            SELECT {cols} FROM {table}
+            UNION ALL
+            SELECT {cols} FROM {archive}
+        """)
+
+
+def cutoff_date(retention_days: int = RETENTION_DAYS, today: date = None) -> str:
+    return ((today or date.today()) - timedelta(days=retention_days)).isoformat()
+
+
+def _candidates_sql(table: str) -> str:
+    closed_col, opened_col = AGE_COLUMNS[table]
+    statuses = ", ".join("?" for _ in ARCHIVED_STATUSES)
+    return (
+        f"SELECT id, {KEY_COLUMNS[table]} FROM {table} "
+        f"WHERE status IN ({statuses}) AND coalesce({closed_col}, {opened_col}) < ? "
+        f"ORDER BY id LIMIT ?"
+    )
+
+
+def archive_closed(db: DatabaseManager, retention_days: int = RETENTION_DAYS, batch_size: int = BATCH_SIZE,
+                   dry_run: bool = False, on_batch=None, tables=None):
+    """
+    Move closed records older than the retention window to the archive.
+    Returns {table: number of rows moved} (or that would move, for
+    dry_run). on_batch(table, keys), if given, is called after each
+    committed batch with the business keys that left the hot table.
+    `tables` limits the run to some of ARCHIVE_TABLES (e.g. the ones in
+    db's file under the split storage layout).
+    """
+    ensure_archive_tables(db)
+    db.commit()
+    cutoff = cutoff_date(retention_days)
+    archived_at = datetime.now().isoformat(sep=" ", timespec="seconds")
+    moved = {}
+
+    c = db.cursor()
+    for table in tables or ARCHIVE_TABLES:
+        archive = ARCHIVE_TABLES[table]
+        moved[table] = 0
+        cols = ", ".join(TABLE_COLUMNS[table])
+        sql = _candidates_sql(table)
+
+        if dry_run:
+            closed_col, opened_col = AGE_COLUMNS[table]
+            c.execute(
+                f"SELECT COUNT(*) FROM {table} WHERE status IN ({', '.join('?' for _ in ARCHIVED_STATUSES)}) "
+                f"AND coalesce({closed_col}, {opened_col}) < ?",
+                (*ARCHIVED_STATUSES, cutoff),
+            )
+            moved[table] = c.fetchone()[0]
+            continue
+
+        while True:
+            c.execute(sql, (*ARCHIVED_STATUSES, cutoff, batch_size))
+            batch = c.fetchall()
+            if not batch:
+                break
+            ids = [r[0] for r in batch]
+            marks = ", ".join("?" for _ in ids)
+            c.execute(
+                f"INSERT OR REPLACE INTO {archive} ({cols}, archived_at) "
+                f"SELECT {cols}, ? FROM {table} WHERE id IN ({marks})",
+                [archived_at] + ids,
+            )
+            c.execute(f"DELETE FROM {table} WHERE id IN ({marks})", ids)
+            db.commit()
+            moved[table] += len(ids)
+            if on_batch is not None:
+                on_batch(table, [r[1] for r in batch])
+
+    return moved
+
+
+def restore(db: DatabaseManager, table: str, key):
+    """
+    Move one archived record back to the hot table (e.g. to reopen it).
+    Returns the restored row, or None if the key is not archived.
+    """
+    archive = ARCHIVE_TABLES[table]
+    cols = ", ".join(TABLE_COLUMNS[table])
+    key_col = KEY_COLUMNS[table]
+    c = db.cursor()
+    c.execute(
+        f"INSERT INTO {table} ({cols}) SELECT {cols} FROM {archive} WHERE {key_col} = ? RETURNING *",
+        (key,),
+    )
+    row = c.fetchone()
+    c.execute(f"DELETE FROM {archive} WHERE {key_col} = ?", (key,))
+    return row
+
+
+def partition_sizes(db: DatabaseManager, tables=None):
+    """[{table, hot_rows, archived_rows}] for the Admin page."""
+    ensure_archive_tables(db)
+    c = db.cursor()
+    sizes = []
+    for table in tables or ARCHIVE_TABLES:
+        archive = ARCHIVE_TABLES[table]
+        c.execute(f"SELECT COUNT(*) FROM {table}")
+        hot = c.fetchone()[0]
+        c.execute(f"SELECT COUNT(*) FROM {archive}")
+        sizes.append({"table": table, "hot_rows": hot, "archived_rows": c.fetchone()[0]})
+    return sizes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Archive closed incidents and tickets.")
+    parser.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+
+    result = {}
+    for table in ARCHIVE_TABLES:
+        with DatabaseManager(domain=domain_for(table)) as db:
+            result.update(archive_closed(db, args.retention_days, args.batch_size, args.dry_run, tables=[table]))
+    verb = "Would archive" if args.dry_run else "Archived"
+    for table, n in result.items():
+        print(f"{verb} {n} rows from {table} (closed before {cutoff_date(args.retention_days)})")
@@ -0,0 +1,235 @@
+"""
+DB/cdc.py
+
+Change-data capture for the three domain tables.
+
+Triggers on cyber_incidents, it_tickets and datasets_metadata append one
+row per insert / update / delete to change_log:
+
+    seq         increasing sequence number (the reader's cursor)
+    table_name  table that changed
+    op          "insert", "update" or "delete"
+    key         business key (DB.crud.KEY_COLUMNS)
+    changed_at  UTC timestamp
+
+Because the triggers fire for every writer (services, the CSV ingest,
+the archiver, another process), a dashboard that remembers the last seq
+it applied can ask for changes_since(seq) and patch its cache instead of
+reloading the table.
+
+The log is kept small by compact(): only the latest entry per key is
+needed to bring a reader up to date, and entries older than the
+retention window are dropped. A reader whose cursor is older than what
+was dropped gets reset=True and must reload in full, as does one whose
+position is past the end of the log (e.g. after a snapshot restore).
+
+Usage:
+    python -m DB.cdc                    # log size and current seq
+    python -m DB.cdc compact --retention-days 3
+"""
+
+import argparse
+import os
+import sqlite3
+from datetime import datetime, timedelta, timezone
+from typing import List, NamedTuple, Optional
+
+from DB.db import DatabaseManager, domain_for, domain_path
+from DB.crud import KEY_COLUMNS, TABLE_COLUMNS
+
+RETENTION_DAYS = int(os.getenv("CDC_RETENTION_DAYS", "7"))
+
+
+class Change(NamedTuple):
+    seq: int
+    table: str
+    op: str
+    key: str
+
+
+class Delta(NamedTuple):
+    """What a cache needs to catch up from one seq to `seq`."""
+    seq: int
+    reset: bool  # the log no longer reaches back that far: reload in full
+    rows: list   # current rows of inserted / updated keys
+    deleted: list  # keys that no longer exist
+
+
+def ensure_change_log(db: DatabaseManager):
+    """Create change_log and the capture triggers on the tables present in db."""
+    c = db.cursor()
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        table_name TEXT NOT NULL,
+        op TEXT NOT NULL,
+        key TEXT,
+        changed_at TEXT NOT NULL DEFAULT (strftime('%Y-%m-%d %H:%M:%S', 'now'))
+    );
+    """)
+    c.execute("CREATE INDEX IF NOT EXISTS ix_change_log_table_seq ON change_log (table_name, seq)")
+    # highest seq removed by compact(); readers behind it have to reload
+    c.execute("CREATE TABLE IF NOT EXISTS change_log_state (id INTEGER PRIMARY KEY CHECK (id = 1), purged_seq INTEGER)")
+    c.execute("INSERT OR IGNORE INTO change_log_state (id, purged_seq) VALUES (1, 0)")
+
+    for table, key in KEY_COLUMNS.items():
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+        if not c.fetchone():
+            continue
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cdc_{table}_insert AFTER INSERT ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, op, key) VALUES ('{table}', 'insert', NEW.{key});
+        END;
+        """)
+        # a changed business key is the old key going away and a new one arriving
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cdc_{table}_update AFTER UPDATE ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, op, key)
+                SELECT '{table}', 'delete', OLD.{key} WHERE OLD.{key} IS NOT NEW.{key};
+            INSERT INTO change_log (table_name, op, key) VALUES ('{table}', 'update', NEW.{key});
+        END;
+        """)
+        c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS cdc_{table}_delete AFTER DELETE ON {table}
+        BEGIN
+            INSERT INTO change_log (table_name, op, key) VALUES ('{table}', 'delete', OLD.{key});
+        END;
+        """)
+
+
+def current_seq(db: DatabaseManager, table: Optional[str] = None) -> int:
+    """Latest seq (for `table`, if given), never below purged_seq; 0 when nothing was logged."""
+    c = db.cursor()
+    try:
+        if table is None:
+            c.execute("SELECT MAX(seq) FROM change_log")
+        else:
+            c.execute("SELECT MAX(seq) FROM change_log WHERE table_name = ?", (table,))
+    except sqlite3.OperationalError:
+        # database created before the change log existed: start logging now
+        ensure_change_log(db)
+        db.commit()
+        return 0
+    # compact() may have emptied the log, but the seqs it dropped were
+    # handed out; a reader that applied them is not ahead of the log
+    return max(c.fetchone()[0] or 0, purged_seq(db))
+
+
+def purged_seq(db: DatabaseManager) -> int:
+    c = db.cursor()
+    c.execute("SELECT purged_seq FROM change_log_state WHERE id = 1")
+    row = c.fetchone()
+    return row[0] if row else 0
+
+
+def changes_since(db: DatabaseManager, table: str, since: int, limit: Optional[int] = None) -> List[Change]:
+    """
+    The latest change of each key of `table` logged after `since`, in seq
+    order. Earlier changes of the same key are skipped: the reader only
+    needs the last one.
+    """
+    sql = """
+        SELECT seq, table_name, op, key FROM change_log
+        WHERE seq IN (
+            SELECT MAX(seq) FROM change_log WHERE table_name = ? AND seq > ? GROUP BY key
+        )
+        ORDER BY seq
+    """
+    params = [table, since]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    c = db.cursor()
+    c.execute(sql, params)
+    return [Change(*row) for row in c.fetchall()]
+
+
+def fetch_delta(db: DatabaseManager, table: str, since: int) -> Delta:
+    """
+    Everything a cache of `table` that applied changes up to `since` needs:
+    the current rows of the keys inserted or updated since then, and the
+    keys deleted since then.
+    """
+    try:
+        purged = purged_seq(db)
+    except sqlite3.OperationalError:
+        # no change log yet: current_seq() creates it; reload in full once
+        return Delta(current_seq(db), True, [], [])
+    current = current_seq(db)
+    # behind the compacted part of the log, or ahead of the log altogether
+    # (the database was restored from an older snapshot)
+    if since < purged or since > current:
+        return Delta(current, True, [], [])
+
+    changes = changes_since(db, table, since)
+    if not changes:
+        return Delta(since, False, [], [])
+
+    key_col = KEY_COLUMNS[table]
+    deleted = [ch.key for ch in changes if ch.op == "delete"]
+    changed = [ch.key for ch in changes if ch.op != "delete"]
+    rows = []
+    c = db.cursor()
+    # chunked to stay under SQLite's bound-parameter limit
+    for i in range(0, len(changed), 500):
+        keys = changed[i : i + 500]
+        marks = ", ".join("?" for _ in keys)
+        c.execute(f"SELECT {', '.join(TABLE_COLUMNS[table])} FROM {table} WHERE {key_col} IN ({marks})", keys)
+        rows.extend(c.fetchall())
+    # a key updated and then archived or deleted by a later statement in the
+    # same transaction can be missing; treat it as deleted
+    found = {row[key_col] for row in rows}
+    deleted.extend(key for key in changed if key not in found)
+    return Delta(changes[-1].seq, False, rows, deleted)
+
+
+def compact(db: DatabaseManager, retention_days: int = RETENTION_DAYS):
+    """
+    Drop log entries superseded by a later entry for the same key, then
+    entries older than the retention window. Returns
+    {"superseded": n, "expired": n, "purged_seq": seq}.
+    """
+    c = db.cursor()
+    c.execute("""
+        DELETE FROM change_log
+        WHERE seq NOT IN (SELECT MAX(seq) FROM change_log GROUP BY table_name, key)
+    """)
+    superseded = c.rowcount
+
+    cutoff = (datetime.now(timezone.utc) - timedelta(days=retention_days)).strftime("%Y-%m-%d %H:%M:%S")
+    c.execute("SELECT MAX(seq) FROM change_log WHERE changed_at < ?", (cutoff,))
+    expired_through = c.fetchone()[0]
+    expired = 0
+    if expired_through is not None:
+        c.execute("DELETE FROM change_log WHERE seq <= ?", (expired_through,))
+        expired = c.rowcount
+        c.execute("UPDATE change_log_state SET purged_seq = MAX(purged_seq, ?) WHERE id = 1", (expired_through,))
+    db.commit()
+    return {"superseded": superseded, "expired": expired, "purged_seq": purged_seq(db)}
+
+
+def log_size(db: DatabaseManager):
+    """[{table, entries, last_seq}] for the Admin page."""
+    c = db.cursor()
+    c.execute("SELECT table_name, COUNT(*), MAX(seq) FROM change_log GROUP BY table_name ORDER BY table_name")
+    return [{"table": t, "entries": n, "last_seq": seq} for t, n, seq in c.fetchall()]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Change log of the domain tables.")
+    sub = parser.add_subparsers(dest="command")
+    comp = sub.add_parser("compact")
+    comp.add_argument("--retention-days", type=int, default=RETENTION_DAYS)
+    args = parser.parse_args()
+
+    # one log per database file (one file per domain under DB_LAYOUT=split)
+    paths = dict.fromkeys(domain_path(domain_for(table)) for table in KEY_COLUMNS)
+    for path in paths:
+        with DatabaseManager(path) as db:
+            ensure_change_log(db)
+            if args.command == "compact":
+                print(path, compact(db, args.retention_days))
+            else:
+                print(path, f"seq {current_seq(db)}", log_size(db))
@@ -1,4 +1,7 @@
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
 from pathlib import Path
+from typing import NamedTuple
 from .db import DatabaseManager 
 
 # USERS 
@@ -12,23 +15,299 @@ def get_user_by_username(db : DatabaseManager, username:str):
     
     return c.fetchone()
 
+def get_all_usernames(db: DatabaseManager):
+    c = db.cursor()
+    c.execute("SELECT username FROM users")
+    return {row[0] for row in c.fetchall()}
+
+def insert_users_bulk(db: DatabaseManager, rows):
+    """
+    Insert (username, password_hash, role) tuples; usernames that already
+    exist are skipped (INSERT OR IGNORE). Returns the number inserted.
+    """
+    c = db.cursor()
+    c.executemany("INSERT OR IGNORE INTO users (username, password_hash, role) VALUES (?, ?, ?)", rows)
+    return c.rowcount
+
+
+# Business key of each domain table. create_* and the CSV loader upsert
+# on it, so re-running them updates rows instead of duplicating them.
+KEY_COLUMNS = {
+    "cyber_incidents": "incident_id",
+    "datasets_metadata": "dataset_name",
+    "it_tickets": "ticket_id",
+}
+
+
+# TIMESTAMPS
+# Temporal columns are stored as strict ISO-8601 text: "YYYY-MM-DD" for
+# plain dates, "YYYY-MM-DD HH:MM:SS" when there is a time of day. Both
+# sort correctly as text, so range filters can use the indexes created by
+# DB.schema.normalize_temporal_columns().
+
+DATE_COLUMNS = {
+    "cyber_incidents": ("reported_at", "resolved_at"),
+    "datasets_metadata": ("created_at",),
+    "it_tickets": ("opened_at", "closed_at"),
+}
+
+_DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%d/%m/%Y", "%d-%m-%Y", "%d.%m.%Y")
+_DATETIME_FORMATS = ("%Y/%m/%d %H:%M:%S", "%Y/%m/%d %H:%M", "%d/%m/%Y %H:%M:%S", "%d/%m/%Y %H:%M")
+
+
+def normalize_timestamp(value):
+    """
+    Canonical ISO-8601 text for a date / datetime / string, None for
+    empty values. Raises ValueError for strings that are not dates.
+    """
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    elif isinstance(value, date):
+        return value.isoformat()
+    else:
+        text = str(value).strip()
+        if not text or text.lower() in ("nan", "nat", "none", "null"):
+            return None
+        dt = None
+        try:
+            dt = datetime.fromisoformat(text.replace("Z", "+00:00"))
+        except ValueError:
+            for fmt in _DATE_FORMATS:
+                try:
+                    return datetime.strptime(text, fmt).date().isoformat()
+                except ValueError:
+                    pass
+            for fmt in _DATETIME_FORMATS:
+                try:
+                    dt = datetime.strptime(text, fmt)
+                    break
+                except ValueError:
+                    pass
+        if dt is None:
+            raise ValueError(f"Unrecognised date {value!r}")
+        if len(text) == 10 and dt.time() == datetime.min.time():
+            return dt.date().isoformat()
+
+    if dt.tzinfo is not None:
+        # stored as naive UTC, so every value compares as plain text
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.strftime("%Y-%m-%d %H:%M:%S")
+
+
+def _normalize_dates(table, columns, row, rejected=None):
+    """
+    Normalise the temporal values of one row tuple. An unrecognised date
+    raises ValueError, unless a `rejected` dict is given (bulk ingest):
+    the value is then stored as NULL and counted in rejected[column].
+    """
+    dates = DATE_COLUMNS.get(table, ())
+    if not dates:
+        return row
+    out = list(row)
+    for i, col in enumerate(columns):
+        if col in dates:
+            try:
+                out[i] = normalize_timestamp(out[i])
+            except ValueError:
+                if rejected is None:
+                    raise ValueError(f"{table}.{col}: unrecognised date {out[i]!r}") from None
+                rejected[col] = rejected.get(col, 0) + 1
+                out[i] = None
+    return tuple(out)
+
+
+class DateRange(NamedTuple):
+    """Inclusive date range for a temporal column in build_where() filters."""
+    start: object = None
+    end: object = None
+
+
+def upsert_sql(table, columns):
+    """
+    INSERT ... ON CONFLICT(key) DO UPDATE for `columns`. The WHERE clause
+    skips the write when nothing changed, so re-ingesting a feed is cheap.
+    Returns the row id (inserted or updated) via RETURNING; for skipped
+    no-op updates nothing is returned.
+    """
+    key = KEY_COLUMNS[table]
+    others = [col for col in columns if col != key]
+    placeholders = ", ".join("?" for _ in columns)
+    sets = ", ".join(f"{col} = excluded.{col}" for col in others)
+    current = ", ".join(f"{table}.{col}" for col in others)
+    incoming = ", ".join(f"excluded.{col}" for col in others)
+    return (
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({placeholders}) "
+        f"ON CONFLICT({key}) DO UPDATE SET {sets} "
+        f"WHERE ({current}) IS NOT ({incoming})"
+    )
+
+
+def _execute_upsert(db: DatabaseManager, run):
+    """
+    Run an upsert; on a database created before the unique keys existed,
+    apply the migration (DB.schema.ensure_unique_keys) once and retry.
+    """
+    try:
+        return run()
+    except sqlite3.OperationalError as e:
+        if "ON CONFLICT clause does not match" not in str(e):
+            raise
+        from .schema import ensure_unique_keys
+
+        ensure_unique_keys(db)
+        return run()
+
+
+# Closed records moved out of the hot tables by DB/archive.py. A write for
+# a key that was archived updates the archived row instead of inserting a
+# second copy into the hot table.
+ARCHIVE_TABLES = {
+    "cyber_incidents": "cyber_incidents_archive",
+    "it_tickets": "it_tickets_archive",
+}
+
+
+def _archived_keys(db: DatabaseManager, table, keys):
+    archive = ARCHIVE_TABLES.get(table)
+    keys = list({k for k in keys if k is not None})
+    if archive is None or not keys:
+        return set()
+    c = db.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (archive,))
+    if c.fetchone() is None:
+        return set()
+    key = KEY_COLUMNS[table]
+    found = set()
+    for i in range(0, len(keys), 500):
+        part = keys[i:i + 500]
+        c.execute(f"SELECT {key} FROM {archive} WHERE {key} IN ({', '.join('?' for _ in part)})", part)
+        found.update(r[0] for r in c.fetchall())
+    return found
+
+
+def _update_archived(db: DatabaseManager, table, columns, row):
+    key = KEY_COLUMNS[table]
+    values = dict(zip(columns, row))
+    others = [col for col in columns if col != key]
+    c = db.cursor()
+    c.execute(
+        f"UPDATE {ARCHIVE_TABLES[table]} SET {', '.join(f'{col} = ?' for col in others)} "
+        f"WHERE {key} = ? RETURNING id",
+        [values[col] for col in others] + [values[key]],
+    )
+    return c.fetchone()[0]
+
+
+class BulkUpsert(NamedTuple):
+    """
+    What upsert_rows wrote: the number of rows, {column: count} of
+    unrecognised dates that were stored as NULL instead, and the keys
+    that were archived (their archived row was updated, see _upsert_one).
+    """
+    rows: int
+    rejected: dict
+    archived: frozenset = frozenset()
+
+
+def upsert_rows(db: DatabaseManager, table, columns, rows):
+    """
+    Upsert many rows (tuples in `columns` order) on the table's business
+    key. Bulk ingest: a bad date doesn't fail the batch, it is stored as
+    NULL and counted in the result.
+    """
+    columns = list(columns)
+    rejected = {}
+    rows = [_normalize_dates(table, columns, row, rejected) for row in rows]
+
+    key_pos = columns.index(KEY_COLUMNS[table])
+    archived = _archived_keys(db, table, [row[key_pos] for row in rows])
+    if archived:
+        for row in rows:
+            if row[key_pos] in archived:
+                _update_archived(db, table, columns, row)
+        rows = [row for row in rows if row[key_pos] not in archived]
+
+    if not rows:
+        return BulkUpsert(len(archived), rejected, frozenset(archived))
+    c = db.cursor()
+    _execute_upsert(db, lambda: c.executemany(upsert_sql(table, list(columns)), rows))
+    return BulkUpsert(c.rowcount + len(archived), rejected, frozenset(archived))
+
+
+class Upserted(NamedTuple):
+    """
+    What create_* wrote: the row id, and whether the key was archived, in
+    which case the archived row was updated and the hot table is untouched.
+    """
+    id: int
+    archived: bool = False
+
+
+def _upsert_one(db: DatabaseManager, table, values: dict):
+    values = dict(zip(values, _normalize_dates(table, list(values), tuple(values.values()))))
+    key = KEY_COLUMNS[table]
+    if _archived_keys(db, table, [values[key]]):
+        return Upserted(_update_archived(db, table, list(values), tuple(values.values())), True)
+    c = db.cursor()
+    sql = upsert_sql(table, list(values)) + " RETURNING id"
+    _execute_upsert(db, lambda: c.execute(sql, tuple(values.values())))
+    row = c.fetchone()
+    if row is not None:
+        return Upserted(row[0])
+    # unchanged duplicate: nothing was written, look the row up instead
+    c.execute(f"SELECT id FROM {table} WHERE {key} = ?", (values[key],))
+    return Upserted(c.fetchone()[0])
+
 
 # Cyber Incidents
 
 def create_incident(db: DatabaseManager, incident_id, incident_type,
                     severity, status, reported_at, resolved_at, assigned_to, description):
-    c = db.cursor()
-    c.execute("""
-        INSERT INTO cyber_incidents
-        (incident_id, incident_type, severity, status, reported_at, resolved_at, assigned_to, description)
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-    """, (incident_id, incident_type, severity, status, reported_at, resolved_at, assigned_to, description))
+    return _upsert_one(db, "cyber_incidents", {
+        "incident_id": incident_id, "incident_type": incident_type, "severity": severity,
+        "status": status, "reported_at": reported_at, "resolved_at": resolved_at,
+        "assigned_to": assigned_to, "description": description,
+    })
 
 def get_all_incidents(db: DatabaseManager):
     c = db.cursor()
     c.execute("SELECT * FROM cyber_incidents")
     return c.fetchall()
 
+def _incidents_with_archive(db: DatabaseManager):
+    """The cyber_incidents_all view (hot and archived, see DB/archive.py) if it exists."""
+    c = db.cursor()
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'view' AND name = 'cyber_incidents_all'")
+    return "cyber_incidents_all" if c.fetchone() else "cyber_incidents"
+
+
+def iter_incident_texts(db: DatabaseManager, chunk_size=10000):
+    """
+    Yield the fields the similarity index vectorises, for hot and archived
+    incidents, in lists of at most chunk_size.
+    """
+    c = db.cursor()
+    c.execute(f"SELECT incident_id, incident_type, severity, description FROM {_incidents_with_archive(db)}")
+    while True:
+        chunk = c.fetchmany(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def get_incidents_by_ids(db: DatabaseManager, incident_ids):
+    """Hot or archived incidents with these incident_ids (any order)."""
+    ids = list(incident_ids)
+    if not ids:
+        return []
+    c = db.cursor()
+    c.execute(
+        f"SELECT * FROM {_incidents_with_archive(db)} WHERE incident_id IN ({', '.join('?' for _ in ids)})", ids
+    )
+    return c.fetchall()
+
 def update_incident_status(db: DatabaseManager, incident_id, new_status):
     c = db.cursor()
     c.execute("""
@@ -45,12 +324,10 @@ def delete_incident(db: DatabaseManager, incident_id):
 
 def create_dataset(db: DatabaseManager, dataset_name, owner, source_system,
                    size_mb, row_count, created_at):
-    c = db.cursor()
-    c.execute("""
-        INSERT INTO datasets_metadata
-        (dataset_name, owner, source_system, size_mb, row_count, created_at)
-        VALUES (?, ?, ?, ?, ?, ?)
-    """, (dataset_name, owner, source_system, size_mb, row_count, created_at))
+    return _upsert_one(db, "datasets_metadata", {
+        "dataset_name": dataset_name, "owner": owner, "source_system": source_system,
+        "size_mb": size_mb, "row_count": row_count, "created_at": created_at,
+    })
 
 def get_all_datasets(db: DatabaseManager):
     c = db.cursor()
@@ -74,12 +351,11 @@ def delete_dataset(db: DatabaseManager, dataset_name):
 
 def create_ticket(db: DatabaseManager, ticket_id, category, priority,
                   status, opened_at, closed_at, assigned_to):
-    c = db.cursor()
-    c.execute("""
-        INSERT INTO it_tickets
-        (ticket_id, category, priority, status, opened_at, closed_at, assigned_to)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (ticket_id, category, priority, status, opened_at, closed_at, assigned_to))
+    return _upsert_one(db, "it_tickets", {
+        "ticket_id": ticket_id, "category": category, "priority": priority,
+        "status": status, "opened_at": opened_at, "closed_at": closed_at,
+        "assigned_to": assigned_to,
+    })
 
 def get_all_tickets(db: DatabaseManager):
     c = db.cursor()
@@ -97,3 +373,152 @@ def update_ticket_status(db: DatabaseManager, ticket_id, new_status):
 def delete_ticket(db: DatabaseManager, ticket_id):
     c = db.cursor()
     c.execute("DELETE FROM it_tickets WHERE ticket_id = ?", (ticket_id,))
+
+
+# PAGED / FILTERED QUERIES
+# Used by the dashboard grids so only the visible window of rows is fetched.
+
+TABLE_COLUMNS = {
+    "cyber_incidents": (
+        "id", "incident_id", "incident_type", "severity", "status",
+        "reported_at", "resolved_at", "assigned_to", "description",
+    ),
+    "datasets_metadata": (
+        "id", "dataset_name", "owner", "source_system", "size_mb", "row_count", "created_at",
+    ),
+    "it_tickets": (
+        "id", "ticket_id", "category", "priority", "status",
+        "opened_at", "closed_at", "assigned_to",
+    ),
+}
+
+# declared type of the non-TEXT columns above (see DB/schema.py); every
+# other column is TEXT, dates included (ISO-8601 strings)
+NUMERIC_COLUMNS = {"id": "INTEGER", "size_mb": "REAL", "row_count": "INTEGER"}
+
+
+def _check_columns(table, columns):
+    allowed = TABLE_COLUMNS[table]
+    for col in columns:
+        if col not in allowed:
+            raise ValueError(f"Unknown column {col!r} for table {table}")
+
+
+def build_where(table, filters=None, search=None, search_columns=()):
+    """
+    Build a WHERE clause and its parameters.
+
+    filters: {column: [allowed values]}; empty lists mean "no filter",
+             the same as an empty multiselect on the dashboards.
+             A temporal column may map to a DateRange instead; it becomes
+             col >= start AND col < end + 1 day, an index range scan.
+    search:  case-insensitive substring matched against search_columns.
+             % and _ in it are matched literally (escaped), like the
+             dashboards' in-memory str.contains(regex=False).
+    """
+    clauses = []
+    params = []
+
+    for col, values in (filters or {}).items():
+        if isinstance(values, DateRange):
+            _check_columns(table, [col])
+            if values.start:
+                clauses.append(f"{col} >= ?")
+                params.append(normalize_timestamp(values.start))
+            if values.end:
+                end = datetime.fromisoformat(normalize_timestamp(values.end)).date() + timedelta(days=1)
+                clauses.append(f"{col} < ?")
+                params.append(end.isoformat())
+            continue
+        if not values:
+            continue
+        _check_columns(table, [col])
+        values = list(values)
+        clauses.append(f"{col} IN ({', '.join('?' for _ in values)})")
+        params.extend(values)
+
+    if search and search_columns:
+        _check_columns(table, search_columns)
+        escaped = search.lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        like = f"%{escaped}%"
+        clauses.append(
+            "(" + " OR ".join(f"lower(coalesce({c}, '')) LIKE ? ESCAPE '\\'" for c in search_columns) + ")"
+        )
+        params.extend(like for _ in search_columns)
+
+    where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+    return where, params
+
+
+def key_exists(db: DatabaseManager, table, key):
+    """Whether a row with this business key is in the (hot) table."""
+    c = db.cursor()
+    c.execute(f"SELECT 1 FROM {table} WHERE {KEY_COLUMNS[table]} = ? LIMIT 1", (key,))
+    return c.fetchone() is not None
+
+
+def ids_for_keys(db: DatabaseManager, table, keys):
+    """{business key: id} for the keys found in the (hot) table."""
+    key = KEY_COLUMNS[table]
+    keys = list({k for k in keys if k is not None})
+    ids = {}
+    c = db.cursor()
+    for i in range(0, len(keys), 500):
+        part = keys[i:i + 500]
+        c.execute(f"SELECT {key}, id FROM {table} WHERE {key} IN ({', '.join('?' for _ in part)})", part)
+        ids.update((r[0], r[1]) for r in c.fetchall())
+    return ids
+
+
+def count_rows(db: DatabaseManager, table, filters=None, search=None, search_columns=()):
+    where, params = build_where(table, filters, search, search_columns)
+    c = db.cursor()
+    c.execute(f"SELECT COUNT(*) FROM {table}{where}", params)
+    return c.fetchone()[0]
+
+
+def get_rows_page(db: DatabaseManager, table, filters=None, search=None, search_columns=(),
+                  columns=None, order_by="id", descending=False, limit=100, offset=0):
+    columns = list(columns or TABLE_COLUMNS[table])
+    _check_columns(table, columns + [order_by])
+    where, params = build_where(table, filters, search, search_columns)
+    direction = "DESC" if descending else "ASC"
+    c = db.cursor()
+    # id as tie-breaker keeps pages stable when the sort column has duplicates
+    c.execute(
+        f"SELECT {', '.join(columns)} FROM {table}{where} "
+        f"ORDER BY {order_by} {direction}, id {direction} LIMIT ? OFFSET ?",
+        params + [int(limit), int(offset)],
+    )
+    return c.fetchall()
+
+
+def iter_rows(db: DatabaseManager, table, filters=None, search=None, search_columns=(),
+              columns=None, order_by="id", descending=False, chunk_size=5000):
+    """
+    Yield the matching rows in lists of at most chunk_size, using
+    fetchmany() so the full result set is never held in memory.
+    """
+    columns = list(columns or TABLE_COLUMNS[table])
+    _check_columns(table, columns + [order_by])
+    where, params = build_where(table, filters, search, search_columns)
+    direction = "DESC" if descending else "ASC"
+    c = db.cursor()
+    c.execute(
+        f"SELECT {', '.join(columns)} FROM {table}{where} ORDER BY {order_by} {direction}, id {direction}",
+        params,
+    )
+    while True:
+        chunk = c.fetchmany(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+# SQL TRACE
+# Tags each statement with the crud function and service method that ran
+# it when SQL_TRACE is on (see DB/sql_trace.py).
+
+from .sql_trace import trace_module  # noqa: E402
+
+trace_module(globals())
@@ -1,4 +1,12 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
 import sqlite3
+import threading
+import time
+from datetime import datetime
 from pathlib import Path
 
 DATA_DIR = Path("c:\MDX CSSE\Mustafa\My_Work\DATA")
@@ -6,12 +14,145 @@ DATA_DIR.mkdir(exist_ok=True)
 
 DB_PATH = DATA_DIR / "intelligence_platform.db"
 
+# ---------------------------------------------------------------------
+# Storage layout
+#
+# "single" (default): every table lives in DB_PATH.
+# "split": each domain has its own file under DATA_DIR, so a burst of
+# ticket writes only holds the it_tickets file's write lock and incident
+# writes carry on. Set DB_LAYOUT=split to use it (python -m DB.main
+# creates the files).
+# ---------------------------------------------------------------------
+
+DB_LAYOUT = os.getenv("DB_LAYOUT", "single")
+LAYOUTS = ("single", "split")
+
+# domain -> tables stored in that domain's file (archives stay with
+# their hot table so archiving is one transaction)
+DOMAIN_TABLES = {
+    "users": ("users",),
+    "incidents": ("cyber_incidents", "cyber_incidents_archive"),
+    "tickets": ("it_tickets", "it_tickets_archive"),
+    "datasets": ("datasets_metadata",),
+}
+TABLE_DOMAINS = {table: domain for domain, tables in DOMAIN_TABLES.items() for table in tables}
+
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "4"))
+BUSY_TIMEOUT_S = 5.0
+
+
+def domain_for(table: str) -> str:
+    """Domain of a table, or of its <table>_all view."""
+    if table.endswith("_all"):
+        table = table[: -len("_all")]
+    return TABLE_DOMAINS[table]
+
+
+def domain_path(domain: str = None, layout: str = None) -> Path:
+    """Database file holding `domain` (DB_PATH in the single layout)."""
+    layout = layout or DB_LAYOUT
+    if layout not in LAYOUTS:
+        raise ValueError(f"Unknown DB_LAYOUT {layout!r} (expected one of {LAYOUTS})")
+    if layout == "single" or domain is None:
+        return DB_PATH
+    if domain not in DOMAIN_TABLES:
+        raise ValueError(f"Unknown domain {domain!r}")
+    return DATA_DIR / f"{domain}.db"
+
+
+def database_paths(layout: str = None):
+    """{domain: path}; all domains share DB_PATH in the single layout."""
+    return {domain: domain_path(domain, layout) for domain in DOMAIN_TABLES}
+
+
+class ConnectionPool:
+    """
+    Small pool of connections to one database file. Connections are
+    opened in WAL mode (readers don't wait for the writer) and returned
+    rolled back, so a half-done transaction never leaks to the next user.
+    """
+
+    def __init__(self, path: Path, size: int = POOL_SIZE):
+        self.path = Path(path)
+        self.size = size
+        self._idle = []
+        self._lock = threading.Lock()
+        self.in_use = 0  # borrowed and not yet released
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT_S, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        with self._lock:
+            self.in_use += 1
+            if self._idle:
+                return self._idle.pop()
+        return self._connect()
+
+    def release(self, conn: sqlite3.Connection):
+        with self._lock:
+            self.in_use -= 1
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            conn.close()
+            return
+        with self._lock:
+            if len(self._idle) < self.size:
+                self._idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path: Path) -> ConnectionPool:
+    """The process-wide pool for a database file."""
+    key = Path(path).resolve()
+    with _pools_lock:
+        if key not in _pools:
+            _pools[key] = ConnectionPool(path)
+        return _pools[key]
+
+
+def pool_stats():
+    """[{file, idle, in_use, size}] for each pool opened in this process."""
+    with _pools_lock:
+        pools = list(_pools.values())
+    return [{"file": pool.path.name, "idle": len(pool._idle), "in_use": pool.in_use, "size": pool.size}
+            for pool in pools]
+
+
 class DatabaseManager:
-    def __init__(self, db_path: Path = DB_PATH):
+    """
+    One unit of work on the database. DatabaseManager(path) opens its own
+    connection to `path`; DatabaseManager(domain="tickets") borrows a
+    pooled connection to that domain's file under the current layout.
+    """
+
+    # set by DB/sql_trace.py while SQL tracing is on
+    trace_hook = None
+
+    def __init__(self, db_path: Path = None, domain: str = None):
+        self._pool = None
+        if db_path is None:
+            db_path = domain_path(domain)
+            self._pool = get_pool(db_path)
         self.db_path = db_path
-        self.conn = sqlite3.connect(self.db_path)
+        self.conn = self._pool.acquire() if self._pool else sqlite3.connect(self.db_path)
         self.conn.row_factory = sqlite3.Row
-        
+        self._tracer = self.trace_hook(self) if self.trace_hook is not None else None
+
     def cursor(self):
         return self.conn.cursor()
     
@@ -19,12 +160,259 @@ class DatabaseManager:
         self.conn.commit()
         
     def close(self):
-        self.conn.close()
+        if self._tracer is not None:
+            self._tracer.detach()
+            self._tracer = None
+        if self._pool is not None:
+            self.conn.row_factory = None
+            self._pool.release(self.conn)
+        else:
+            self.conn.close()
         
     def __enter__(self):
         return self
     
     def __exit__(self, exc_type, exc, tb):
-        if exc_type is None:
-            self.commit()
-        self.close()
\ No newline at end of file
+        # a failed commit still hands the connection back (rolled back)
+        try:
+            if exc_type is None:
+                self.commit()
+        finally:
+            self.close()
+
+
+def attach_domains(db: DatabaseManager, domains=None, layout: str = None):
+    """
+    ATTACH the other domains' files to `db` for cross-domain reporting
+    queries (each under its domain name, e.g. tickets.it_tickets).
+    Unqualified table names still resolve, since every table lives in
+    exactly one file. A no-op in the single layout.
+    """
+    main_path = Path(db.db_path).resolve()
+    attached = []
+    c = db.cursor()
+    for domain in domains or DOMAIN_TABLES:
+        path = domain_path(domain, layout)
+        if Path(path).resolve() == main_path:
+            continue
+        c.execute("ATTACH DATABASE ? AS " + domain, (str(path),))
+        attached.append(domain)
+    return attached
+
+
+class ReportingDatabase(DatabaseManager):
+    """
+    Read connection that sees every domain: DB_PATH in the single layout,
+    the users file with the other domains attached in the split layout.
+    Attachments are detached again before the connection goes back to
+    the pool.
+    """
+
+    def __init__(self, layout: str = None):
+        super().__init__(domain="users" if (layout or DB_LAYOUT) == "split" else None)
+        self.attached = attach_domains(self, layout=layout)
+
+    def close(self):
+        self.conn.rollback()
+        for domain in self.attached:
+            self.conn.execute(f"DETACH DATABASE {domain}")
+        super().close()
+
+
+# ---------------------------------------------------------------------
+# Online snapshots
+#
+# Copying the .db file while the dashboards write to it can produce a torn
+# copy. The SQLite online backup API copies a consistent image page by
+# page while other connections keep working; sleeping between steps
+# leaves room for live writers. Each snapshot is recorded (duration,
+# pages, pages/s) in SNAPSHOT_LOG.
+# ---------------------------------------------------------------------
+
+SNAPSHOT_DIR = Path(os.getenv("SNAPSHOT_DIR") or DATA_DIR / "snapshots")
+SNAPSHOT_LOG = "snapshots.jsonl"
+SNAPSHOT_KEEP = int(os.getenv("SNAPSHOT_KEEP", "7"))
+
+
+class _BackupRestarted(Exception):
+    pass
+
+
+def _copy_pages(src: sqlite3.Connection, dst: sqlite3.Connection, pages_per_step: int, pause_s: float,
+                max_restarts: int = 3):
+    """
+    Copy src into dst in steps of pages_per_step, sleeping pause_s between
+    steps. A write to src from another connection makes SQLite restart the
+    copy; after max_restarts the copy is done in a single step instead, so
+    a busy database can't starve the snapshot forever.
+    """
+    stats = {"pages": 0, "steps": 0, "restarts": 0}
+
+    def progress(status, remaining, total):
+        if stats["steps"] and remaining > stats["remaining"]:
+            stats["restarts"] += 1
+            if stats["restarts"] > max_restarts:
+                raise _BackupRestarted()
+        stats["pages"] = total
+        stats["remaining"] = remaining
+        stats["steps"] += 1
+        if remaining and pause_s:
+            # let writers on the source database in between steps
+            time.sleep(pause_s)
+
+    try:
+        src.backup(dst, pages=pages_per_step, progress=progress)
+    except _BackupRestarted:
+        stats["single_step"] = True
+        src.backup(dst, pages=-1)
+        stats["pages"] = src.execute("PRAGMA page_count").fetchone()[0]
+    stats.pop("remaining", None)
+    return stats
+
+
+def create_snapshot(db_path: Path = DB_PATH, snapshot_dir: Path = SNAPSHOT_DIR, pages_per_step: int = 256,
+                    pause_s: float = 0.005, compress: bool = True, keep: int = SNAPSHOT_KEEP):
+    """
+    Write a consistent snapshot of db_path into snapshot_dir and return
+    its record (path, bytes, duration, pages, pages/s). Only the newest
+    `keep` snapshots are kept (keep=0 keeps all).
+    """
+    snapshot_dir = Path(snapshot_dir)
+    snapshot_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    raw_path = snapshot_dir / f"{Path(db_path).stem}_{stamp}.db"
+    part_path = raw_path.with_suffix(".db.part")
+
+    started = time.perf_counter()
+    src = sqlite3.connect(db_path)
+    dst = sqlite3.connect(part_path)
+    try:
+        stats = _copy_pages(src, dst, pages_per_step, pause_s)
+    finally:
+        dst.close()
+        src.close()
+
+    if compress:
+        final_path = raw_path.with_suffix(".db.gz")
+        with part_path.open("rb") as f_in, gzip.open(final_path.with_suffix(".gz.part"), "wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, length=1024 * 1024)
+        part_path.unlink()
+        final_path.with_suffix(".gz.part").rename(final_path)
+    else:
+        final_path = raw_path
+        part_path.rename(final_path)
+
+    seconds = time.perf_counter() - started
+    record = {
+        "path": str(final_path),
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "bytes": final_path.stat().st_size,
+        "compressed": compress,
+        "pages": stats["pages"],
+        "steps": stats["steps"],
+        "restarts": stats["restarts"],
+        "single_step": stats.get("single_step", False),
+        "seconds": round(seconds, 3),
+        "pages_per_sec": round(stats["pages"] / seconds) if seconds > 0 else None,
+    }
+    with (snapshot_dir / SNAPSHOT_LOG).open("a", encoding="utf-8") as log:
+        log.write(json.dumps(record) + "\n")
+
+    if keep:
+        for old in list_snapshots(snapshot_dir, Path(db_path).stem)[keep:]:
+            old.unlink()
+    return record
+
+
+STAMP_LEN = len("20240101_120000_000000")
+
+
+def list_snapshots(snapshot_dir: Path = SNAPSHOT_DIR, stem: str = None):
+    """Snapshot files (of the database named `stem`, if given), newest first."""
+    snapshot_dir = Path(snapshot_dir)
+    if not snapshot_dir.exists():
+        return []
+    files = [p for p in snapshot_dir.iterdir() if p.name.endswith((".db", ".db.gz"))]
+    if stem is not None:
+        files = [p for p in files if _snapshot_stem(p) == stem]
+    return sorted(files, key=lambda p: p.name.split(".")[0][-STAMP_LEN:], reverse=True)
+
+
+def _snapshot_stem(path: Path) -> str:
+    return path.name.split(".")[0][: -STAMP_LEN - 1]
+
+
+def snapshot_all(**kwargs):
+    """Snapshot every database file of the current layout."""
+    return [create_snapshot(path, **kwargs) for path in dict.fromkeys(database_paths().values())]
+
+
+def snapshot_history(snapshot_dir: Path = SNAPSHOT_DIR):
+    """Recorded snapshot runs, oldest first."""
+    log_path = Path(snapshot_dir) / SNAPSHOT_LOG
+    if not log_path.exists():
+        return []
+    with log_path.open(encoding="utf-8") as log:
+        return [json.loads(line) for line in log if line.strip()]
+
+
+def restore_snapshot(snapshot_path: Path, db_path: Path = DB_PATH, pages_per_step: int = 1024):
+    """
+    Restore db_path from a snapshot (plain or .gz), through the backup
+    API so open connections see the restored content. The snapshot is
+    integrity-checked first.
+    """
+    snapshot_path = Path(snapshot_path)
+    source = snapshot_path
+    tmp_path = None
+    if snapshot_path.suffix == ".gz":
+        tmp_path = snapshot_path.with_suffix(".restore")
+        with gzip.open(snapshot_path, "rb") as f_in, tmp_path.open("wb") as f_out:
+            shutil.copyfileobj(f_in, f_out, length=1024 * 1024)
+        source = tmp_path
+
+    try:
+        src = sqlite3.connect(source)
+        try:
+            result = src.execute("PRAGMA integrity_check").fetchone()[0]
+            if result != "ok":
+                raise sqlite3.DatabaseError(f"Snapshot {snapshot_path} failed integrity_check: {result}")
+            dst = sqlite3.connect(db_path)
+            try:
+                stats = _copy_pages(src, dst, pages_per_step, 0)
+            finally:
+                dst.close()
+        finally:
+            src.close()
+    finally:
+        if tmp_path is not None:
+            tmp_path.unlink(missing_ok=True)
+
+    print(f"Restored {db_path} from {snapshot_path} ({stats['pages']} pages)")
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Online snapshots of the platform database.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    snap = sub.add_parser("snapshot")
+    snap.add_argument("--no-compress", action="store_true")
+    snap.add_argument("--keep", type=int, default=SNAPSHOT_KEEP)
+    snap.add_argument("--pages-per-step", type=int, default=256)
+    snap.add_argument("--pause", type=float, default=0.005, help="seconds to sleep between steps")
+    sub.add_parser("list")
+    restore = sub.add_parser("restore")
+    restore.add_argument("snapshot", type=Path)
+    restore.add_argument("--db", type=Path, help="database to restore (default: the one the snapshot was taken of)")
+    args = parser.parse_args()
+
+    if args.command == "snapshot":
+        print(json.dumps(snapshot_all(
+            compress=not args.no_compress, keep=args.keep,
+            pages_per_step=args.pages_per_step, pause_s=args.pause,
+        ), indent=2))
+    elif args.command == "list":
+        for path in list_snapshots():
+            print(path)
+    else:
+        restore_snapshot(args.snapshot, args.db or DATA_DIR / f"{_snapshot_stem(args.snapshot)}.db")
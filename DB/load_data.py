@@ -1,23 +1,299 @@
+"""
+DB/load_data.py
+
+Loading of the DATA/ CSV feeds into the three domain tables.
+
+The upstream tools keep appending to the CSV files, so loading is
+incremental: for each file the ingest_state table remembers
+
+- byte_offset:   how far the file has been ingested (always at the end
+  of a CSV record)
+- head_checksum: sha256 of the first head_len bytes of the file
+- dates_rejected: unrecognised dates that were stored as NULL (the rows
+  themselves are still ingested)
+
+and each run only parses the records appended since then: csv.reader reads
+the file from that offset, so quoted fields may span lines. Rows are upserted
+on their business key (DB.crud.KEY_COLUMNS) in micro-batches; every batch and its new offset are committed in the
+same transaction, so a crash never loses or duplicates records.
+
+After each batch commits, on_batch(table, rows, archived) is called. The
+default, publish_batch, publishes the rows through services.events like a
+write made through the services, so the filter engines and the similarity
+index pick them up. Other processes see them in the change log (DB/cdc.py),
+which the table triggers fill for every writer.
+
+A file that is shorter than the stored offset (truncated) or whose first
+bytes changed (rotated / replaced) is ingested again from the top.
+
+A trailing record that is not complete (no final newline, or a quoted
+field still open) is treated as still being written and is picked up on
+the next run.
+
+Usage:
+    python -m DB.load_data                 # one pass over all feeds
+    python -m DB.load_data --watch         # keep tailing, every second
+"""
+
+import argparse
+import csv
+import hashlib
+import time
+from datetime import datetime
 from pathlib import Path
-import pandas as pd
-from DB.db import DatabaseManager
+
+from DB.db import DatabaseManager, domain_for
+from DB.crud import KEY_COLUMNS, TABLE_COLUMNS, ids_for_keys, upsert_rows
+from services import events
 
 DATA_DIR = Path("DATA")
 
+FEEDS = {
+    "cyber_incidents.csv": "cyber_incidents",
+    "datasets_metadata.csv": "datasets_metadata",
+    "it_tickets.csv": "it_tickets",
+}
+
+HEAD_BYTES = 4096
+BATCH_SIZE = 500
+
+
 def load_csv_to_table(db: DatabaseManager, csv_path: Path, table_name: str):
+    """
+    Upsert a whole CSV file into a table (no offset tracking). Kept for
+    one-off imports; the feeds use ingest_file().
+    """
+    import pandas as pd
+
     df = pd.read_csv(csv_path)
-    df.to_sql(table_name, db.conn, if_exists="append", index=False)
-    print(f"Loaded {len(df)} rows into {table_name}")
-
-def load_all_csv_data(db: DatabaseManager):
-    mapping = {
-        "cyber_incidents.csv": "cyber_incidents",
-        "datasets_metadata.csv": "datasets_metadata",
-        "it_tickets.csv": "it_tickets",
-    }
-    for filename, table in mapping.items():
-        path = DATA_DIR / filename
+    df = df.astype(object).where(df.notna(), None)
+    result = upsert_rows(db, table_name, list(df.columns), df.itertuples(index=False, name=None))
+    rejected = sum(result.rejected.values())
+    print(f"Loaded {len(df)} rows into {table_name}" + (f" ({rejected} unrecognised dates set to NULL)" if rejected else ""))
+
+
+# --------- Ingest state ---------
+
+def ensure_ingest_state(db: DatabaseManager):
+    c = db.cursor()
+    c.execute("""
+    CREATE TABLE IF NOT EXISTS ingest_state (
+        file_name TEXT PRIMARY KEY,
+        table_name TEXT NOT NULL,
+        byte_offset INTEGER NOT NULL,
+        head_len INTEGER NOT NULL,
+        head_checksum TEXT NOT NULL,
+        rows_ingested INTEGER NOT NULL DEFAULT 0,
+        dates_rejected INTEGER NOT NULL DEFAULT 0,
+        updated_at TEXT
+    );
+    """)
+    # column added after the table first shipped
+    c.execute("PRAGMA table_info(ingest_state)")
+    if "dates_rejected" not in {row[1] for row in c.fetchall()}:
+        c.execute("ALTER TABLE ingest_state ADD COLUMN dates_rejected INTEGER NOT NULL DEFAULT 0")
+
+
+def _get_state(db: DatabaseManager, file_name: str):
+    c = db.cursor()
+    c.execute("SELECT * FROM ingest_state WHERE file_name = ?", (file_name,))
+    return c.fetchone()
+
+
+def _save_state(db: DatabaseManager, file_name, table, offset, head_len, head_checksum, rows_added,
+                dates_rejected=0):
+    c = db.cursor()
+    c.execute(
+        """
+        INSERT INTO ingest_state (file_name, table_name, byte_offset, head_len, head_checksum, rows_ingested,
+                                  dates_rejected, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(file_name) DO UPDATE SET
+            table_name = excluded.table_name,
+            byte_offset = excluded.byte_offset,
+            head_len = excluded.head_len,
+            head_checksum = excluded.head_checksum,
+            rows_ingested = ingest_state.rows_ingested + excluded.rows_ingested,
+            dates_rejected = ingest_state.dates_rejected + excluded.dates_rejected,
+            updated_at = excluded.updated_at
+        """,
+        (file_name, table, offset, head_len, head_checksum, rows_added, dates_rejected,
+         datetime.now().isoformat(timespec="seconds")),
+    )
+
+
+def _head_checksum(f, length: int) -> str:
+    f.seek(0)
+    return hashlib.sha256(f.read(length)).hexdigest()
+
+
+# --------- Ingest ---------
+
+def publish_batch(table: str, rows, archived):
+    """
+    Default on_batch: one services.events event per row, "archive" for
+    keys whose archived row was updated, "insert" (an upsert) otherwise.
+    """
+    key = KEY_COLUMNS[table]
+    for row in rows:
+        events.publish(table, "archive" if row[key] in archived else "insert", row[key], row)
+
+
+def _records(f, offset: int):
+    """
+    (values, end offset) for each complete CSV record from offset on.
+    csv.reader asks for one line at a time and stops at the end of the
+    record it returns, so the offset after its last line is the record's end.
+    """
+    pos = offset
+    at_eof = False
+
+    def lines():
+        nonlocal pos, at_eof
+        f.seek(offset)
+        while True:
+            line = f.readline()
+            if not line.endswith(b"\n"):
+                at_eof = True  # EOF, or a partial line still being written
+                return
+            pos += len(line)
+            yield line.decode("utf-8")
+
+    for values in csv.reader(lines()):
+        if at_eof:
+            return  # the file ended inside a quoted field: still being written
+        yield values, pos
+
+
+def ingest_file(db: DatabaseManager, csv_path: Path, table: str, batch_size: int = BATCH_SIZE,
+                on_batch=publish_batch) -> int:
+    """
+    Ingest the records appended to csv_path since the last run.
+    Returns the number of rows upserted. on_batch(table, rows, archived),
+    if given, is called after each committed micro-batch with the rows as
+    dicts (with their id) and the set of keys that are archived.
+    """
+    ensure_ingest_state(db)
+    file_name = csv_path.name
+    state = _get_state(db, file_name)
+    size = csv_path.stat().st_size
+    inserted = 0
+
+    with csv_path.open("rb") as f:
+        header_line = f.readline()
+        if not header_line.endswith(b"\n"):
+            return 0  # header still being written
+        header = next(csv.reader([header_line.decode("utf-8-sig")]))
+
+        offset = len(header_line)
+        reset = state is not None
+        if state is not None:
+            if size < state["byte_offset"]:
+                print(f"{file_name}: truncated, ingesting from the start")
+            elif _head_checksum(f, state["head_len"]) != state["head_checksum"]:
+                print(f"{file_name}: rotated, ingesting from the start")
+            else:
+                offset = state["byte_offset"]
+                reset = False
+
+        allowed = set(TABLE_COLUMNS[table]) - {"id"}
+        keep = [i for i, col in enumerate(header) if col in allowed]
+        columns = [header[i] for i in keep]
+
+        batch = []
+        for values, offset in _records(f, offset):
+            if values:  # blank lines come back as []
+                batch.append(tuple((values[i] if i < len(values) and values[i] != "" else None) for i in keep))
+
+            if len(batch) >= batch_size:
+                inserted += _commit_batch(db, f, file_name, table, columns, batch, offset, on_batch)
+                batch = []
+
+        if batch or reset or state is None or offset != state["byte_offset"]:
+            inserted += _commit_batch(db, f, file_name, table, columns, batch, offset, on_batch)
+
+    if inserted:
+        print(f"Ingested {inserted} rows from {file_name} into {table}")
+    return inserted
+
+
+def _commit_batch(db, f, file_name, table, columns, batch, offset, on_batch) -> int:
+    rejected, archived = 0, frozenset()
+    if batch:
+        # upsert on the business key: re-ingesting a rotated or rewritten
+        # file updates rows instead of duplicating them
+        result = upsert_rows(db, table, columns, batch)
+        rejected, archived = sum(result.rejected.values()), result.archived
+    head_len = min(HEAD_BYTES, offset)
+    pos = f.tell()
+    checksum = _head_checksum(f, head_len)
+    f.seek(pos)
+    _save_state(db, file_name, table, offset, head_len, checksum, len(batch), rejected)
+    db.commit()
+    if batch and on_batch is not None:
+        key = KEY_COLUMNS[table]
+        rows = [dict(zip(columns, row)) for row in batch]
+        ids = ids_for_keys(db, table, [row[key] for row in rows])
+        for row in rows:
+            if row[key] in ids:
+                row["id"] = ids[row[key]]
+        on_batch(table, rows, archived)
+    return len(batch)
+
+
+def ingest_all(data_dir: Path = DATA_DIR, batch_size: int = BATCH_SIZE, on_batch=publish_batch,
+               db_manager_cls=DatabaseManager) -> int:
+    """
+    Ingest every feed into its domain's database file. The ingest_state
+    rows live next to the table they track, so a batch and its offset
+    still commit together under the split storage layout.
+    """
+    total = 0
+    for filename, table in FEEDS.items():
+        path = data_dir / filename
         if path.exists():
-            load_csv_to_table(db, path, table)
+            with db_manager_cls(domain=domain_for(table)) as db:
+                total += ingest_file(db, path, table, batch_size, on_batch)
         else:
             print(f"Skipping {filename}, file not found")
+    return total
+
+
+def load_all_csv_data():
+    """
+    Load the CSV feeds. The first run loads every line; later runs only
+    add lines appended since (see ingest_file).
+    """
+    ingest_all()
+
+
+def watch(data_dir: Path = DATA_DIR, interval: float = 1.0, batch_size: int = BATCH_SIZE, stop_event=None,
+          on_batch=publish_batch):
+    """
+    Keep tailing the feeds, polling every `interval` seconds until
+    stop_event (a threading.Event) is set or the process is interrupted.
+    """
+    print(f"Watching {data_dir} every {interval}s (Ctrl+C to stop)")
+    try:
+        while stop_event is None or not stop_event.is_set():
+            ingest_all(data_dir, batch_size, on_batch)
+            if stop_event is not None:
+                stop_event.wait(interval)
+            else:
+                time.sleep(interval)
+    except KeyboardInterrupt:
+        print("Stopped watching.")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest the DATA/ CSV feeds.")
+    parser.add_argument("--data-dir", type=Path, default=DATA_DIR)
+    parser.add_argument("--watch", action="store_true", help="keep tailing the files")
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args()
+
+    if args.watch:
+        watch(args.data_dir, args.interval, args.batch_size)
+    else:
+        ingest_all(args.data_dir, args.batch_size)
@@ -1,12 +1,17 @@
 # DB/main.py
 
+import re
+import time
+from collections import Counter
 from pathlib import Path
 
 from DB.db import DatabaseManager
-from DB.schema import create_tables
+from DB.schema import create_domain_tables
 from DB.crud import (
     insert_user,
     get_user_by_username,
+    get_all_usernames,
+    insert_users_bulk,
     create_incident,
     get_all_incidents,
     update_incident_status,
@@ -22,34 +27,113 @@ from DB.load_data import load_all_csv_data
 DATA_DIR = Path(__file__).resolve().parent.parent / "DATA"
 
 
-def migrate_users_from_file(db: DatabaseManager, users_file: Path):
+USERNAME_RE = re.compile(r"^[A-Za-z0-9_.@-]{1,64}$")
+BCRYPT_RE = re.compile(r"^\$2[abxy]?\$\d{2}\$[./A-Za-z0-9]{53}$")
+USER_CHUNK_SIZE = 5000
+
+
+def parse_user_line(line: str):
+    """
+    Split one users.txt line into (username, password_hash).
+    Raises ValueError with a short reason for invalid lines.
+    """
+    parts = line.split(",")
+    if len(parts) != 2:
+        raise ValueError("expected 'username,password_hash'")
+    username, password_hash = parts[0].strip(), parts[1].strip()
+    if not USERNAME_RE.match(username):
+        raise ValueError("invalid username")
+    if not BCRYPT_RE.match(password_hash):
+        raise ValueError("not a bcrypt hash")
+    return username, password_hash
+
+
+def migrate_users_from_file(db: DatabaseManager, users_file: Path, chunk_size: int = USER_CHUNK_SIZE,
+                            role: str = "general"):
+    """
+    Bulk-migrate users.txt into the users table.
+
+    The file is streamed line by line. Valid lines are deduplicated in
+    memory against one bulk fetch of the existing usernames, then inserted
+    with executemany + INSERT OR IGNORE, committing every chunk_size rows.
+    Returns a report dict (also printed): inserted / duplicates / rejected
+    counts, rejection reasons and throughput.
+    """
     if not users_file.exists():
         print("users.txt not found, skipping migration")
-        return
+        return None
+
+    started = time.perf_counter()
+    seen = get_all_usernames(db)
+    batch = []
+    inserted = 0
+    duplicates = 0
+    lines = 0
+    rejected = Counter()
+    examples = []
 
     with users_file.open("r", encoding="utf-8") as f:
-        for line in f:
+        for line_no, line in enumerate(f, start=1):
             line = line.strip()
             if not line:
                 continue
+            lines += 1
+
+            try:
+                username, password_hash = parse_user_line(line)
+            except ValueError as e:
+                rejected[str(e)] += 1
+                if len(examples) < 10:
+                    examples.append(f"line {line_no}: {e}")
+                continue
+
+            if username in seen:
+                duplicates += 1
+                continue
+            seen.add(username)
+            batch.append((username, password_hash, role))
+
+            if len(batch) >= chunk_size:
+                inserted += insert_users_bulk(db, batch)
+                db.commit()
+                batch = []
+
+    if batch:
+        inserted += insert_users_bulk(db, batch)
+        db.commit()
 
-            username, password_hash = line.split(",")
-            role = "general"  # default role for Week 8/9
+    seconds = time.perf_counter() - started
+    report = {
+        "lines": lines,
+        "inserted": inserted,
+        "duplicates": duplicates,
+        "rejected": sum(rejected.values()),
+        "reject_reasons": dict(rejected),
+        "reject_examples": examples,
+        "seconds": round(seconds, 3),
+        "lines_per_sec": round(lines / seconds) if seconds > 0 else None,
+    }
 
-            if get_user_by_username(db, username) is None:
-                insert_user(db, username, password_hash, role)
+    print(
+        f"Users: {inserted} inserted, {duplicates} already present, "
+        f"{report['rejected']} rejected ({lines} lines in {seconds:.2f}s, "
+        f"{report['lines_per_sec'] or 0:,} lines/s)"
+    )
+    for example in examples:
+        print(f"  rejected {example}")
+    return report
 
 
 def setup_database():
-    with DatabaseManager() as db:
-        # 1) create all tables
-        create_tables(db)
+    # 1) create all tables (one file per domain under DB_LAYOUT=split)
+    create_domain_tables()
 
-        # 2) migrate Week 7 users into the users table
+    # 2) migrate Week 7 users into the users table
+    with DatabaseManager(domain="users") as db:
         migrate_users_from_file(db, DATA_DIR / "users.txt")
 
-        # 3) load CSV data into the three domain tables
-        load_all_csv_data(db)
+    # 3) load CSV data into the three domain tables
+    load_all_csv_data()
 
 
 if __name__ == "__main__":
@@ -1,20 +1,19 @@
-from .db import DatabaseManager as DM
+from .db import DOMAIN_TABLES, DatabaseManager as DM, domain_path
+from .crud import DATE_COLUMNS, KEY_COLUMNS, normalize_timestamp
 
-def create_tables(db: DM):
-    c = db.cursor()
-    
+TABLE_DDL = {
     # Users Table
-    c.execute("""
+    "users": """
     CREATE TABLE IF NOT EXISTS users (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         username TEXT UNIQUE NOT NULL,
         password_hash TEXT NOT NULL,
         role TEXT NOT NULL
     );
-    """)
-    
+    """,
+
     # Cybersecurity incidents
-    c.execute("""
+    "cyber_incidents": """
     CREATE TABLE IF NOT EXISTS cyber_incidents (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         incident_id TEXT,
@@ -26,11 +25,10 @@ def create_tables(db: DM):
         assigned_to TEXT,
         description TEXT
     );
-    """)
-    
-    
+    """,
+
     # Dataset metadata
-    c.execute("""
+    "datasets_metadata": """
     CREATE TABLE IF NOT EXISTS datasets_metadata (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         dataset_name TEXT,
@@ -40,10 +38,10 @@ def create_tables(db: DM):
         row_count INTEGER,
         created_at TEXT
     );
-    """)
+    """,
 
     # IT tickets
-    c.execute("""
+    "it_tickets": """
     CREATE TABLE IF NOT EXISTS it_tickets (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
         ticket_id TEXT,
@@ -54,4 +52,106 @@ def create_tables(db: DM):
         closed_at TEXT,
         assigned_to TEXT
     );
-    """)
\ No newline at end of file
+    """,
+}
+
+
+def create_tables(db: DM, tables=None):
+    """
+    Create `tables` (default: all of TABLE_DDL) in db, with their unique
+    keys, date indexes and archive tables.
+    """
+    c = db.cursor()
+    for table in tables or TABLE_DDL:
+        if table in TABLE_DDL:
+            c.execute(TABLE_DDL[table])
+
+    ensure_unique_keys(db)
+    normalize_temporal_columns(db)
+
+    # archive tables and <table>_all views (see DB/archive.py)
+    from .archive import ensure_archive_tables
+
+    ensure_archive_tables(db)
+
+    # change_log and its triggers (see DB/cdc.py), after the migrations
+    # above so rewriting old rows is not logged as changes
+    from .cdc import ensure_change_log
+
+    ensure_change_log(db)
+
+
+def create_domain_tables(layout: str = None):
+    """
+    Create every domain's tables in its own database file under the
+    current storage layout (one shared file in the single layout).
+    """
+    for domain, tables in DOMAIN_TABLES.items():
+        with DM(domain_path(domain, layout)) as db:
+            create_tables(db, tables)
+
+
+def _has_table(c, table: str) -> bool:
+    c.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,))
+    return c.fetchone() is not None
+
+
+def ensure_unique_keys(db: DM):
+    """
+    One-time migration: older databases have no uniqueness on the business
+    keys and may hold many copies of each row (every setup run appended
+    the CSVs again). Keep the newest copy (highest id) of each key, then
+    add a unique index so create_* / the loader can upsert on it.
+    """
+    c = db.cursor()
+    for table, key in KEY_COLUMNS.items():
+        index = f"ux_{table}_{key}"
+        if not _has_table(c, table):
+            continue
+        c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,))
+        if c.fetchone():
+            continue
+
+        c.execute(f"""
+            DELETE FROM {table}
+            WHERE {key} IS NOT NULL
+              AND id NOT IN (SELECT MAX(id) FROM {table} WHERE {key} IS NOT NULL GROUP BY {key})
+        """)
+        if c.rowcount:
+            print(f"Removed {c.rowcount} duplicate rows from {table}")
+        c.execute(f"CREATE UNIQUE INDEX {index} ON {table} ({key})")
+
+
+def normalize_temporal_columns(db: DM):
+    """
+    One-time migration: rewrite the free-form date strings of existing
+    rows as strict ISO-8601 (see DB.crud.normalize_timestamp) and index
+    each temporal column, so date-range filters become index range scans.
+    Values that are not dates are set to NULL. Columns that already have
+    their index are skipped.
+    """
+    c = db.cursor()
+    for table, columns in DATE_COLUMNS.items():
+        if not _has_table(c, table):
+            continue
+        for col in columns:
+            index = f"ix_{table}_{col}"
+            c.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,))
+            if c.fetchone():
+                continue
+
+            c.execute(f"SELECT id, {col} FROM {table} WHERE {col} IS NOT NULL")
+            changes = []
+            rejected = 0
+            for row_id, value in c.fetchall():
+                try:
+                    new_value = normalize_timestamp(value)
+                except ValueError:
+                    new_value = None
+                    rejected += 1
+                if new_value != value:
+                    changes.append((new_value, row_id))
+            c.executemany(f"UPDATE {table} SET {col} = ? WHERE id = ?", changes)
+            if changes:
+                print(f"Normalised {len(changes)} values in {table}.{col} ({rejected} unparseable set to NULL)")
+            c.execute(f"CREATE INDEX {index} ON {table} ({col})")
@@ -0,0 +1,358 @@
+"""
+DB/sql_trace.py
+
+SQL trace and slow-query log.
+
+With SQL_TRACE=1 (or enable() at runtime) every connection a
+DatabaseManager opens gets three sqlite3 hooks:
+
+- set_trace_callback: SQLite reports each statement, with its parameters
+  bound, as it starts; the previous statement on the connection ends there
+- set_progress_handler: counts virtual-machine steps, SQLite's own
+  measure of how much work a statement did
+- row_factory: counts the rows each statement returned
+
+and the functions in DB/crud.py are wrapped, so each statement is tagged
+with the crud function and the service method (Class.method) that ran it.
+
+Every statement becomes a StatementRecord in an in-memory ring buffer
+(ring_buffer.RecordBuffer, summarised on the Admin page). Statements slower than SQL_SLOW_MS are
+also appended to the slow-query log, a JSON-lines file, together with
+their EXPLAIN QUERY PLAN.
+
+When tracing is off nothing is installed on the connections and the crud
+wrapper costs one flag check per call.
+
+Usage:
+    python -m DB.sql_trace              # slowest statement shapes in the slow-query log
+    python -m DB.sql_trace --top 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import functools
+import inspect
+import json
+import os
+import re
+import sqlite3
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from DB.db import DATA_DIR, DatabaseManager
+from ring_buffer import RecordBuffer
+
+TRACE_ENABLED = os.getenv("SQL_TRACE", "0").lower() in ("1", "true", "yes", "on")
+SLOW_MS = float(os.getenv("SQL_SLOW_MS", "100"))
+RING_SIZE = int(os.getenv("SQL_TRACE_RING_SIZE", "5000"))
+SLOW_LOG_PATH = Path(os.getenv("SQL_SLOW_LOG") or DATA_DIR / "slow_queries.jsonl")
+SLOW_LOG_ROTATE_BYTES = 5 * 1024 * 1024
+# the progress handler runs every PROGRESS_STEPS virtual-machine instructions
+PROGRESS_STEPS = 1000
+
+_BUFFER = RecordBuffer(RING_SIZE, time_field="started_at")
+_local = threading.local()
+_log_lock = threading.Lock()
+
+
+@dataclass
+class StatementRecord:
+    sql: str
+    started_at: float
+    ms: float
+    rows: int
+    vm_steps: int  # approximate, in units of PROGRESS_STEPS
+    crud: Optional[str]  # DB.crud function that ran it
+    caller: Optional[str]  # e.g. "TicketService.page_tickets"
+    db: str
+
+
+class _Running:
+    __slots__ = ("sql", "t0", "started_at", "rows", "steps", "crud", "caller")
+
+    def __init__(self, sql, crud, caller):
+        self.sql = sql
+        self.t0 = time.perf_counter()
+        self.started_at = time.time()
+        self.rows = 0
+        self.steps = 0
+        self.crud = crud
+        self.caller = caller
+
+
+class ConnectionTracer:
+    """The hooks installed on one DatabaseManager's connection."""
+
+    def __init__(self, db: DatabaseManager):
+        self.conn = db.conn
+        self.db_name = Path(db.db_path).name
+        self._running: Optional[_Running] = None
+        self._slow: List[StatementRecord] = []
+        self._paused = False
+        self._row_factory = self.conn.row_factory
+
+        row_factory = self._row_factory
+
+        def counting_row_factory(cursor, row):
+            if self._running is not None:
+                self._running.rows += 1
+            return row_factory(cursor, row) if row_factory is not None else row
+
+        self.conn.row_factory = counting_row_factory
+        self.conn.set_trace_callback(self._on_statement)
+        self.conn.set_progress_handler(self._on_progress, PROGRESS_STEPS)
+
+    def _on_statement(self, sql: str) -> None:
+        if self._paused:
+            return
+        running = self._running
+        # trigger programs report their parent statement again
+        if running is not None and running.sql == sql:
+            return
+        self._end()
+        crud, caller = getattr(_local, "call", None) or (None, None)
+        self._running = _Running(sql, crud, caller)
+
+    def _on_progress(self) -> int:
+        if self._running is not None:
+            self._running.steps += 1
+        return 0  # non-zero would interrupt the statement
+
+    def _end(self) -> None:
+        running, self._running = self._running, None
+        if running is None:
+            return
+        record = StatementRecord(
+            sql=running.sql,
+            started_at=running.started_at,
+            ms=round((time.perf_counter() - running.t0) * 1000, 3),
+            rows=running.rows,
+            vm_steps=running.steps * PROGRESS_STEPS,
+            crud=running.crud,
+            caller=running.caller,
+            db=self.db_name,
+        )
+        _BUFFER.append(record)
+        if record.ms >= SLOW_MS:
+            self._slow.append(record)
+
+    def finish(self) -> None:
+        """End the running statement and log the slow ones with their plans."""
+        self._end()
+        if not self._slow:
+            return
+        slow, self._slow = self._slow, []
+        _write_slow([{**asdict(record), "plan": self._explain(record.sql)} for record in slow])
+
+    def _explain(self, sql: str) -> List[str]:
+        # not traced itself; EXPLAIN only plans the statement, it doesn't run it
+        self._paused = True
+        try:
+            return [row[-1] for row in self.conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()]
+        except sqlite3.Error as e:
+            return [f"(no plan: {e})"]
+        finally:
+            self._paused = False
+
+    def detach(self) -> None:
+        self.finish()
+        self.conn.set_trace_callback(None)
+        self.conn.set_progress_handler(None, 0)
+        self.conn.row_factory = self._row_factory
+
+
+# --------- Switching on and off ---------
+
+def enable(slow_ms: Optional[float] = None) -> None:
+    """Trace connections opened from now on (in this process)."""
+    global TRACE_ENABLED, SLOW_MS
+    if slow_ms is not None:
+        SLOW_MS = float(slow_ms)
+    TRACE_ENABLED = True
+    DatabaseManager.trace_hook = ConnectionTracer
+
+
+def disable() -> None:
+    global TRACE_ENABLED
+    TRACE_ENABLED = False
+    DatabaseManager.trace_hook = None
+
+
+def is_enabled() -> bool:
+    return TRACE_ENABLED
+
+
+# --------- Tagging statements with their caller ---------
+
+def _caller(frame) -> str:
+    code = frame.f_code
+    owner = frame.f_locals.get("self")
+    if owner is not None:
+        return f"{type(owner).__name__}.{code.co_name}"
+    return f"{frame.f_globals.get('__name__', '?')}.{code.co_name}"
+
+
+def _finish(db) -> None:
+    tracer = getattr(db, "_tracer", None)
+    if tracer is not None:
+        tracer.finish()
+
+
+def _traced_chunks(gen, db, call):
+    try:
+        while True:
+            _local.call = call
+            try:
+                item = next(gen)
+            except StopIteration:
+                return
+            finally:
+                _local.call = None
+            yield item
+    finally:
+        _finish(db)
+
+
+def traced(fn):
+    """
+    Wrap a crud function (db first) so the statements it runs are tagged
+    with its name and its caller. Calls made from inside another traced
+    function keep the outer tag.
+    """
+    name = fn.__name__
+
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def wrapper(db, *args, **kwargs):
+            if not TRACE_ENABLED:
+                return fn(db, *args, **kwargs)
+            return _traced_chunks(fn(db, *args, **kwargs), db, (name, _caller(sys._getframe(1))))
+        return wrapper
+
+    @functools.wraps(fn)
+    def wrapper(db, *args, **kwargs):
+        if not TRACE_ENABLED or getattr(_local, "call", None) is not None:
+            return fn(db, *args, **kwargs)
+        _local.call = (name, _caller(sys._getframe(1)))
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            _local.call = None
+            _finish(db)
+
+    return wrapper
+
+
+def trace_module(namespace: dict) -> None:
+    """Wrap the public functions of a module whose first parameter is db."""
+    for name, fn in list(namespace.items()):
+        if name.startswith("_") or not inspect.isfunction(fn) or fn.__module__ != namespace["__name__"]:
+            continue
+        params = list(inspect.signature(fn).parameters)
+        if params and params[0] == "db":
+            namespace[name] = traced(fn)
+
+
+# --------- Reading ---------
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def shape(sql: str) -> str:
+    """The statement with its values replaced by ?, for grouping."""
+    return _LISTS.sub("?, ...", _LITERALS.sub("?", " ".join(sql.split())))
+
+
+def records() -> List[dict]:
+    """Snapshot of the ring buffer as plain dicts (oldest first)."""
+    return _BUFFER.records()
+
+
+def clear() -> None:
+    _BUFFER.clear()
+
+
+def _totals(items: List[StatementRecord]) -> Dict[str, object]:
+    return {"rows": sum(r.rows for r in items), "vm_steps": sum(r.vm_steps for r in items)}
+
+
+def summarize(group_by: Iterable[str] = ("caller", "crud")) -> List[Dict[str, object]]:
+    """
+    Aggregate the ring buffer by record fields, or by "shape" (the
+    statement without its values). Slowest total time first.
+    """
+    rows = _BUFFER.summarize(
+        group_by, "ms", count_name="statements", digits=2, extra=_totals, derived={"shape": lambda r: shape(r.sql)}
+    )
+    return sorted(rows, key=lambda row: row["total_ms"], reverse=True)
+
+
+# --------- Slow-query log ---------
+
+def _write_slow(entries: List[dict]) -> None:
+    with _log_lock:
+        SLOW_LOG_PATH.parent.mkdir(parents=True, exist_ok=True)
+        if SLOW_LOG_PATH.exists() and SLOW_LOG_PATH.stat().st_size > SLOW_LOG_ROTATE_BYTES:
+            SLOW_LOG_PATH.replace(SLOW_LOG_PATH.with_suffix(".jsonl.1"))
+        with SLOW_LOG_PATH.open("a", encoding="utf-8") as log:
+            for entry in entries:
+                log.write(json.dumps(entry, default=str) + "\n")
+
+
+def slow_queries(limit: Optional[int] = None) -> List[dict]:
+    """Entries of the slow-query log, newest last."""
+    if not SLOW_LOG_PATH.exists():
+        return []
+    entries = []
+    with SLOW_LOG_PATH.open(encoding="utf-8") as log:
+        for line in log:
+            try:
+                entries.append(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+    return entries[-limit:] if limit else entries
+
+
+def slowest_shapes(entries: List[dict], top: int = 10) -> List[dict]:
+    """Slow-log entries grouped by statement shape, worst first."""
+    groups: Dict[str, List[dict]] = {}
+    for entry in entries:
+        groups.setdefault(shape(entry["sql"]), []).append(entry)
+    rows = []
+    for statement, items in groups.items():
+        worst = max(items, key=lambda e: e["ms"])
+        rows.append({
+            "shape": statement,
+            "count": len(items),
+            "max_ms": worst["ms"],
+            "avg_ms": round(sum(e["ms"] for e in items) / len(items), 2),
+            "callers": sorted({e["caller"] or "-" for e in items}),
+            "plan": worst.get("plan", []),
+        })
+    return sorted(rows, key=lambda row: row["max_ms"], reverse=True)[:top]
+
+
+if TRACE_ENABLED:
+    enable()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise the slow-query log.")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    entries = slow_queries()
+    if not entries:
+        print(f"No slow queries logged in {SLOW_LOG_PATH}.")
+    for row in slowest_shapes(entries, args.top):
+        print(f"{row['max_ms']:>10,.1f} ms max  {row['avg_ms']:>10,.1f} ms avg  x{row['count']}  "
+              f"{', '.join(row['callers'])}")
+        print(f"    {row['shape']}")
+        for step in row["plan"]:
+            print(f"      {step}")
@@ -0,0 +1,54 @@
+# DB/tests/test_cdc.py
+
+from DB.cdc import compact, current_seq, fetch_delta
+from DB.crud import create_ticket, delete_ticket, update_ticket_status
+
+
+def add_ticket(db, ticket_id, status="Open"):
+    create_ticket(db, ticket_id, "Hardware", "High", status, "2024-01-01", None, "bob")
+    db.commit()
+
+
+def test_delta_has_changed_rows_and_deleted_keys(db):
+    add_ticket(db, "T-1")
+    add_ticket(db, "T-2")
+    since = current_seq(db, "it_tickets")
+
+    update_ticket_status(db, "T-1", "Closed")
+    delete_ticket(db, "T-2")
+    add_ticket(db, "T-3")
+    db.commit()
+
+    delta = fetch_delta(db, "it_tickets", since)
+    assert not delta.reset
+    assert delta.seq == current_seq(db, "it_tickets")
+    assert {r["ticket_id"]: r["status"] for r in delta.rows} == {"T-1": "Closed", "T-3": "Open"}
+    assert delta.deleted == ["T-2"]
+
+
+def test_delta_at_the_current_position_is_empty(db):
+    add_ticket(db, "T-1")
+    since = current_seq(db, "it_tickets")
+    assert fetch_delta(db, "it_tickets", since) == (since, False, [], [])
+
+
+def test_reset_when_the_log_was_compacted_past_the_reader(db):
+    add_ticket(db, "T-1")
+    add_ticket(db, "T-2")
+    # a negative retention expires every entry
+    assert compact(db, retention_days=-1)["purged_seq"] == current_seq(db)
+    add_ticket(db, "T-3")
+
+    delta = fetch_delta(db, "it_tickets", 1)
+    assert delta.reset
+    assert delta.seq == current_seq(db)
+
+
+def test_reset_when_the_reader_is_ahead_of_the_log(db):
+    # e.g. the database was restored from a snapshot older than the reader's cache
+    add_ticket(db, "T-1")
+    ahead = current_seq(db) + 10
+
+    delta = fetch_delta(db, "it_tickets", ahead)
+    assert delta.reset
+    assert delta.seq == current_seq(db)
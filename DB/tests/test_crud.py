@@ -0,0 +1,96 @@
+# DB/tests/test_crud.py
+
+import pytest
+
+from DB.archive import archive_closed, restore
+from DB.crud import count_rows, create_incident, key_exists, upsert_rows
+
+
+def add_incident(db, incident_id, status="Open", reported_at="2020-01-01", description="phishing email"):
+    result = create_incident(db, incident_id, "Phishing", "High", status, reported_at, None, "amy", description)
+    db.commit()
+    return result
+
+
+def archived_row(db, incident_id):
+    c = db.cursor()
+    c.execute("SELECT * FROM cyber_incidents_archive WHERE incident_id = ?", (incident_id,))
+    return c.fetchone()
+
+
+# --------- UPSERT on business keys ---------
+
+def test_create_on_hot_key_is_an_update(db):
+    first = add_incident(db, "INC-1")
+    second = add_incident(db, "INC-1", description="changed")
+    assert (second.id, second.archived) == (first.id, False)
+    assert count_rows(db, "cyber_incidents") == 1
+
+
+def test_reloading_rows_does_not_duplicate_them(db):
+    columns = ["incident_id", "status"]
+    upsert_rows(db, "cyber_incidents", columns, [("INC-1", "Open"), ("INC-2", "Open")])
+    upsert_rows(db, "cyber_incidents", columns, [("INC-1", "Closed"), ("INC-2", "Open")])
+    db.commit()
+
+    assert count_rows(db, "cyber_incidents") == 2
+    assert count_rows(db, "cyber_incidents", filters={"status": ["Closed"]}) == 1
+
+
+# --------- UPSERT on archived keys ---------
+
+def test_create_on_archived_key_updates_the_archived_row(db):
+    add_incident(db, "INC-1", status="Closed")
+    assert archive_closed(db, retention_days=0)["cyber_incidents"] == 1
+
+    result = add_incident(db, "INC-1", status="Closed", description="updated after archiving")
+
+    assert result.archived
+    assert result.id == archived_row(db, "INC-1")["id"]
+    assert archived_row(db, "INC-1")["description"] == "updated after archiving"
+    assert not key_exists(db, "cyber_incidents", "INC-1")
+
+
+def test_upsert_rows_reports_archived_keys(db):
+    add_incident(db, "INC-1", status="Closed")
+    archive_closed(db, retention_days=0)
+
+    columns = ["incident_id", "status", "description"]
+    result = upsert_rows(db, "cyber_incidents", columns, [("INC-1", "Closed", "again"), ("INC-2", "Open", "new")])
+    db.commit()
+
+    assert result.rows == 2
+    assert result.archived == {"INC-1"}
+    assert not key_exists(db, "cyber_incidents", "INC-1")
+    assert key_exists(db, "cyber_incidents", "INC-2")
+    assert archived_row(db, "INC-1")["description"] == "again"
+
+
+def test_restore_brings_the_row_back_to_the_hot_table(db):
+    add_incident(db, "INC-1", status="Closed")
+    archive_closed(db, retention_days=0)
+
+    assert restore(db, "cyber_incidents", "INC-1")["incident_id"] == "INC-1"
+    db.commit()
+    assert key_exists(db, "cyber_incidents", "INC-1")
+    assert archived_row(db, "INC-1") is None
+
+
+# --------- Dates ---------
+
+def test_interactive_write_rejects_a_bad_date(db):
+    with pytest.raises(ValueError, match="reported_at"):
+        add_incident(db, "INC-1", reported_at="31st of never")
+    assert not key_exists(db, "cyber_incidents", "INC-1")
+
+
+def test_bulk_upsert_stores_bad_dates_as_null_and_counts_them(db):
+    columns = ["incident_id", "reported_at", "resolved_at"]
+    rows = [("INC-1", "2024/01/05", "soon"), ("INC-2", "nope", None)]
+    result = upsert_rows(db, "cyber_incidents", columns, rows)
+    db.commit()
+
+    assert result.rejected == {"resolved_at": 1, "reported_at": 1}
+    c = db.cursor()
+    c.execute("SELECT incident_id, reported_at, resolved_at FROM cyber_incidents ORDER BY incident_id")
+    assert [tuple(r) for r in c.fetchall()] == [("INC-1", "2024-01-05", None), ("INC-2", None, None)]
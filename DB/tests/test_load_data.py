@@ -0,0 +1,62 @@
+# DB/tests/test_load_data.py
+
+from DB.load_data import ingest_file
+
+HEADER = "incident_id,incident_type,severity,status,reported_at,resolved_at,assigned_to,description\r\n"
+
+
+def incidents(db):
+    c = db.cursor()
+    c.execute("SELECT incident_id, reported_at, description FROM cyber_incidents ORDER BY incident_id")
+    return [tuple(r) for r in c.fetchall()]
+
+
+def ingest_state(db):
+    c = db.cursor()
+    c.execute("SELECT byte_offset, rows_ingested, dates_rejected FROM ingest_state")
+    return tuple(c.fetchone())
+
+
+def test_quoted_fields_may_span_lines(db, tmp_path):
+    path = tmp_path / "cyber_incidents.csv"
+    path.write_bytes((HEADER + 'I-1,Phishing,High,Open,2024-01-01,,amy,"first line\r\nsecond line"\r\n').encode())
+
+    assert ingest_file(db, path, "cyber_incidents", on_batch=None) == 1
+    assert incidents(db) == [("I-1", "2024-01-01", "first line\r\nsecond line")]
+    assert ingest_state(db)[0] == path.stat().st_size
+
+
+def test_a_record_still_being_written_waits_for_the_next_run(db, tmp_path):
+    path = tmp_path / "cyber_incidents.csv"
+    # the quote is still open: the writer hasn't finished the record
+    path.write_bytes((HEADER + 'I-1,Phishing,High,Open,2024-01-01,,amy,"first line\r\n').encode())
+    assert ingest_file(db, path, "cyber_incidents", on_batch=None) == 0
+    assert incidents(db) == []
+
+    with path.open("ab") as f:
+        f.write(b'second line"\r\nI-2,Malware,Low,Open,2024-01-02,,bob,plain\r\nI-3,Mal')
+    assert ingest_file(db, path, "cyber_incidents", on_batch=None) == 2
+    assert [r[0] for r in incidents(db)] == ["I-1", "I-2"]
+    assert incidents(db)[0][2] == "first line\r\nsecond line"
+    assert ingest_state(db)[0] == path.stat().st_size - len(b"I-3,Mal")
+
+
+def test_bad_dates_are_counted_not_fatal(db, tmp_path):
+    path = tmp_path / "cyber_incidents.csv"
+    path.write_bytes((HEADER + "I-1,Phishing,High,Open,someday,,amy,x\r\nI-2,Phishing,High,Open,2024/02/03,,amy,y\r\n").encode())
+
+    assert ingest_file(db, path, "cyber_incidents", on_batch=None) == 2
+    assert incidents(db) == [("I-1", None, "x"), ("I-2", "2024-02-03", "y")]
+    assert ingest_state(db)[1:] == (2, 1)
+
+
+def test_each_batch_is_handed_to_on_batch_with_ids(db, tmp_path):
+    path = tmp_path / "cyber_incidents.csv"
+    path.write_bytes((HEADER + "I-1,Phishing,High,Open,2024-01-01,,amy,x\r\n").encode())
+    batches = []
+
+    ingest_file(db, path, "cyber_incidents", on_batch=lambda *args: batches.append(args))
+
+    [(table, rows, archived)] = batches
+    assert table == "cyber_incidents" and archived == frozenset()
+    assert rows[0]["incident_id"] == "I-1" and isinstance(rows[0]["id"], int)
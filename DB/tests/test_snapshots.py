@@ -0,0 +1,55 @@
+# DB/tests/test_snapshots.py
+
+import sqlite3
+
+import pytest
+
+from DB.crud import create_incident, delete_incident, get_all_incidents
+from DB.db import create_snapshot, list_snapshots, restore_snapshot, snapshot_history
+
+
+def _incident_ids(db_manager_cls):
+    with db_manager_cls() as db:
+        return sorted(row["incident_id"] for row in get_all_incidents(db))
+
+
+@pytest.mark.parametrize("compress", [True, False])
+def test_restore_brings_back_the_snapshot(db_manager_cls, tmp_path, compress):
+    db_path = tmp_path / "test.db"
+    with db_manager_cls() as db:
+        create_incident(db, "INC-1", "Malware", "High", "Open", "2024-01-01", None, "amy", "worm outbreak")
+        create_incident(db, "INC-2", "Phishing", "Low", "Open", "2024-01-02", None, "bob", "fake invoice")
+
+    record = create_snapshot(db_path, tmp_path / "snapshots", pages_per_step=1, pause_s=0, compress=compress)
+    assert record["path"].endswith(".db.gz" if compress else ".db")
+    assert record["pages"] > 0
+    assert snapshot_history(tmp_path / "snapshots") == [record]
+
+    with db_manager_cls() as db:
+        delete_incident(db, "INC-1")
+        create_incident(db, "INC-3", "DDoS", "Medium", "Open", "2024-01-03", None, "amy", "traffic spike")
+    assert _incident_ids(db_manager_cls) == ["INC-2", "INC-3"]
+
+    restore_snapshot(record["path"], db_path)
+    # pooled connections see the restored content too
+    assert _incident_ids(db_manager_cls) == ["INC-1", "INC-2"]
+    assert not list((tmp_path / "snapshots").glob("*.restore"))
+
+
+def test_only_the_newest_snapshots_are_kept(db_manager_cls, tmp_path):
+    db_path = tmp_path / "test.db"
+    paths = [create_snapshot(db_path, tmp_path / "snapshots", pause_s=0, keep=2)["path"] for _ in range(3)]
+
+    assert [str(p) for p in list_snapshots(tmp_path / "snapshots", "test")] == paths[:0:-1]
+    assert len(snapshot_history(tmp_path / "snapshots")) == 3
+
+
+def test_damaged_snapshot_is_not_restored(db_manager_cls, tmp_path):
+    with db_manager_cls() as db:
+        create_incident(db, "INC-1", "Malware", "High", "Open", "2024-01-01", None, "amy", "worm outbreak")
+    damaged = tmp_path / "test_20240101_120000_000000.db"
+    damaged.write_bytes(b"not a database" * 100)
+
+    with pytest.raises(sqlite3.DatabaseError):
+        restore_snapshot(damaged, tmp_path / "test.db")
+    assert _incident_ids(db_manager_cls) == ["INC-1"]
@@ -0,0 +1,56 @@
+# DB/tests/test_user_migration.py
+
+import pytest
+
+from DB.crud import get_all_usernames, get_user_by_username, insert_user
+from DB.main import migrate_users_from_file, parse_user_line
+
+HASH = "$2b$12$" + "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0"
+
+
+def test_parse_user_line():
+    assert parse_user_line(f" alice ,{HASH}\n") == ("alice", HASH)
+    with pytest.raises(ValueError, match="expected"):
+        parse_user_line("alice")
+    with pytest.raises(ValueError, match="invalid username"):
+        parse_user_line(f"bad name,{HASH}")
+    with pytest.raises(ValueError, match="not a bcrypt hash"):
+        parse_user_line("alice,plaintext")
+
+
+def test_migration_report(db, tmp_path):
+    insert_user(db, "carol", HASH, "admin")
+    db.commit()
+    users_file = tmp_path / "users.txt"
+    users_file.write_text("\n".join([
+        f"alice,{HASH}",
+        f"bob,{HASH}",
+        "",
+        f"alice,{HASH}",  # repeated in the file
+        f"carol,{HASH}",  # already in the table
+        "dave,secret",
+        "no-comma",
+        f"erin,{HASH}",
+    ]) + "\n", encoding="utf-8")
+
+    report = migrate_users_from_file(db, users_file, chunk_size=2)
+
+    assert {k: report[k] for k in ("lines", "inserted", "duplicates", "rejected")} == {
+        "lines": 7, "inserted": 3, "duplicates": 2, "rejected": 2,
+    }
+    assert report["reject_reasons"] == {"not a bcrypt hash": 1, "expected 'username,password_hash'": 1}
+    assert report["reject_examples"] == [
+        "line 6: not a bcrypt hash",
+        "line 7: expected 'username,password_hash'",
+    ]
+    assert get_all_usernames(db) == {"alice", "bob", "carol", "erin"}
+    assert get_user_by_username(db, "carol")["role"] == "admin"
+    assert get_user_by_username(db, "erin")["role"] == "general"
+
+    again = migrate_users_from_file(db, users_file)
+    assert again["inserted"] == 0
+    assert again["duplicates"] == 5
+
+
+def test_missing_file_is_skipped(db, tmp_path):
+    assert migrate_users_from_file(db, tmp_path / "users.txt") is None
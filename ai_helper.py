@@ -9,30 +9,89 @@ Chat API format.
 
 - The API key is loaded from the environment variable OPENROUTER_API_KEY
   (typically defined in a .env file).
+- The API base URL can be overridden with OPENROUTER_BASE_URL, e.g. to
+  point at the local stand-in server in benchmarks/mock_openrouter.py.
 - If the API is not available, the code falls back to a local,
   rule-based "offline assistant" so the dashboard still works.
 """
 
 from __future__ import annotations
 
+import hashlib
+import json
 import os
-import requests
+import threading
+import time
+from collections import OrderedDict
 from typing import Optional
 
-from dotenv import load_dotenv
+import ai_telemetry
+import metrics
 
-# Load variables from .env in the project root
-load_dotenv()
+# requests, python-dotenv and concurrent.futures are imported on first use
+# so that pages importing this module (and app start-up) stay fast.
+_ENV_LOADED = False
+
+DEFAULT_BASE_URL = "https://openrouter.ai/api/v1"
+MODEL = "openai/gpt-oss-20b:free"
+
+
+def _load_env() -> None:
+    """
+    Load variables from .env in the project root, once, on first use.
+    """
+    global _ENV_LOADED
+    if not _ENV_LOADED:
+        from dotenv import load_dotenv
+
+        load_dotenv()
+        _ENV_LOADED = True
+
+
+def _chat_completions_url() -> str:
+    """
+    Chat Completions endpoint, read from the environment on every call so
+    benchmarks and tests can switch between OpenRouter and a local server.
+    """
+    base_url = os.getenv("OPENROUTER_BASE_URL", DEFAULT_BASE_URL).rstrip("/")
+    return f"{base_url}/chat/completions"
 
 
 # -------------------------------------------------------------------
 # Offline fallback assistant
 # -------------------------------------------------------------------
-def _offline_response(user_message: str, context_text: Optional[str] = None) -> str:
+def _similar_incidents_text(user_message: str, k: int = 5) -> Optional[str]:
+    """
+    Look up the past incidents most similar to the question in the local
+    similarity index (services/incident_index.py). Returns None while the
+    index is still being built in the background, or if it cannot be
+    read, e.g. the database is not reachable.
+    """
+    try:
+        from services.incident_index import format_similar_incidents, get_incident_index
+
+        index = get_incident_index(timeout=0)
+        if index is None:
+            return None
+        matches = index.query(user_message, k=k)
+    except Exception:
+        return None
+
+    if not matches:
+        return None
+    return format_similar_incidents(matches)
+
+
+def _offline_response(
+    user_message: str,
+    context_text: Optional[str] = None,
+    dashboard: str = "cyber",
+) -> str:
     """
     Simple rule-based assistant used when no API key is configured or
     when the HTTP request fails. It still uses the incident summary
-    from the dashboard (context_text) to give meaningful feedback.
+    from the dashboard (context_text) to give meaningful feedback and,
+    on the Cyber Dashboard, the most similar past incidents.
     """
     parts: list[str] = []
 
@@ -44,6 +103,13 @@ def _offline_response(user_message: str, context_text: Optional[str] = None) ->
     if context_text:
         parts.append(f"\nIncident summary:\n{context_text}")
 
+    if dashboard == "cyber":
+        similar = _similar_incidents_text(user_message)
+        if similar:
+            parts.append(
+                "\nMost similar past incidents and how they were handled:\n" + similar
+            )
+
     msg = user_message.lower()
 
     if "priorit" in msg or "first" in msg:
@@ -88,9 +154,56 @@ def _offline_response(user_message: str, context_text: Optional[str] = None) ->
 # -------------------------------------------------------------------
 # OpenRouter (OpenAI-compatible) API call
 # -------------------------------------------------------------------
+def _post_chat(
+    api_key: str,
+    messages: list[dict],
+    max_tokens: int = 400,
+    temperature: float = 0.2,
+    trace: Optional[ai_telemetry.CallTrace] = None,
+) -> dict:
+    """
+    Sends one Chat Completions request and returns the decoded JSON body.
+    Raises on network errors and non-2xx HTTP status codes.
+
+    If `trace` is given, the call's latency, HTTP status and token usage
+    are added to it.
+    """
+    payload = {
+        "model": MODEL,
+        "messages": messages,
+        "temperature": temperature,
+        "max_tokens": max_tokens,
+    }
+
+    headers = {
+        "Authorization": f"Bearer {api_key}",
+        "Content-Type": "application/json",
+        # These two are recommended by OpenRouter for identification
+        "HTTP-Referer": "http://localhost:8501",
+        "X-Title": "Mustafa Intelligence Platform",
+    }
+
+    import requests
+
+    t0 = time.perf_counter()
+    http_status = None
+    usage = None
+    try:
+        resp = requests.post(_chat_completions_url(), json=payload, headers=headers, timeout=30)
+        http_status = resp.status_code
+        resp.raise_for_status()
+        data = resp.json()
+        usage = data.get("usage")
+        return data
+    finally:
+        if trace is not None:
+            trace.add_api_call((time.perf_counter() - t0) * 1000.0, http_status, usage)
+
+
 def _openrouter_response(
     user_message: str,
     context_text: Optional[str] = None,
+    trace: Optional[ai_telemetry.CallTrace] = None,
 ) -> Optional[str]:
     """
     Calls the OpenRouter Chat Completions API using the model
@@ -98,13 +211,12 @@ def _openrouter_response(
 
     Returns the model's text response, or None if the API key is missing.
     """
+    _load_env()
     api_key = os.getenv("OPENROUTER_API_KEY")
     if not api_key:
         # No key configured: let caller fall back to offline mode
         return None
 
-    url = "https://openrouter.ai/api/v1/chat/completions"
-
     system_prompt = (
         "You are a helpful cybersecurity analyst assistant for a university dashboard. "
         "Explain trends, severity priorities, and risks clearly for a first-year "
@@ -114,28 +226,13 @@ def _openrouter_response(
     if context_text:
         system_prompt += f"\nHere is a summary of the current incidents:\n{context_text}\n"
 
-    payload = {
-        "model": "openai/gpt-oss-20b:free",
-        "messages": [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_message},
-        ],
-        "temperature": 0.2,
-        "max_tokens": 400,
-    }
-
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json",
-        # These two are recommended by OpenRouter for identification
-        "HTTP-Referer": "http://localhost:8501",
-        "X-Title": "Mustafa Intelligence Platform",
-    }
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message},
+    ]
 
     try:
-        resp = requests.post(url, json=payload, headers=headers, timeout=30)
-        resp.raise_for_status()
-        data = resp.json()
+        data = _post_chat(api_key, messages, trace=trace)
 
         # Expected format: {"choices": [{"message": {"content": "..."}}, ...]}
         choices = data.get("choices")
@@ -154,17 +251,310 @@ def _openrouter_response(
 # -------------------------------------------------------------------
 # Public function used by Streamlit
 # -------------------------------------------------------------------
-def ask_cyber_assistant(user_message: str, context_text: Optional[str] = None) -> str:
+def ask_cyber_assistant(
+    user_message: str,
+    context_text: Optional[str] = None,
+    dashboard: str = "cyber",
+) -> str:
     """
-    Main entry point used by the Streamlit Cyber Dashboard.
+    Main entry point used by the Streamlit dashboards.
 
     1. Try to call the OpenRouter API with the free `gpt-oss-20b` model.
     2. If that fails or no key is defined, fall back to the offline assistant.
+
+    `dashboard` ("cyber", "it" or "data") tells the offline assistant
+    which domain the question is about.
     """
-    online_answer = _openrouter_response(user_message, context_text)
+    trace = ai_telemetry.start_trace("chat", dashboard, MODEL)
+    online_answer = _openrouter_response(user_message, context_text, trace)
 
     if online_answer is None or online_answer.startswith("Error calling OpenRouter API"):
         # Either no key configured or HTTP error: use offline logic.
-        return _offline_response(user_message, context_text)
+        _finish(trace, _fallback_reason(online_answer, trace))
+        return _offline_response(user_message, context_text, dashboard)
 
+    _finish(trace)
     return online_answer
+
+
+def _finish(trace: ai_telemetry.CallTrace, fallback_reason: Optional[str] = None) -> None:
+    """Close the telemetry record and update the exported metrics from it."""
+    record = trace.finish(fallback_reason)
+    metrics.AI_REQUESTS.inc(kind=record.kind, dashboard=record.dashboard,
+                            outcome="fallback" if fallback_reason else "online")
+    if fallback_reason:
+        metrics.AI_FALLBACKS.inc(reason=fallback_reason)
+    metrics.AI_LATENCY.observe(record.latency_ms / 1000.0, kind=record.kind, dashboard=record.dashboard)
+    metrics.AI_API_CALLS.inc(record.api_calls, kind=record.kind)
+    metrics.AI_TOKENS.inc(record.prompt_tokens, kind=record.kind, type="prompt")
+    metrics.AI_TOKENS.inc(record.completion_tokens, kind=record.kind, type="completion")
+
+
+def _fallback_reason(online_answer: Optional[str], trace: ai_telemetry.CallTrace) -> str:
+    if online_answer is None:
+        return "no_api_key"
+    status = trace.record.http_status
+    if status == 429:
+        return "rate_limited"
+    if status is not None and status >= 400:
+        return f"http_{status}"
+    return "request_error"
+
+
+# -------------------------------------------------------------------
+# Batch triage of many incidents per request
+# -------------------------------------------------------------------
+TRIAGE_SEVERITIES = ("Low", "Medium", "High", "Critical")
+
+# content hash -> triage result; only successful online answers are cached.
+# Least recently used entries are dropped past TRIAGE_CACHE_SIZE.
+TRIAGE_CACHE_SIZE = int(os.getenv("AI_TRIAGE_CACHE_SIZE", "5000"))
+_TRIAGE_CACHE: OrderedDict[str, dict] = OrderedDict()
+_TRIAGE_CACHE_LOCK = threading.Lock()
+
+
+def _cache_get(content_hash: str) -> Optional[dict]:
+    with _TRIAGE_CACHE_LOCK:
+        result = _TRIAGE_CACHE.get(content_hash)
+        if result is not None:
+            _TRIAGE_CACHE.move_to_end(content_hash)
+        return result
+
+
+def _cache_put(content_hash: str, result: dict) -> None:
+    with _TRIAGE_CACHE_LOCK:
+        _TRIAGE_CACHE[content_hash] = result
+        _TRIAGE_CACHE.move_to_end(content_hash)
+        while len(_TRIAGE_CACHE) > TRIAGE_CACHE_SIZE:
+            _TRIAGE_CACHE.popitem(last=False)
+
+
+def _estimate_tokens(text: str) -> int:
+    # Rough rule of thumb for English text: ~4 characters per token
+    return max(1, len(text) // 4)
+
+
+def incident_content_hash(incident: dict) -> str:
+    """
+    Hash of the fields the model sees. If none of them changed, the
+    incident is not sent again.
+    """
+    fields = ("incident_type", "severity", "status", "description")
+    raw = "\x1f".join(str(incident.get(f) or "") for f in fields)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _incident_line(incident: dict) -> str:
+    return json.dumps(
+        {
+            "incident_id": incident.get("incident_id"),
+            "type": incident.get("incident_type"),
+            "severity": incident.get("severity"),
+            "status": incident.get("status"),
+            "description": incident.get("description"),
+        },
+        ensure_ascii=False,
+    )
+
+
+def pack_batches(incidents: list[dict], token_budget: int = 3000) -> list[list[dict]]:
+    """
+    Greedily split incidents into batches whose prompt lines fit within
+    `token_budget` (estimated). An incident larger than the budget on its
+    own still gets a batch of one.
+    """
+    batches: list[list[dict]] = []
+    current: list[dict] = []
+    used = 0
+
+    for incident in incidents:
+        cost = _estimate_tokens(_incident_line(incident)) + 1
+        if current and used + cost > token_budget:
+            batches.append(current)
+            current, used = [], 0
+        current.append(incident)
+        used += cost
+
+    if current:
+        batches.append(current)
+    return batches
+
+
+def parse_triage_output(content: str, expected_ids: set[str]) -> dict[str, dict]:
+    """
+    Parse the model's JSON array of per-incident results. Unknown IDs and
+    malformed entries are dropped; severity is normalised to our scale.
+    """
+    start, end = content.find("["), content.rfind("]")
+    if start == -1 or end <= start:
+        return {}
+
+    try:
+        items = json.loads(content[start:end + 1])
+    except json.JSONDecodeError:
+        return {}
+
+    results: dict[str, dict] = {}
+    for item in items if isinstance(items, list) else []:
+        if not isinstance(item, dict):
+            continue
+        incident_id = str(item.get("incident_id", ""))
+        if incident_id not in expected_ids:
+            continue
+        severity = str(item.get("severity", "")).strip().capitalize()
+        results[incident_id] = {
+            "incident_id": incident_id,
+            "suggested_severity": severity if severity in TRIAGE_SEVERITIES else None,
+            "category": str(item.get("category") or "").strip() or None,
+            "next_step": str(item.get("next_step") or "").strip() or None,
+            "source": "ai",
+        }
+    return results
+
+
+def _offline_triage(incident: dict) -> dict:
+    """
+    Rule-based triage used when the API is unavailable or a batch fails.
+    """
+    severity = incident.get("severity")
+    if severity in ("High", "Critical"):
+        next_step = "Contain immediately and escalate to the on-call analyst."
+    elif severity == "Medium":
+        next_step = "Investigate within one working day."
+    else:
+        next_step = "Group with similar low-risk incidents and handle in batch."
+
+    return {
+        "incident_id": incident.get("incident_id"),
+        "suggested_severity": severity if severity in TRIAGE_SEVERITIES else None,
+        "category": incident.get("incident_type"),
+        "next_step": next_step,
+        "source": "offline",
+    }
+
+
+class _RateLimiter:
+    """
+    Spaces out request starts so at most `per_minute` requests begin in
+    any 60 second window (shared by all worker threads).
+    """
+
+    def __init__(self, per_minute: int):
+        self._lock = threading.Lock()
+        self._next_start = 0.0
+        self.set_rate(per_minute)
+
+    def set_rate(self, per_minute: int) -> None:
+        with self._lock:
+            self._interval = 60.0 / per_minute if per_minute > 0 else 0.0
+
+    def wait(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next_start)
+            self._next_start = start + self._interval
+        delay = start - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+# one limiter for the whole process, so concurrent triage runs (several
+# sessions clicking at once) share the OpenRouter quota
+_TRIAGE_LIMITER = _RateLimiter(20)
+
+
+def _triage_batch(
+    api_key: str,
+    batch: list[dict],
+    limiter: _RateLimiter,
+    trace: Optional[ai_telemetry.CallTrace] = None,
+) -> dict[str, dict]:
+    system_prompt = (
+        "You are a SOC triage assistant. For every incident in the input, return "
+        "one JSON object with keys: incident_id, severity (one of Low, Medium, High, "
+        "Critical), category (short label), next_step (one sentence). "
+        "Reply with a single JSON array and nothing else."
+    )
+    user_message = "Incidents (one JSON object per line):\n" + "\n".join(
+        _incident_line(i) for i in batch
+    )
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": user_message},
+    ]
+
+    limiter.wait()
+    try:
+        data = _post_chat(api_key, messages, max_tokens=60 * len(batch) + 100, trace=trace)
+        content = data["choices"][0]["message"]["content"]
+    except Exception:
+        return {}
+
+    return parse_triage_output(content, {str(i.get("incident_id")) for i in batch})
+
+
+def triage_incidents(
+    incidents: list[dict],
+    token_budget: int = 3000,
+    max_workers: int = 4,
+    requests_per_minute: int = 20,
+) -> list[dict]:
+    """
+    Triage many incidents with as few API round trips as possible.
+
+    - Incidents whose content hash is cached are answered locally.
+    - The rest are packed into batches under `token_budget` prompt tokens.
+    - Batches run concurrently (`max_workers`) but never start faster
+      than `requests_per_minute`, counted across all triage runs in the
+      process.
+    - Incidents the model skipped, or any batch that failed, fall back to
+      the rule-based offline triage (not cached, so they are retried).
+
+    Returns one result dict per input incident, in input order, with
+    incident_id, suggested_severity, category, next_step and source
+    ("ai", "cache" or "offline").
+    """
+    trace = ai_telemetry.start_trace("triage", "cyber", MODEL)
+    results: dict[str, dict] = {}
+    pending: list[dict] = []
+    hashes: dict[str, str] = {}
+
+    for incident in incidents:
+        incident_id = str(incident.get("incident_id"))
+        content_hash = incident_content_hash(incident)
+        hashes[incident_id] = content_hash
+        cached = _cache_get(content_hash)
+        if cached is not None:
+            results[incident_id] = {**cached, "incident_id": incident_id, "source": "cache"}
+            trace.add_cache_hits()
+        else:
+            pending.append(incident)
+        metrics.cache_lookup("ai_triage", cached is not None)
+
+    _load_env()
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if pending and api_key:
+        from concurrent.futures import ThreadPoolExecutor
+
+        _TRIAGE_LIMITER.set_rate(requests_per_minute)
+        batches = pack_batches(pending, token_budget)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+            for batch_result in pool.map(lambda b: _triage_batch(api_key, b, _TRIAGE_LIMITER, trace), batches):
+                for incident_id, result in batch_result.items():
+                    results[incident_id] = result
+                    _cache_put(hashes[incident_id], result)
+
+    ordered = []
+    offline = 0
+    for incident in incidents:
+        result = results.get(str(incident.get("incident_id")))
+        if result is None:
+            result = _offline_triage(incident)
+            offline += 1
+        ordered.append(result)
+
+    if offline:
+        _finish(trace, "no_api_key" if not api_key else "batch_failed")
+    else:
+        _finish(trace)
+    return ordered
@@ -0,0 +1,120 @@
+"""
+ai_telemetry.py
+
+Low-overhead telemetry for AI calls made by ai_helper.py.
+
+Every assistant request (free-text question or batch triage run) produces
+one AICallRecord with:
+- end-to-end latency and time spent inside HTTP calls
+- HTTP status of the last API call
+- prompt / completion tokens from the response `usage` field
+- cache hits (batch triage)
+- fallback reason when the offline assistant had to answer
+
+Records are kept in an in-memory ring buffer (ring_buffer.RecordBuffer,
+a bounded deque), so recording is a single append and memory use is
+fixed. The Admin page reads it to show percentiles per dashboard and per
+model.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional
+
+from ring_buffer import RecordBuffer, percentile  # noqa: F401 (percentile is re-exported)
+
+RING_SIZE = int(os.getenv("AI_TELEMETRY_RING_SIZE", "5000"))
+
+_BUFFER = RecordBuffer(RING_SIZE, time_field="started_at")
+
+
+@dataclass
+class AICallRecord:
+    kind: str  # "chat" or "triage"
+    dashboard: str
+    model: str
+    started_at: float
+    latency_ms: float = 0.0
+    api_ms: float = 0.0
+    api_calls: int = 0
+    http_status: Optional[int] = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cache_hits: int = 0
+    fallback_reason: Optional[str] = None
+
+
+@dataclass
+class CallTrace:
+    """
+    Collects telemetry while one assistant request is in flight. Safe to
+    update from several worker threads (batch triage).
+    """
+
+    record: AICallRecord
+    _t0: float = field(default_factory=time.perf_counter)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def add_api_call(self, elapsed_ms: float, http_status: Optional[int], usage: Optional[dict]) -> None:
+        with self._lock:
+            self.record.api_calls += 1
+            self.record.api_ms += elapsed_ms
+            if http_status is not None:
+                self.record.http_status = http_status
+            if usage:
+                self.record.prompt_tokens += int(usage.get("prompt_tokens") or 0)
+                self.record.completion_tokens += int(usage.get("completion_tokens") or 0)
+
+    def add_cache_hits(self, n: int = 1) -> None:
+        with self._lock:
+            self.record.cache_hits += n
+
+    def finish(self, fallback_reason: Optional[str] = None) -> AICallRecord:
+        self.record.latency_ms = (time.perf_counter() - self._t0) * 1000.0
+        self.record.fallback_reason = fallback_reason
+        _BUFFER.append(self.record)
+        return self.record
+
+
+def start_trace(kind: str, dashboard: str, model: str) -> CallTrace:
+    return CallTrace(AICallRecord(kind=kind, dashboard=dashboard, model=model, started_at=time.time()))
+
+
+def records() -> List[dict]:
+    """Snapshot of the ring buffer as plain dicts (oldest first)."""
+    return _BUFFER.records()
+
+
+def clear() -> None:
+    _BUFFER.clear()
+
+
+def _totals(items: List[AICallRecord]) -> Dict[str, object]:
+    return {
+        "prompt_tokens": sum(r.prompt_tokens for r in items),
+        "completion_tokens": sum(r.completion_tokens for r in items),
+        "cache_hits": sum(r.cache_hits for r in items),
+        "fallback_rate": round(sum(1 for r in items if r.fallback_reason) / len(items), 3),
+    }
+
+
+def summarize(group_by: Iterable[str] = ("dashboard",)) -> List[Dict[str, object]]:
+    """
+    Aggregate the ring buffer by the given record fields, e.g.
+    ("dashboard",), ("model",) or ("dashboard", "kind").
+    """
+    keys = tuple(group_by)
+    rows = _BUFFER.summarize(keys, "latency_ms", percentiles=(50, 95, 99), extra=_totals)
+    return sorted(rows, key=lambda row: tuple(str(row[k]) for k in keys))
+
+
+def fallback_reasons() -> Dict[str, int]:
+    counts: Dict[str, int] = {}
+    for r in _BUFFER.snapshot():
+        if r.fallback_reason:
+            counts[r.fallback_reason] = counts.get(r.fallback_reason, 0) + 1
+    return counts
@@ -0,0 +1,117 @@
+"""
+benchmarks/ai_latency.py
+
+End-to-end latency benchmark for ai_helper.ask_cyber_assistant.
+
+By default it starts the local mock server (benchmarks/mock_openrouter.py)
+in-process, points OPENROUTER_BASE_URL at it and fires requests at several
+concurrency levels, reporting p50 / p95 / p99 latency per level.
+
+Usage:
+    python -m benchmarks.ai_latency --requests 200 --concurrency 1,4,16
+    python -m benchmarks.ai_latency --latency lognormal:400,0.6 --error-rate 0.05
+    python -m benchmarks.ai_latency --base-url http://127.0.0.1:8787/api/v1
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+
+from ai_telemetry import percentile
+from benchmarks.mock_openrouter import MockConfig, start_in_background
+
+QUESTION = "Which severity should we prioritise first?"
+CONTEXT = (
+    "Total incidents: 40. By severity: High: 12, Medium: 15, Low: 9, Critical: 4. "
+    "By status: Open: 18, In Progress: 10, Resolved: 8, Closed: 4."
+)
+
+
+def _timed_call(ask) -> tuple[float, bool]:
+    start = time.perf_counter()
+    answer = ask(QUESTION, CONTEXT)
+    elapsed_ms = (time.perf_counter() - start) * 1000.0
+    return elapsed_ms, answer.startswith("Offline assistant mode")
+
+
+def run_level(concurrency: int, total_requests: int) -> Dict[str, float]:
+    # imported here so OPENROUTER_* variables are already set
+    from ai_helper import ask_cyber_assistant
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: _timed_call(ask_cyber_assistant), range(total_requests)))
+    wall_s = time.perf_counter() - start
+
+    latencies = [r[0] for r in results]
+    fallbacks = sum(1 for r in results if r[1])
+
+    return {
+        "concurrency": concurrency,
+        "requests": total_requests,
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(max(latencies), 1),
+        "throughput_rps": round(total_requests / wall_s, 2) if wall_s else 0.0,
+        "offline_fallbacks": fallbacks,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ask_cyber_assistant latency benchmark")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated levels")
+    parser.add_argument("--base-url", default=None, help="use an already running server")
+    parser.add_argument("--latency", default="lognormal:300,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    server = None
+    if args.base_url:
+        base_url = args.base_url
+    else:
+        config = MockConfig(
+            latency=args.latency,
+            error_rate=args.error_rate,
+            rate_limit_rate=args.rate_limit_rate,
+            seed=args.seed,
+        )
+        server, base_url = start_in_background(config)
+
+    os.environ["OPENROUTER_BASE_URL"] = base_url
+    os.environ.setdefault("OPENROUTER_API_KEY", "mock-key")
+
+    levels = [int(x) for x in args.concurrency.split(",") if x.strip()]
+    results = []
+    try:
+        for level in levels:
+            results.append(run_level(level, args.requests))
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    if args.json:
+        print(json.dumps({"base_url": base_url, "results": results}, indent=2))
+        return
+
+    print(f"Target: {base_url}")
+    print(f"{'conc':>5} {'reqs':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'max ms':>9} {'req/s':>8} {'offline':>8}")
+    for r in results:
+        print(
+            f"{r['concurrency']:>5} {r['requests']:>6} {r['p50_ms']:>9} {r['p95_ms']:>9} "
+            f"{r['p99_ms']:>9} {r['max_ms']:>9} {r['throughput_rps']:>8} {r['offline_fallbacks']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
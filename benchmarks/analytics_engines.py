@@ -0,0 +1,116 @@
+"""
+benchmarks/analytics_engines.py
+
+Compare the two analytics engines (services/analytics.py) on the same
+dashboard metrics.
+
+It builds a throwaway SQLite database with synthetic incidents, tickets
+and datasets (benchmarks/synthetic.py), then runs every metric on SQLite
+and on the DuckDB copy, unfiltered and with a typical filter selection,
+and reports the median time per query. The one-off DuckDB load time is reported separately.
+
+Usage:
+    python -m benchmarks.analytics_engines --rows 200000
+    python -m benchmarks.analytics_engines --rows 1000000 --repeat 5 --json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from functools import partial
+from pathlib import Path
+from typing import Dict, List
+
+from DB.db import DatabaseManager
+from benchmarks.synthetic import build_database
+
+FILTERS = {
+    "cyber_incidents": {"filters": {"severity": ["High", "Critical"], "status": ["Open", "In Progress"]}},
+    "it_tickets": {"filters": {"priority": ["High", "Critical"]}},
+    "datasets_metadata": {"filters": {"source_system": ["CRM", "ERP", "Web"]}},
+}
+
+
+def time_ms(fn, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def run(rows: int, repeat: int) -> Dict[str, object]:
+    from services.analytics import METRICS, AnalyticsService, duckdb_available
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = Path(tmp) / "bench.db"
+        started = time.perf_counter()
+        build_database(db_path, rows)
+        build_s = time.perf_counter() - started
+
+        analytics = AnalyticsService(partial(DatabaseManager, db_path))
+        engines = ["sqlite"]
+        load_ms: Dict[str, float] = {}
+        if duckdb_available():
+            engines.append("duckdb")
+            snapshot = analytics.snapshot()
+            for table in FILTERS:
+                started = time.perf_counter()
+                snapshot.load_table(table)
+                load_ms[table] = (time.perf_counter() - started) * 1000
+
+        results: List[Dict[str, object]] = []
+        for name, metric in METRICS.items():
+            for label, kwargs in (("all rows", {}), ("filtered", FILTERS[metric.table])):
+                row: Dict[str, object] = {"metric": name, "selection": label}
+                for engine in engines:
+                    row[f"{engine}_ms"] = round(
+                        time_ms(partial(analytics.metric, name, engine=engine, **kwargs), repeat), 2
+                    )
+                if "duckdb_ms" in row and row["duckdb_ms"]:
+                    row["speedup"] = round(row["sqlite_ms"] / row["duckdb_ms"], 1)
+                results.append(row)
+
+    return {
+        "rows_per_table": rows,
+        "build_seconds": round(build_s, 1),
+        "duckdb_load_ms": {k: round(v, 1) for k, v in load_ms.items()},
+        "results": results,
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000, help="rows per table")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    report = run(args.rows, args.repeat)
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return 0
+
+    print(f"{report['rows_per_table']:,} rows per table (built in {report['build_seconds']}s)")
+    if not report["duckdb_load_ms"]:
+        print("duckdb is not installed; only SQLite was measured (pip install duckdb).")
+    for table, ms in report["duckdb_load_ms"].items():
+        print(f"  DuckDB load {table}: {ms:,.1f} ms")
+    print()
+    print(f"{'metric':<34} {'selection':<10} {'sqlite ms':>10} {'duckdb ms':>10} {'speedup':>8}")
+    for r in report["results"]:
+        print(
+            f"{r['metric']:<34} {r['selection']:<10} {r['sqlite_ms']:>10.2f} "
+            f"{r.get('duckdb_ms', float('nan')):>10.2f} {r.get('speedup', ''):>8}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,143 @@
+"""
+benchmarks/import_time.py
+
+Cold-start regression guard for the entry points.
+
+For each target module it runs a fresh interpreter with `-X importtime`,
+sums the cumulative import time of the top-level imports and checks that
+
+- the total stays under the module's budget, and
+- none of the heavy dependencies (pandas, plotly, requests, dotenv, ...)
+  were imported.
+
+Budgets are ratios to a baseline measured in the same run: importing a
+fixed set of standard-library modules (BASELINE). Absolute milliseconds
+vary too much between machines and runs (the same tree measured 52-57
+ms against a 60 ms budget); the ratio cancels out how fast the machine
+is at the moment. Each module is measured several times, interleaved
+with the baseline, and the median ratio is used.
+
+Usage:
+    python -m benchmarks.import_time            # exit code 1 on regression
+    python -m benchmarks.import_time --json
+    python -m benchmarks.import_time --scale 1.5  # looser budgets
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+
+# standard-library imports the budgets are relative to (about 40 ms on a
+# typical laptop)
+BASELINE = "json, sqlite3, threading, concurrent.futures, dataclasses, pathlib, typing, hashlib"
+
+# module -> (budget as a multiple of the baseline, modules that must NOT be imported)
+TARGETS: Dict[str, tuple[float, tuple[str, ...]]] = {
+    "ai_helper": (1.5, ("requests", "dotenv", "pandas", "numpy", "plotly")),
+    "services.users_service": (2.0, ("pandas", "numpy", "plotly", "requests", "bcrypt")),
+    "services.incidents_service": (2.5, ("pandas", "numpy", "plotly", "requests")),
+    # streamlit itself dominates these two; the guard is mostly about the
+    # forbidden list
+    "app": (40.0, ("pandas", "plotly", "requests", "dotenv")),
+    "pages.Login": (40.0, ("pandas", "plotly", "requests", "dotenv", "bcrypt")),
+}
+
+LINE_RE = re.compile(r"^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)")
+
+
+def measure(module: str) -> tuple[float, List[str]]:
+    """
+    Import `module` in a fresh interpreter. Returns (total ms, names of all
+    imported modules).
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="0")
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr[-2000:]}")
+
+    total_us = 0
+    imported: List[str] = []
+    for line in proc.stderr.splitlines():
+        m = LINE_RE.match(line)
+        if not m:
+            continue
+        cumulative_us, indent, name = int(m.group(2)), m.group(3), m.group(4)
+        imported.append(name)
+        # only top-level entries (one leading space) so nothing is counted twice;
+        # interpreter start-up modules (site, encodings) are excluded
+        if len(indent) == 1 and name not in ("site", "encodings") and not name.startswith("_"):
+            total_us += cumulative_us
+
+    return total_us / 1000.0, imported
+
+
+def run(repeat: int = 5, scale: float = 1.0) -> List[dict]:
+    results = []
+    for module, (budget, forbidden) in TARGETS.items():
+        timings = []
+        baselines = []
+        imported: List[str] = []
+        for _ in range(repeat):
+            # back to back, so both see the same machine load
+            baselines.append(measure(BASELINE)[0])
+            ms, imported = measure(module)
+            timings.append(ms)
+
+        roots = {name.split(".")[0] for name in imported}
+        leaked = sorted(f for f in forbidden if f in roots)
+        ratio = statistics.median(ms / base for ms, base in zip(timings, baselines))
+        results.append(
+            {
+                "module": module,
+                "median_ms": round(statistics.median(timings), 1),
+                "baseline_ms": round(statistics.median(baselines), 1),
+                "ratio": round(ratio, 2),
+                "budget_ratio": budget * scale,
+                "heavy_imports": leaked,
+                "ok": ratio <= budget * scale and not leaked,
+            }
+        )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time regression guard")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply all budget ratios")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    results = run(args.repeat, args.scale)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        print(f"{'module':<30} {'median ms':>10} {'baseline ms':>12} {'ratio':>6} {'budget':>7}  heavy imports")
+        for r in results:
+            flag = "" if r["ok"] else "  <-- FAIL"
+            print(
+                f"{r['module']:<30} {r['median_ms']:>10} {r['baseline_ms']:>12} {r['ratio']:>6} "
+                f"{r['budget_ratio']:>7}  {', '.join(r['heavy_imports']) or '-'}{flag}"
+            )
+
+    sys.exit(0 if all(r["ok"] for r in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
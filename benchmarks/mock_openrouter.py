@@ -0,0 +1,268 @@
+"""
+benchmarks/mock_openrouter.py
+
+Local stand-in for the OpenRouter Chat Completions API.
+
+It lets us load-test ai_helper.py without spending real API quota, and
+see how the dashboards behave when the LLM is slow or failing.
+
+Features:
+- configurable latency distribution (fixed, uniform, normal, lognormal,
+  exponential)
+- configurable rate of HTTP 500 errors and HTTP 429 (rate limited) replies
+- OpenAI-style streaming (server-sent events) when the request has
+  "stream": true
+- a "usage" block with rough prompt / completion token counts
+
+Usage:
+    python -m benchmarks.mock_openrouter --port 8787 --latency lognormal:400,0.5
+    export OPENROUTER_BASE_URL=http://127.0.0.1:8787/api/v1
+    export OPENROUTER_API_KEY=dummy
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+
+# -------------------------------------------------------------------
+# Configuration
+# -------------------------------------------------------------------
+@dataclass
+class MockConfig:
+    latency: str = "fixed:200"  # "<distribution>:<params>", values in ms
+    error_rate: float = 0.0  # share of requests answered with HTTP 500
+    rate_limit_rate: float = 0.0  # share of requests answered with HTTP 429
+    retry_after: int = 1  # seconds, sent with 429 replies
+    stream_chunks: int = 8  # number of SSE chunks per streamed answer
+    seed: Optional[int] = None
+
+
+def sample_latency_ms(spec: str, rng: random.Random) -> float:
+    """
+    Draw one latency value (milliseconds) from a spec such as:
+
+    - "fixed:200"
+    - "uniform:100,800"
+    - "normal:300,50"          (mean, std dev)
+    - "lognormal:300,0.6"      (median, sigma)
+    - "exponential:250"        (mean)
+    """
+    kind, _, raw = spec.partition(":")
+    params = [float(p) for p in raw.split(",") if p.strip()]
+
+    if kind == "fixed":
+        value = params[0]
+    elif kind == "uniform":
+        value = rng.uniform(params[0], params[1])
+    elif kind == "normal":
+        value = rng.gauss(params[0], params[1])
+    elif kind == "lognormal":
+        # median of a lognormal is exp(mu)
+        value = rng.lognormvariate(math.log(params[0]), params[1])
+    elif kind == "exponential":
+        value = rng.expovariate(1.0 / params[0])
+    else:
+        raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+    return max(0.0, value)
+
+
+def _estimate_tokens(text: str) -> int:
+    # Same rough rule of thumb OpenAI documents: ~4 characters per token.
+    return max(1, len(text) // 4)
+
+
+# -------------------------------------------------------------------
+# HTTP handler
+# -------------------------------------------------------------------
+class _Handler(BaseHTTPRequestHandler):
+    server_version = "MockOpenRouter/1.0"
+    protocol_version = "HTTP/1.1"
+
+    # silence the default per-request logging
+    def log_message(self, format, *args):  # noqa: A002
+        return
+
+    def _send_json(self, status: int, body: dict, extra_headers: Optional[dict] = None) -> None:
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (extra_headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):  # noqa: N802
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": "not found"}})
+            return
+
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            payload = json.loads(self.rfile.read(length) or b"{}")
+        except json.JSONDecodeError:
+            self._send_json(400, {"error": {"message": "invalid JSON"}})
+            return
+
+        config: MockConfig = self.server.config
+        rng: random.Random = self.server.rng
+
+        with self.server.rng_lock:
+            latency_ms = sample_latency_ms(config.latency, rng)
+            roll = rng.random()
+
+        time.sleep(latency_ms / 1000.0)
+
+        if roll < config.rate_limit_rate:
+            self._send_json(
+                429,
+                {"error": {"message": "Rate limit exceeded (mock)", "code": 429}},
+                {"Retry-After": str(config.retry_after)},
+            )
+            return
+
+        if roll < config.rate_limit_rate + config.error_rate:
+            self._send_json(500, {"error": {"message": "Internal error (mock)", "code": 500}})
+            return
+
+        messages = payload.get("messages", [])
+        prompt_text = " ".join(str(m.get("content", "")) for m in messages)
+        question = messages[-1].get("content", "") if messages else ""
+        answer = (
+            "Mock analysis: focus on open High and Critical items first, "
+            f"then review the backlog. (question was {len(question)} characters)"
+        )
+        model = payload.get("model", "mock-model")
+        usage = {
+            "prompt_tokens": _estimate_tokens(prompt_text),
+            "completion_tokens": _estimate_tokens(answer),
+        }
+        usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+        completion_id = f"chatcmpl-mock-{uuid.uuid4().hex[:12]}"
+
+        if payload.get("stream"):
+            self._stream(completion_id, model, answer, usage, config.stream_chunks)
+            return
+
+        self._send_json(
+            200,
+            {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": model,
+                "choices": [
+                    {
+                        "index": 0,
+                        "message": {"role": "assistant", "content": answer},
+                        "finish_reason": "stop",
+                    }
+                ],
+                "usage": usage,
+            },
+        )
+
+    def _stream(self, completion_id: str, model: str, answer: str, usage: dict, chunks: int) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+
+        step = max(1, len(answer) // max(1, chunks))
+        pieces = [answer[i:i + step] for i in range(0, len(answer), step)]
+
+        for i, piece in enumerate(pieces):
+            event = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }
+            if i == len(pieces) - 1:
+                event["choices"][0]["finish_reason"] = "stop"
+                event["usage"] = usage
+            self.wfile.write(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+            time.sleep(0.01)
+
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+# -------------------------------------------------------------------
+# Server helpers
+# -------------------------------------------------------------------
+def make_server(host: str = "127.0.0.1", port: int = 8787, config: Optional[MockConfig] = None) -> ThreadingHTTPServer:
+    """
+    Build (but do not start) a threaded mock server. Use port=0 to let the
+    OS pick a free port; the chosen port is in server.server_address[1].
+    """
+    config = config or MockConfig()
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    server.config = config
+    server.rng = random.Random(config.seed)
+    server.rng_lock = threading.Lock()
+    return server
+
+
+def start_in_background(config: Optional[MockConfig] = None, host: str = "127.0.0.1", port: int = 0):
+    """
+    Start a mock server on a daemon thread.
+
+    Returns (server, base_url); call server.shutdown() when done.
+    """
+    server = make_server(host, port, config)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    bound_host, bound_port = server.server_address[:2]
+    return server, f"http://{bound_host}:{bound_port}/api/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local OpenRouter stand-in server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--latency", default="fixed:200", help="e.g. lognormal:400,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    config = MockConfig(
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        seed=args.seed,
+    )
+    # validate the spec before serving
+    sample_latency_ms(config.latency, random.Random(0))
+
+    server = make_server(args.host, args.port, config)
+    print(f"Mock OpenRouter listening on http://{args.host}:{args.port}/api/v1")
+    print(f"export OPENROUTER_BASE_URL=http://{args.host}:{args.port}/api/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
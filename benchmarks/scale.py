@@ -0,0 +1,389 @@
+"""
+benchmarks/scale.py
+
+How the dashboard data paths behave as the tables grow.
+
+For each size (rows per table) it builds a synthetic database
+(benchmarks/synthetic.py) and times, per domain (incidents, tickets,
+datasets):
+
+- service.count_*       filtered COUNT(*) behind the paged grid
+- service.page_* first  first grid page, filtered, newest first
+- service.page_* deep   a page halfway through the table
+- service.list_*        full table read (what the filter engine loads)
+- *_to_df               the page's rows -> typed DataFrame converter
+- engine build          BitmapFilterEngine over that frame
+- apply_filters         the engine path of the page's apply_filters with a
+                        selective multiselect + date range + search
+- apply_filters (page)  the page function itself, default selections
+                        (needs streamlit importable)
+- build_*_context       the AI assistant's summary of the filtered frame
+- changes_since         an empty change-log delta (every rerun pays it)
+
+Full-table paths keep every row in memory, so above --max-in-memory
+rows they are recorded as skipped instead of run.
+
+Results go to a JSON file (one record per size / domain / benchmark with
+median and min milliseconds) so runs can be compared over time:
+
+Usage:
+    python -m benchmarks.scale --sizes 10000,100000
+    python -m benchmarks.scale                          # 10k .. 10M, slow
+    python -m benchmarks.scale --sizes 100000 --compare benchmarks/results/scale-baseline.json
+    python -m benchmarks.scale --work-dir /data/bench --keep   # reuse built databases
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from datetime import date, datetime
+from functools import partial
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from DB.crud import DateRange, TABLE_COLUMNS
+from DB.db import DatabaseManager
+from benchmarks.synthetic import DEFAULT_SEED, END_DATE, build_database
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+RESULTS_DIR = PROJECT_ROOT / "benchmarks" / "results"
+
+SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+MAX_IN_MEMORY = 2_000_000
+# a benchmark stops repeating once it has used this much time
+TIME_BUDGET_S = 10.0
+# --compare flags a benchmark this much slower than the baseline
+TOLERANCE = 0.25
+
+LAST_90_DAYS = DateRange(date.fromordinal(END_DATE.toordinal() - 90), END_DATE)
+
+
+@dataclass(frozen=True)
+class Domain:
+    table: str
+    service_cls: str  # "module:Class"
+    noun: str  # list_<noun>, count_<noun>, page_<noun>
+    page_module: str
+    service_attr: str  # module-level service in the page
+    to_df: str
+    context: str
+    engine_fn: str
+    key_column: str
+    engine_columns: tuple
+    schema: str  # name in services.frames
+    date_column: str
+    selection: Dict[str, list]
+    search_column: Optional[str] = None
+    search: Optional[str] = None
+
+
+DOMAINS = {
+    "incidents": Domain(
+        table="cyber_incidents",
+        service_cls="services.incidents_service:IncidentService",
+        noun="incidents",
+        page_module="pages.Cyber_Dashboard",
+        service_attr="incident_service",
+        to_df="incidents_to_df",
+        context="build_incident_context",
+        engine_fn="incident_filter_engine",
+        key_column="incident_id",
+        engine_columns=("severity", "status"),
+        schema="INCIDENT_SCHEMA",
+        date_column="reported_at",
+        selection={"severity": ["High", "Critical"], "status": ["Open", "In Progress"]},
+        search_column="description",
+        search="vpn",
+    ),
+    "tickets": Domain(
+        table="it_tickets",
+        service_cls="services.tickets_service:TicketService",
+        noun="tickets",
+        page_module="pages.IT_Dashboard",
+        service_attr="ticket_service",
+        to_df="tickets_to_df",
+        context="build_it_context",
+        engine_fn="ticket_filter_engine",
+        key_column="ticket_id",
+        engine_columns=("priority", "status", "assigned_to"),
+        schema="TICKET_SCHEMA",
+        date_column="opened_at",
+        selection={"priority": ["High", "Critical"], "assigned_to": ["tech_001", "tech_002", "tech_010"]},
+    ),
+    "datasets": Domain(
+        table="datasets_metadata",
+        service_cls="services.datasets_service:DatasetService",
+        noun="datasets",
+        page_module="pages.Data_Dashboard",
+        service_attr="dataset_service",
+        to_df="datasets_to_df",
+        context="build_data_context",
+        engine_fn="dataset_filter_engine",
+        key_column="dataset_name",
+        engine_columns=("owner", "source_system"),
+        schema="DATASET_SCHEMA",
+        date_column="created_at",
+        selection={"source_system": ["CRM", "ERP"]},
+        search_column="dataset_name",
+        search="0042",
+    ),
+}
+
+
+# --------- Timing ---------
+
+def measure(fn: Callable[[], Any], repeat: int) -> Dict[str, Any]:
+    """Run fn up to `repeat` times (fewer once TIME_BUDGET_S is used up)."""
+    samples = []
+    result = None
+    spent = 0.0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        samples.append(elapsed * 1000)
+        spent += elapsed
+        if spent > TIME_BUDGET_S:
+            break
+    record = {
+        "median_ms": round(statistics.median(samples), 3),
+        "min_ms": round(min(samples), 3),
+        "samples": len(samples),
+    }
+    if hasattr(result, "__len__"):
+        record["rows"] = len(result)
+    elif isinstance(result, int):
+        record["rows"] = result
+    return record
+
+
+def _load(ref: str):
+    module, _, name = ref.partition(":")
+    return getattr(__import__(module, fromlist=[name]), name)
+
+
+def _page(domain: Domain):
+    """The dashboard module, or None when streamlit is not importable."""
+    try:
+        return __import__(domain.page_module, fromlist=["_"])
+    except ImportError:
+        return None
+
+
+# --------- Suite ---------
+
+def bench_domain(db_path: Path, size: int, domain: Domain, repeat: int, max_in_memory: int) -> List[Dict[str, Any]]:
+    import services.frames as frames
+    from services.filter_engine import BitmapFilterEngine
+
+    try:
+        from components.date_range import mask_date_range
+    except ImportError:
+        # components/ imports streamlit; same inclusive-day semantics
+        def mask_date_range(series, rng):
+            import pandas as pd
+            return (series >= pd.Timestamp(rng.start)) & (series < pd.Timestamp(rng.end) + pd.Timedelta(days=1))
+
+    results: List[Dict[str, Any]] = []
+
+    def record(name, fn=None, skipped=None):
+        entry = {"size": size, "domain": domain.table, "benchmark": name}
+        if skipped:
+            entry["skipped"] = skipped
+        else:
+            entry.update(measure(fn, repeat))
+        results.append(entry)
+        print(f"  {size:>10,} {domain.noun:<10} {name:<28} "
+              + (f"skipped ({skipped})" if skipped else f"{entry['median_ms']:>11,.2f} ms"))
+
+    service = _load(domain.service_cls)(partial(DatabaseManager, db_path), write_queue=None)
+    filters = {**domain.selection, domain.date_column: LAST_90_DAYS}
+    count = getattr(service, f"count_{domain.noun}")
+    page = getattr(service, f"page_{domain.noun}")
+
+    record(f"count_{domain.noun}", lambda: count(filters))
+    record(f"page_{domain.noun} first", lambda: page(filters, order_by=domain.date_column, descending=True))
+    record(f"page_{domain.noun} deep", lambda: page(offset=size // 2))
+    record("changes_since", lambda: service.changes_since(service.change_seq()).rows)
+
+    schema = getattr(frames, domain.schema)
+    page_module = _page(domain)
+    if page_module is not None:
+        to_df = getattr(page_module, domain.to_df)
+        build_context = getattr(page_module, domain.context)
+    else:
+        # same conversion the page does, for trees without streamlit
+        def to_df(rows):
+            return frames.rows_to_frame(rows, TABLE_COLUMNS[domain.table], schema)
+        build_context = None
+
+    if max_in_memory and size > max_in_memory:
+        reason = f"more than --max-in-memory {max_in_memory:,} rows"
+        for name in (f"list_{domain.noun}", domain.to_df, "engine build", "apply_filters",
+                     "apply_filters (page)", domain.context):
+            record(name, skipped=reason)
+        return results
+
+    rows = getattr(service, f"list_{domain.noun}")()
+    record(f"list_{domain.noun}", getattr(service, f"list_{domain.noun}"))
+    record(domain.to_df, lambda: to_df(rows))
+    df = to_df(rows)
+    del rows
+    results[-1]["frame_bytes"] = frames.frame_bytes(df)
+
+    def build_engine():
+        return BitmapFilterEngine(df, key_column=domain.key_column, columns=domain.engine_columns, schema=schema)
+
+    record("engine build", build_engine)
+    engine = build_engine()
+
+    def engine_path():
+        out = engine.filter(domain.selection)
+        out = out[mask_date_range(out[domain.date_column], LAST_90_DAYS)]
+        if domain.search:
+            out = out[out[domain.search_column].fillna("").str.lower().str.contains(domain.search, regex=False)]
+        return out
+
+    record("apply_filters", engine_path)
+    filtered = engine_path()
+
+    if page_module is None:
+        record("apply_filters (page)", skipped="streamlit not installed")
+        record(domain.context, skipped="streamlit not installed")
+        return results
+
+    # point the page at the benchmark database and run its real
+    # apply_filters (widgets return their defaults outside `streamlit run`)
+    setattr(page_module, domain.service_attr, service)
+    getattr(page_module, domain.engine_fn).clear()
+    live = page_module.__dict__[f"load_{domain.noun}_df"]()
+    record("apply_filters (page)", lambda: page_module.apply_filters(live))
+    record(domain.context, lambda: build_context(filtered))
+    return results
+
+
+def run(sizes, domains, repeat: int, seed: int, work_dir: Optional[Path], keep: bool,
+        max_in_memory: int) -> Dict[str, Any]:
+    results: List[Dict[str, Any]] = []
+    builds: Dict[str, float] = {}
+    tmp = None
+    if work_dir is None:
+        tmp = tempfile.TemporaryDirectory()
+        work_dir = Path(tmp.name)
+    work_dir.mkdir(parents=True, exist_ok=True)
+
+    try:
+        for size in sizes:
+            db_path = work_dir / f"scale_{size}_seed{seed}.db"
+            if not (keep and db_path.exists()):
+                db_path.unlink(missing_ok=True)
+                print(f"Building {size:,} rows per table ...", flush=True)
+                started = time.perf_counter()
+                build_database(db_path, size, seed)
+                builds[str(size)] = round(time.perf_counter() - started, 1)
+            for name in domains:
+                results.extend(bench_domain(db_path, size, DOMAINS[name], repeat, max_in_memory))
+            if not keep:
+                db_path.unlink(missing_ok=True)
+    finally:
+        if tmp is not None:
+            tmp.cleanup()
+
+    return {
+        "suite": "scale",
+        "meta": _meta(seed, repeat, max_in_memory),
+        "build_seconds": builds,
+        "results": results,
+    }
+
+
+def _meta(seed: int, repeat: int, max_in_memory: int) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=PROJECT_ROOT, capture_output=True, text=True, timeout=10
+        ).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "max_in_memory": max_in_memory,
+    }
+
+
+# --------- Comparing runs ---------
+
+def compare(report: Dict[str, Any], baseline: Dict[str, Any], tolerance: float = TOLERANCE) -> List[Dict[str, Any]]:
+    """Benchmarks slower than baseline * (1 + tolerance), matched on size / domain / benchmark."""
+    def key(r):
+        return r["size"], r["domain"], r["benchmark"]
+
+    before = {key(r): r for r in baseline.get("results", []) if "median_ms" in r}
+    regressions = []
+    for r in report["results"]:
+        old = before.get(key(r))
+        if old is None or "median_ms" not in r or not old["median_ms"]:
+            continue
+        ratio = r["median_ms"] / old["median_ms"]
+        if ratio > 1 + tolerance:
+            regressions.append({**dict(zip(("size", "domain", "benchmark"), key(r))),
+                                "baseline_ms": old["median_ms"], "median_ms": r["median_ms"],
+                                "ratio": round(ratio, 2)})
+    return regressions
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default=",".join(str(s) for s in SIZES), help="comma-separated rows per table")
+    parser.add_argument("--domains", default=",".join(DOMAINS), help="comma-separated subset of " + ", ".join(DOMAINS))
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--max-in-memory", type=int, default=MAX_IN_MEMORY,
+                        help="skip full-table paths above this many rows (0 = never skip)")
+    parser.add_argument("--work-dir", type=Path, help="where to build the databases (default: a temp dir)")
+    parser.add_argument("--keep", action="store_true", help="keep and reuse the databases in --work-dir")
+    parser.add_argument("--out", type=Path, help="results file (default: benchmarks/results/scale-<time>.json)")
+    parser.add_argument("--compare", type=Path, help="baseline results file; exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    domains = [d for d in args.domains.split(",") if d]
+    unknown = set(domains) - set(DOMAINS)
+    if unknown:
+        parser.error(f"unknown domains: {', '.join(sorted(unknown))}")
+
+    report = run(sizes, domains, args.repeat, args.seed, args.work_dir, args.keep, args.max_in_memory)
+
+    out = args.out or RESULTS_DIR / f"scale-{datetime.now():%Y%m%d-%H%M%S}.json"
+    out.parent.mkdir(parents=True, exist_ok=True)
+    out.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    print(f"\nResults written to {out}")
+
+    if args.compare:
+        baseline = json.loads(args.compare.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.compare}:")
+            for r in regressions:
+                print(f"  {r['size']:>10,} {r['domain']:<18} {r['benchmark']:<28} "
+                      f"{r['baseline_ms']:,.2f} -> {r['median_ms']:,.2f} ms (x{r['ratio']})")
+            return 1
+        print(f"No regressions against {args.compare} (tolerance {args.tolerance:.0%}).")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""
+benchmarks/synthetic.py
+
+Seeded generator of realistic-looking incidents, tickets and datasets,
+for trying the dashboards and services at production volume.
+
+The same seed always gives the same rows. The shape follows what the
+real feeds look like rather than uniform noise:
+
+- severities / priorities are skewed (mostly Low and Medium, few Critical)
+- work is concentrated on a few people: assignees and dataset owners
+  follow a Zipf distribution
+- dates cover DAYS years up to END_DATE, denser towards the end (the
+  volume grows) and thinner at weekends
+- recent records are mostly Open / In Progress, old ones mostly closed;
+  resolution times are log-normal and shorter for higher severities
+
+Rows are produced in chunks with numpy; building a database is bound by
+SQLite's index maintenance (some tens of seconds per million rows). Output is either a SQLite database with the app's
+schema, or CSV files in the DATA/ layout (for DB/load_data.py).
+
+Usage:
+    python -m benchmarks.synthetic --rows 100000 --db /tmp/synthetic.db
+    python -m benchmarks.synthetic --rows 50000 --csv /tmp/synthetic_data
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import sys
+import time
+from datetime import date
+from pathlib import Path
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+import numpy as np
+
+from DB.cdc import ensure_change_log
+from DB.crud import TABLE_COLUMNS
+from DB.db import DatabaseManager
+from DB.schema import create_tables
+
+DEFAULT_SEED = 7
+END_DATE = date(2025, 6, 30)
+DAYS = 3 * 365
+CHUNK_SIZE = 50_000
+
+SEVERITIES = (("Low", 0.40), ("Medium", 0.35), ("High", 0.18), ("Critical", 0.07))
+PRIORITIES = (("Low", 0.35), ("Medium", 0.40), ("High", 0.20), ("Critical", 0.05))
+INCIDENT_TYPES = (
+    ("Phishing", 0.38), ("Malware", 0.20), ("Unauthorized Access", 0.14), ("DDoS", 0.08),
+    ("Ransomware", 0.06), ("Data Leak", 0.06), ("Insider Threat", 0.04), ("Misconfiguration", 0.04),
+)
+CATEGORIES = (
+    ("Password Reset", 0.30), ("Access Request", 0.18), ("Software", 0.17), ("Hardware", 0.12),
+    ("Network Issue", 0.10), ("Email", 0.08), ("Printer", 0.05),
+)
+SOURCES = (("CRM", 0.25), ("ERP", 0.22), ("Web", 0.18), ("AppServer", 0.15), ("Warehouse", 0.12), ("Sensors", 0.08))
+HOSTS = ("mail gateway", "file server", "VPN", "laptop", "web app", "database", "HR portal", "build server")
+
+ASSIGNEES = 60
+OWNERS = 25
+ZIPF_S = 1.1
+
+# median days to resolve per severity / priority (log-normal around it)
+RESOLUTION_MEDIAN_DAYS = {"Critical": 0.5, "High": 2.0, "Medium": 5.0, "Low": 9.0}
+
+_EPOCH = np.datetime64(END_DATE.isoformat(), "D")
+
+
+def _weights(pairs: Sequence[Tuple[str, float]]):
+    values = np.array([v for v, _ in pairs], dtype=object)
+    p = np.array([w for _, w in pairs], dtype=float)
+    return values, p / p.sum()
+
+
+def _zipf_people(prefix: str, n: int):
+    names = np.array([f"{prefix}_{i:03d}" for i in range(1, n + 1)], dtype=object)
+    p = 1.0 / np.arange(1, n + 1) ** ZIPF_S
+    return names, p / p.sum()
+
+
+def _pick(rng: np.random.Generator, pairs_or_arrays, n: int) -> np.ndarray:
+    values, p = pairs_or_arrays
+    return values[rng.choice(len(values), size=n, p=p)]
+
+
+def _days_ago(rng: np.random.Generator, n: int) -> np.ndarray:
+    """Age in days of n records: more recent records are more frequent, fewer at weekends."""
+    # density growing linearly towards END_DATE
+    ages = np.floor((1.0 - np.sqrt(rng.random(n))) * DAYS).astype(np.int64)
+    weekday = (_EPOCH - ages).astype("datetime64[D]").view("int64") % 7  # 0 = Thursday
+    weekend = (weekday == 2) | (weekday == 3)
+    moved = weekend & (rng.random(n) < 0.6)
+    # Saturday -> Friday, Sunday -> Monday
+    ages[moved] = np.maximum(0, ages[moved] + np.where(weekday[moved] == 2, 1, -1))
+    return ages
+
+
+def _iso(ages: np.ndarray) -> np.ndarray:
+    return np.datetime_as_string(_EPOCH - ages.astype("timedelta64[D]"), unit="D").astype(object)
+
+
+def _status_and_close(rng: np.random.Generator, ages: np.ndarray, levels: np.ndarray):
+    """Status correlated with age, and the close date for closed records."""
+    n = len(ages)
+    lag = np.zeros(n)
+    for level, median in RESOLUTION_MEDIAN_DAYS.items():
+        sel = levels == level
+        lag[sel] = rng.lognormal(np.log(median), 0.9, sel.sum())
+    lag = np.minimum(np.round(lag), ages).astype(np.int64)
+
+    p_closed = np.clip(ages / 30.0, 0.05, 0.97)
+    closed = rng.random(n) < p_closed
+    status = np.where(
+        closed,
+        np.where(rng.random(n) < 0.6, "Resolved", "Closed"),
+        np.where(rng.random(n) < 0.55, "Open", "In Progress"),
+    ).astype(object)
+    close_dates = np.where(closed, _iso(ages - lag), None)
+    return status, close_dates
+
+
+def _incidents(rng: np.random.Generator, start: int, n: int) -> List[tuple]:
+    ages = _days_ago(rng, n)
+    severity = _pick(rng, _weights(SEVERITIES), n)
+    status, resolved = _status_and_close(rng, ages, severity)
+    kind = _pick(rng, _weights(INCIDENT_TYPES), n)
+    host = np.array(HOSTS, dtype=object)[rng.integers(0, len(HOSTS), n)]
+    ids = [f"INC{i:08d}" for i in range(start, start + n)]
+    descriptions = [f"{k} detected on {h}" for k, h in zip(kind.tolist(), host.tolist())]
+    return list(zip(
+        ids, kind.tolist(), severity.tolist(), status.tolist(), _iso(ages).tolist(), resolved.tolist(),
+        _pick(rng, _zipf_people("analyst", ASSIGNEES), n).tolist(), descriptions,
+    ))
+
+
+def _tickets(rng: np.random.Generator, start: int, n: int) -> List[tuple]:
+    ages = _days_ago(rng, n)
+    priority = _pick(rng, _weights(PRIORITIES), n)
+    status, closed = _status_and_close(rng, ages, priority)
+    ids = [f"TCK{i:08d}" for i in range(start, start + n)]
+    return list(zip(
+        ids, _pick(rng, _weights(CATEGORIES), n).tolist(), priority.tolist(), status.tolist(),
+        _iso(ages).tolist(), closed.tolist(), _pick(rng, _zipf_people("tech", ASSIGNEES), n).tolist(),
+    ))
+
+
+def _datasets(rng: np.random.Generator, start: int, n: int) -> List[tuple]:
+    ages = _days_ago(rng, n)
+    size_mb = np.round(rng.lognormal(np.log(80), 1.6, n), 2)
+    # bytes per row varies a lot between sources
+    row_count = np.maximum(1, (size_mb * 1e6 / rng.lognormal(np.log(400), 0.8, n)).astype(np.int64))
+    names = [f"dataset_{i:08d}" for i in range(start, start + n)]
+    return list(zip(
+        names, _pick(rng, _zipf_people("team", OWNERS), n).tolist(), _pick(rng, _weights(SOURCES), n).tolist(),
+        size_mb.tolist(), row_count.tolist(), _iso(ages).tolist(),
+    ))
+
+
+GENERATORS = {
+    "cyber_incidents": _incidents,
+    "it_tickets": _tickets,
+    "datasets_metadata": _datasets,
+}
+
+CSV_FILES = {
+    "cyber_incidents": "cyber_incidents.csv",
+    "it_tickets": "it_tickets.csv",
+    "datasets_metadata": "datasets_metadata.csv",
+}
+
+
+def columns(table: str) -> Tuple[str, ...]:
+    """Columns of the generated tuples (the table's columns without id)."""
+    return TABLE_COLUMNS[table][1:]
+
+
+def generate(table: str, rows: int, seed: int = DEFAULT_SEED, chunk_size: int = CHUNK_SIZE) -> Iterator[List[tuple]]:
+    """
+    Yield the rows of `table` in chunks of tuples (see columns()). Each
+    chunk is seeded from (seed, table, chunk number), so a given seed and
+    chunk_size always produce the same rows.
+    """
+    make = GENERATORS[table]
+    for k, start in enumerate(range(0, rows, chunk_size)):
+        rng = np.random.default_rng([seed, list(GENERATORS).index(table), k])
+        yield make(rng, start + 1, min(chunk_size, rows - start))
+
+
+def build_database(path: Path, rows: int, seed: int = DEFAULT_SEED, tables: Sequence[str] = tuple(GENERATORS),
+                   progress=None) -> Dict[str, int]:
+    """
+    Create a SQLite database at `path` with the app's schema and `rows`
+    synthetic rows per table. Returns {table: rows}. The bulk load is not
+    recorded in the change log, as if the data had always been there.
+    progress(table, done, total), if given, is called per chunk.
+    """
+    with DatabaseManager(path) as db:
+        c = db.cursor()
+        # throwaway database: no fsyncs, and no change-log entries for the
+        # bulk load (the capture triggers are put back afterwards)
+        c.execute("PRAGMA synchronous = OFF")
+        create_tables(db)
+        for table in tables:
+            for op in ("insert", "update", "delete"):
+                c.execute(f"DROP TRIGGER IF EXISTS cdc_{table}_{op}")
+        for table in tables:
+            cols = columns(table)
+            sql = f"INSERT INTO {table} ({', '.join(cols)}) VALUES ({', '.join('?' for _ in cols)})"
+            done = 0
+            for chunk in generate(table, rows, seed):
+                c.executemany(sql, chunk)
+                db.commit()
+                done += len(chunk)
+                if progress is not None:
+                    progress(table, done, rows)
+        ensure_change_log(db)
+    return {table: rows for table in tables}
+
+
+def write_csv(directory: Path, rows: int, seed: int = DEFAULT_SEED) -> Dict[str, Path]:
+    """Write the three feeds as CSV files in the DATA/ layout."""
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = {}
+    for table, filename in CSV_FILES.items():
+        path = directory / filename
+        with path.open("w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(columns(table))
+            for chunk in generate(table, rows, seed):
+                writer.writerows(chunk)
+        paths[table] = path
+    return paths
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="rows per table")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    out = parser.add_mutually_exclusive_group(required=True)
+    out.add_argument("--db", type=Path, help="SQLite database to create")
+    out.add_argument("--csv", type=Path, help="directory for the CSV feeds")
+    args = parser.parse_args(argv)
+
+    started = time.perf_counter()
+    if args.db:
+        if args.db.exists():
+            print(f"{args.db} already exists; remove it first.", file=sys.stderr)
+            return 1
+        build_database(args.db, args.rows, args.seed)
+        print(f"Wrote {args.rows:,} rows per table to {args.db}")
+    else:
+        for table, path in write_csv(args.csv, args.rows, args.seed).items():
+            print(f"Wrote {args.rows:,} {table} rows to {path}")
+    print(f"Done in {time.perf_counter() - started:.1f}s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
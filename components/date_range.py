@@ -0,0 +1,53 @@
+# components/date_range.py
+
+"""
+Date-range filter for the dashboards.
+
+The selected range is returned as a DB.crud.DateRange and stored in the
+page's filter selection, so the paged grid, the analytics metrics and the
+exports turn it into `col >= start AND col < end + 1 day` on an indexed
+ISO-8601 column. mask_date_range() applies the same range to the
+in-memory frame.
+"""
+
+from __future__ import annotations
+
+from datetime import timedelta
+from typing import Optional
+
+import pandas as pd
+import streamlit as st
+
+from DB.crud import DateRange
+
+
+def date_range_filter(label: str, series: pd.Series, key: str) -> Optional[DateRange]:
+    """
+    Date input spanning the dates present in `series` (datetime64).
+    Returns None while the full span is selected (no filter).
+    """
+    dates = series.dropna()
+    if dates.empty:
+        return None
+    lo, hi = dates.min().date(), dates.max().date()
+
+    picked = st.date_input(label, value=(lo, hi), min_value=lo, max_value=hi, key=key)
+    # the widget returns a 1-tuple while the user is still picking the end
+    if not isinstance(picked, (tuple, list)) or len(picked) != 2:
+        return None
+    start, end = picked
+    if start <= lo and end >= hi:
+        return None
+    return DateRange(start, end)
+
+
+def mask_date_range(series: pd.Series, rng: Optional[DateRange]) -> pd.Series:
+    """Boolean mask with the same inclusive-day semantics as build_where()."""
+    mask = pd.Series(True, index=series.index)
+    if rng is None:
+        return mask
+    if rng.start:
+        mask &= series >= pd.Timestamp(rng.start)
+    if rng.end:
+        mask &= series < pd.Timestamp(rng.end) + timedelta(days=1)
+    return mask
@@ -0,0 +1,144 @@
+# components/downsample.py
+
+"""
+Downsampling for long time-series charts.
+
+Plotly serialises every point into the figure JSON, so a multi-year,
+per-minute history makes the page heavy. These helpers reduce a series
+to a target number of points while keeping its visual shape:
+
+- lttb():           Largest-Triangle-Three-Buckets, keeps the points that
+                    contribute most to the visible shape of a line
+- minmax_buckets(): keeps the min and max of each bucket, so spikes are
+                    never lost
+
+downsampled_line_chart() wires this into Streamlit, with a zoom slider
+that re-selects the chosen window from the full series and downsamples
+only that, so zooming in reveals finer detail.
+"""
+
+from __future__ import annotations
+
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+DEFAULT_TARGET_POINTS = 1000
+
+
+def _as_float(x: np.ndarray) -> np.ndarray:
+    if np.issubdtype(x.dtype, np.datetime64):
+        return x.astype("datetime64[ns]").astype(np.int64).astype(np.float64)
+    return x.astype(np.float64)
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Return the indices of the points kept by Largest-Triangle-Three-Buckets.
+    x must be sorted ascending. First and last points are always kept.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    xf = _as_float(np.asarray(x))
+    yf = np.asarray(y, dtype=np.float64)
+
+    kept = np.empty(n_out, dtype=np.int64)
+    kept[0] = 0
+    kept[-1] = n - 1
+
+    # n_out - 2 buckets over the points between the first and the last
+    edges = np.linspace(1, n - 1, n_out - 1).astype(np.int64)
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # average of the next bucket (or the last point) is the third vertex
+        next_start, next_end = end, edges[i + 2] if i + 2 < len(edges) else n
+        if next_end <= next_start:
+            next_end = next_start + 1
+        avg_x = xf[next_start:next_end].mean()
+        avg_y = yf[next_start:next_end].mean()
+
+        bx = xf[start:end]
+        by = yf[start:end]
+        area = np.abs((xf[a] - avg_x) * (by - yf[a]) - (xf[a] - bx) * (avg_y - yf[a]))
+        a = start + int(np.argmax(area)) if len(area) else start
+        kept[i + 1] = a
+
+    return kept
+
+
+def minmax_buckets(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Return indices keeping the min and max point of each of n_out // 2
+    equal-count buckets (in x order). Cheaper than LTTB and spike-safe.
+    """
+    n = len(x)
+    n_buckets = max(1, n_out // 2)
+    if n <= n_out:
+        return np.arange(n)
+
+    yf = np.asarray(y, dtype=np.float64)
+    edges = np.linspace(0, n, n_buckets + 1).astype(np.int64)
+    kept = []
+    for start, end in zip(edges[:-1], edges[1:]):
+        if end <= start:
+            continue
+        seg = yf[start:end]
+        lo, hi = start + int(np.argmin(seg)), start + int(np.argmax(seg))
+        kept.extend(sorted({lo, hi}))
+    return np.asarray(kept, dtype=np.int64)
+
+
+def downsample_frame(
+    df: pd.DataFrame, x: str, y: str, target_points: int = DEFAULT_TARGET_POINTS, method: str = "lttb"
+) -> pd.DataFrame:
+    """Sort by x and keep at most target_points rows."""
+    df = df.dropna(subset=[x, y]).sort_values(x)
+    if len(df) <= target_points:
+        return df
+    pick = lttb if method == "lttb" else minmax_buckets
+    idx = pick(df[x].to_numpy(), df[y].to_numpy(), target_points)
+    return df.iloc[idx]
+
+
+def downsampled_line_chart(
+    df: pd.DataFrame,
+    x: str,
+    y: str,
+    title: str,
+    key: str,
+    target_points: int = DEFAULT_TARGET_POINTS,
+    method: str = "lttb",
+) -> Optional[pd.DataFrame]:
+    """
+    Line chart of y over x with at most target_points plotted points.
+
+    Plotly zoom events are not sent back to Streamlit, so zooming is done
+    with a range slider: the selected window is cut from the full series
+    and downsampled again, which brings back detail as the window shrinks.
+    """
+    import plotly.express as px
+
+    df = df.dropna(subset=[x, y]).sort_values(x)
+    if df.empty:
+        return None
+
+    window = df
+    if len(df) > target_points:
+        lo, hi = df[x].iloc[0], df[x].iloc[-1]
+        if hasattr(lo, "to_pydatetime"):
+            lo, hi = lo.to_pydatetime(), hi.to_pydatetime()
+        if lo < hi:
+            zoom = st.slider(f"Zoom: {title}", min_value=lo, max_value=hi, value=(lo, hi), key=f"{key}_zoom")
+            window = df[(df[x] >= zoom[0]) & (df[x] <= zoom[1])]
+
+    plotted = downsample_frame(window, x, y, target_points, method)
+    fig = px.line(plotted, x=x, y=y, title=title)
+    st.plotly_chart(fig, use_container_width=True)
+    if len(plotted) < len(window):
+        st.caption(f"Showing {len(plotted):,} of {len(window):,} points ({method.upper()} downsampling).")
+    return plotted
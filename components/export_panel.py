@@ -0,0 +1,121 @@
+# components/export_panel.py
+
+"""
+Export panel for the dashboards: streams the current filter's result set
+to a file through the service layer (see services/export.py), showing
+progress while it runs, then offers the file for download.
+
+The file is never read into the Streamlit session. "Get download link"
+moves it under static/exports/<random token>/, which Streamlit serves
+straight from disk (server.enableStaticServing in .streamlit/config.toml),
+and shows a link to it. Links older than LINK_TTL_S are removed the next
+time one is created.
+"""
+
+from __future__ import annotations
+
+import secrets
+import shutil
+import time
+from dataclasses import replace
+from html import escape
+from pathlib import Path
+from typing import Callable, Dict, Optional
+
+import streamlit as st
+
+from services.export import EXPORT_FORMATS, ExportResult
+
+
+STATIC_EXPORT_DIR = Path(__file__).resolve().parent.parent / "static" / "exports"
+STATIC_URL = "app/static/exports"
+LINK_TTL_S = 24 * 3600
+
+
+def _expire_links(now: float) -> None:
+    for token_dir in STATIC_EXPORT_DIR.glob("*"):
+        if token_dir.is_dir() and now - token_dir.stat().st_mtime > LINK_TTL_S:
+            shutil.rmtree(token_dir, ignore_errors=True)
+
+
+def publish_export(result: ExportResult) -> tuple[ExportResult, str]:
+    """Move the export under the static directory; returns (moved result, URL)."""
+    _expire_links(time.time())
+    token = secrets.token_urlsafe(16)
+    target_dir = STATIC_EXPORT_DIR / token
+    target_dir.mkdir(parents=True)
+    target = target_dir / Path(result.path).name
+    shutil.move(str(result.path), target)
+    return replace(result, path=target), f"{STATIC_URL}/{token}/{target.name}"
+
+
+def _human_bytes(n: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if n < 1024 or unit == "GB":
+            return f"{n:,.0f} {unit}" if unit == "B" else f"{n:,.1f} {unit}"
+        n /= 1024
+    return f"{n} B"
+
+
+def export_panel(
+    key: str,
+    export_fn: Callable[..., ExportResult],
+    filters: Optional[Dict[str, list]] = None,
+    search: Optional[str] = None,
+) -> Optional[ExportResult]:
+    """
+    export_fn(fmt=..., filters=..., search=..., compress=..., progress=...)
+    is the service method, e.g. IncidentService.export_incidents.
+    """
+    with st.expander("Export filtered rows"):
+        c1, c2 = st.columns(2)
+        with c1:
+            fmt = st.radio("Format", EXPORT_FORMATS, horizontal=True, key=f"{key}_fmt")
+        with c2:
+            compress = st.checkbox("gzip", disabled=fmt != "csv", key=f"{key}_gzip")
+
+        if st.button("Export", key=f"{key}_run"):
+            bar = st.progress(0.0, text="Exporting...")
+
+            def progress(done, total):
+                frac = min(1.0, done / total) if total else 1.0
+                bar.progress(frac, text=f"Exported {done:,} of {total or done:,} rows")
+
+            try:
+                result = export_fn(
+                    fmt=fmt,
+                    filters=filters,
+                    search=search,
+                    compress=compress and fmt == "csv",
+                    progress=progress,
+                )
+            except Exception as e:
+                bar.empty()
+                st.error(f"Export failed: {e}")
+                return None
+
+            bar.progress(1.0, text="Export complete")
+            st.session_state[f"{key}_result"] = result
+            st.session_state.pop(f"{key}_url", None)
+
+        result = st.session_state.get(f"{key}_result")
+        if result is None or not Path(result.path).exists():
+            return None
+
+        st.caption(
+            f"{result.rows:,} rows in {result.chunks} chunk(s), "
+            f"{_human_bytes(result.bytes_written)}, {result.seconds:.2f}s "
+            f"({result.rows_per_sec:,.0f} rows/s)."
+        )
+        name = Path(result.path).name
+        url = st.session_state.get(f"{key}_url")
+        if url is None and st.button(f"Get download link for {name}", key=f"{key}_publish"):
+            result, url = publish_export(result)
+            st.session_state[f"{key}_result"] = result
+            st.session_state[f"{key}_url"] = url
+        if url is not None:
+            st.markdown(
+                f'<a href="{escape(url)}" download="{escape(name)}">⬇️ Download {escape(name)}</a>',
+                unsafe_allow_html=True,
+            )
+        return result
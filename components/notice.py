@@ -0,0 +1,48 @@
+# components/notice.py
+
+"""
+Feedback for the dashboards' CRUD sections.
+
+write_error() runs a service command and returns what went wrong, if
+anything. With write-behind (services/write_queue.py) a command only
+returns a Future; it is waited on and checked, so a page never reports
+success for a write that failed in its group commit.
+
+A st.success() right before st.rerun() is never seen: the rerun starts
+the page (or fragment) over. The sections store the message with
+notify() instead, and show_notice() displays it once on the next run.
+"""
+
+from __future__ import annotations
+
+from concurrent.futures import TimeoutError as FutureTimeout
+from typing import Callable, Optional
+
+import streamlit as st
+
+WRITE_TIMEOUT_S = 10.0
+
+
+def write_error(command: Callable, *args, **kwargs) -> Optional[BaseException]:
+    """command(*args, **kwargs)'s exception, or None once it has been written."""
+    try:
+        future = command(*args, **kwargs)
+        if future is None:
+            return None  # direct write: it raised if it failed
+        return future.exception(timeout=WRITE_TIMEOUT_S)
+    except FutureTimeout:
+        return TimeoutError(f"not committed after {WRITE_TIMEOUT_S:g}s, still queued")
+    except Exception as e:
+        return e
+
+
+def notify(key: str, message: str, level: str = "success") -> None:
+    """Queue `message` for show_notice(key); level is st.success / st.warning / st.error."""
+    st.session_state[key] = (level, message)
+
+
+def show_notice(key: str) -> None:
+    notice = st.session_state.pop(key, None)
+    if notice is not None:
+        level, message = notice
+        getattr(st, level)(message)
@@ -0,0 +1,134 @@
+# components/paged_grid.py
+
+"""
+Server-paged table for the dashboards.
+
+Instead of sending the whole filtered DataFrame to the browser, the grid
+asks the service layer for one window of rows (the visible page plus a
+few prefetched pages). Filtering, sorting and column selection all run
+in SQLite, so what gets serialised to the browser depends on the page
+size, not on the table size.
+"""
+
+from __future__ import annotations
+
+import math
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+import pandas as pd
+import streamlit as st
+
+from metrics import cache_lookup
+from render_timing import span
+
+PAGE_SIZES = (25, 50, 100, 250)
+
+
+def _rows_to_df(rows: List[Any], columns: Sequence[str]) -> pd.DataFrame:
+    if not rows:
+        return pd.DataFrame(columns=list(columns))
+    return pd.DataFrame([tuple(r) for r in rows], columns=list(columns))
+
+
+def clear_grid_cache(key: str) -> None:
+    """Forget the count and prefetched rows, e.g. after a write to the underlying table."""
+    st.session_state.pop(f"{key}_window", None)
+    st.session_state.pop(f"{key}_count", None)
+
+
+def paged_grid(
+    key: str,
+    all_columns: Sequence[str],
+    count_fn: Callable[..., int],
+    page_fn: Callable[..., List[Any]],
+    filters: Optional[Dict[str, list]] = None,
+    search: Optional[str] = None,
+    default_columns: Optional[Sequence[str]] = None,
+    prefetch_pages: int = 2,
+    height: int = 380,
+    version: Any = None,
+) -> int:
+    """
+    Render a paged grid and return the number of matching rows.
+
+    count_fn(filters=..., search=...) and
+    page_fn(filters=..., search=..., columns=..., order_by=..., descending=...,
+            limit=..., offset=...) are the service methods backing the grid,
+    e.g. IncidentService.count_incidents / page_incidents.
+
+    The count is cached in the session until the filters, the search or
+    `version` change (the pages pass their filter engine's change-log
+    position), or clear_grid_cache() is called after a write.
+    """
+    c1, c2, c3, c4 = st.columns([3, 1, 1, 1])
+    with c1:
+        columns = st.multiselect(
+            "Columns",
+            list(all_columns),
+            default=list(default_columns or all_columns),
+            key=f"{key}_columns",
+        )
+    with c2:
+        order_by = st.selectbox("Sort by", list(all_columns), key=f"{key}_order_by")
+    with c3:
+        descending = st.toggle("Descending", key=f"{key}_desc")
+    with c4:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+
+    columns = columns or list(all_columns)
+
+    filter_key = tuple(sorted((k, tuple(v)) for k, v in (filters or {}).items()))
+    count_key = (filter_key, search or "", version)
+    counted = st.session_state.get(f"{key}_count")
+    cache_lookup("grid_count", counted is not None and counted[0] == count_key)
+    if counted is None or counted[0] != count_key:
+        counted = (count_key, count_fn(filters=filters, search=search))
+        st.session_state[f"{key}_count"] = counted
+    total = counted[1]
+    n_pages = max(1, math.ceil(total / page_size))
+    page = st.number_input(
+        f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1, key=f"{key}_page"
+    )
+    offset = (int(page) - 1) * page_size
+
+    # The window cache is only valid for the exact same query
+    query_key = (
+        filter_key,
+        search or "",
+        tuple(columns),
+        order_by,
+        bool(descending),
+        total,
+    )
+    window = st.session_state.get(f"{key}_window")
+    hit = False
+    if window is not None and window["query"] == query_key and window["offset"] <= offset:
+        window_end = window["offset"] + len(window["rows"])
+        hit = offset + page_size <= window_end or window["exhausted"]
+
+    cache_lookup("grid_window", hit)
+    if not hit:
+        limit = page_size * (1 + prefetch_pages)
+        rows = page_fn(
+            filters=filters,
+            search=search,
+            columns=columns,
+            order_by=order_by,
+            descending=descending,
+            limit=limit,
+            offset=offset,
+        )
+        window = {"query": query_key, "offset": offset, "rows": rows, "exhausted": len(rows) < limit}
+        st.session_state[f"{key}_window"] = window
+
+    start = offset - window["offset"]
+    page_rows = window["rows"][start:start + page_size]
+
+    # serialising the window for the browser is part of the render cost
+    with span("st.dataframe"):
+        st.dataframe(_rows_to_df(page_rows, columns), use_container_width=True, height=height, hide_index=True)
+    if total:
+        st.caption(f"Rows {offset + 1:,}–{offset + len(page_rows):,} of {total:,} matching.")
+    else:
+        st.caption("No rows match the current filters.")
+    return total
@@ -0,0 +1,34 @@
+# conftest.py
+
+"""
+Shared test fixtures: a throwaway SQLite database with the full schema
+(domain tables, archive tables and views, change log).
+"""
+
+import pytest
+
+from DB.db import DatabaseManager
+from DB.schema import create_tables
+
+
+@pytest.fixture
+def db_manager_cls(tmp_path):
+    """
+    DatabaseManager bound to one temporary file, whatever domain is asked
+    for; pass it as db_manager_cls to the services.
+    """
+    path = tmp_path / "test.db"
+
+    class TestDatabaseManager(DatabaseManager):
+        def __init__(self, db_path=None, domain=None):
+            super().__init__(db_path=path)
+
+    with TestDatabaseManager() as db:
+        create_tables(db)
+    return TestDatabaseManager
+
+
+@pytest.fixture
+def db(db_manager_cls):
+    with db_manager_cls() as db:
+        yield db
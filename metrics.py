@@ -0,0 +1,391 @@
+"""
+metrics.py
+
+Process-wide metrics registry with a Prometheus text exporter.
+
+Counters, gauges and histograms, updated by:
+- the services (IncidentService, TicketService, DatasetService,
+  UserService): calls, errors, latency and rows returned per method
+- ai_helper: assistant requests, latency, tokens and fallbacks
+- the caches (AI triage results, grid windows, the DuckDB snapshot):
+  hits and misses
+- the connection pools (read when scraped): idle and in-use connections
+
+Both exporters are off by default and start when this module is first
+imported:
+- METRICS_PORT=9108 serves http://127.0.0.1:9108/metrics from a daemon
+  thread (METRICS_ADDR to listen elsewhere)
+- METRICS_TEXTFILE=/path/app.prom rewrites that file every
+  METRICS_TEXTFILE_INTERVAL_S seconds, for node_exporter's textfile
+  collector
+
+Memory is bounded: a metric keeps at most METRICS_MAX_SERIES label
+combinations. Further ones are folded into one series whose label values
+are all "other", and counted in app_metrics_series_overflow_total.
+
+Only the standard library is used, so the services keep importing fast
+(see benchmarks/import_time.py).
+"""
+
+from __future__ import annotations
+
+import abc
+import bisect
+import functools
+import os
+import threading
+import time
+import types
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+MAX_SERIES = int(os.getenv("METRICS_MAX_SERIES", "200"))
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+METRICS_TEXTFILE = os.getenv("METRICS_TEXTFILE")
+TEXTFILE_INTERVAL_S = float(os.getenv("METRICS_TEXTFILE_INTERVAL_S", "15"))
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+ROW_BUCKETS = (0, 1, 10, 100, 1_000, 10_000, 100_000, 1_000_000)
+
+OVERFLOW = "other"
+
+_REGISTRY: Dict[str, "_Metric"] = {}
+_registry_lock = threading.Lock()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], key: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, key)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class _Metric(abc.ABC):
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), max_series: int = MAX_SERIES):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labels)
+        self.max_series = max_series
+        self._series: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, object], series: Optional[Dict] = None) -> Tuple[str, ...]:
+        # caller holds self._lock; series defaults to self._series
+        series = self._series if series is None else series
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        if key in series or len(series) < self.max_series:
+            return key
+        if self.name != SERIES_OVERFLOW.name:
+            SERIES_OVERFLOW.inc(metric=self.name)
+        return tuple(OVERFLOW for _ in self.labelnames)
+
+    @abc.abstractmethod
+    def samples(self) -> List[str]:
+        """The sample lines of this metric, without HELP / TYPE."""
+
+    def render(self) -> str:
+        help_text = self.help.replace("\\", "\\\\").replace("\n", "\\n")
+        lines = [f"# HELP {self.name} {help_text}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        with self._lock:
+            return dict(self._series)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.values().items())]
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._function: Optional[Callable[[], Iterable[Tuple[Dict[str, object], float]]]] = None
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._series[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, fn: Callable[[], Iterable[Tuple[Dict[str, object], float]]]) -> None:
+        """Read the gauge from fn() at scrape time; fn yields (labels, value)."""
+        self._function = fn
+
+    def values(self) -> Dict[Tuple[str, ...], float]:
+        if self._function is not None:
+            readings = []
+            try:
+                readings.extend(self._function())
+            except Exception as e:
+                print(f"metrics: could not read {self.name}: {e}")
+            # build the new series aside and swap it in, so a concurrent
+            # scrape never sees the gauge empty or half filled
+            series: Dict[Tuple[str, ...], object] = {}
+            with self._lock:
+                for labels, value in readings:
+                    series[self._key(labels, series)] = value
+                self._series = series
+        with self._lock:
+            return dict(self._series)
+
+    def samples(self) -> List[str]:
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in sorted(self.values().items())]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS,
+                 max_series: int = MAX_SERIES):
+        super().__init__(name, help, labels, max_series)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        with self._lock:
+            key = self._key(labels)
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket (non-cumulative) counts, +Inf last; sum; count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][bisect.bisect_left(self.buckets, value)] += 1
+            series[1] += value
+            series[2] += 1
+
+    def totals(self) -> Dict[Tuple[str, ...], Tuple[int, float]]:
+        """{label values: (count, sum)}"""
+        with self._lock:
+            return {key: (series[2], series[1]) for key, series in self._series.items()}
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            snapshot = {key: (list(s[0]), s[1], s[2]) for key, s in self._series.items()}
+        lines = []
+        for key, (counts, total, count) in sorted(snapshot.items()):
+            cumulative = 0
+            for bound, n in zip(self.buckets + (float("inf"),), counts):
+                cumulative += n
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+def _register(cls, name: str, *args, **kwargs):
+    with _registry_lock:
+        metric = _REGISTRY.get(name)
+        if metric is None:
+            metric = _REGISTRY[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric {name} is already registered as a {metric.kind}")
+        return metric
+
+
+def counter(name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+    return _register(Counter, name, help, labels)
+
+
+def gauge(name: str, help: str, labels: Sequence[str] = ()) -> Gauge:
+    return _register(Gauge, name, help, labels)
+
+
+def histogram(name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+    return _register(Histogram, name, help, labels, buckets)
+
+
+def render() -> str:
+    """Every metric in the Prometheus text exposition format (0.0.4)."""
+    with _registry_lock:
+        metrics = list(_REGISTRY.values())
+    return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+# --------- The platform's metrics ---------
+
+SERIES_OVERFLOW = counter(
+    "app_metrics_series_overflow_total", "Updates folded into the 'other' series of a metric at its series limit.",
+    ("metric",),
+)
+SERVICE_CALLS = counter("app_service_calls_total", "Service method calls.", ("service", "method"))
+SERVICE_ERRORS = counter("app_service_errors_total", "Service method calls that raised.", ("service", "method"))
+SERVICE_LATENCY = histogram("app_service_latency_seconds", "Service method latency.", ("service", "method"))
+SERVICE_ROWS = histogram(
+    "app_service_rows_returned", "Rows returned by service methods that return rows.", ("service", "method"),
+    buckets=ROW_BUCKETS,
+)
+CACHE_REQUESTS = counter("app_cache_requests_total", "Cache lookups by cache and result (hit / miss).",
+                         ("cache", "result"))
+AI_REQUESTS = counter("app_ai_requests_total", "AI assistant requests by outcome (online / fallback).",
+                      ("kind", "dashboard", "outcome"))
+AI_FALLBACKS = counter("app_ai_fallbacks_total", "AI requests answered offline, by reason.", ("reason",))
+AI_LATENCY = histogram("app_ai_latency_seconds", "End-to-end AI request latency.", ("kind", "dashboard"))
+AI_API_CALLS = counter("app_ai_api_calls_total", "HTTP calls made to the model API.", ("kind",))
+AI_TOKENS = counter("app_ai_tokens_total", "Tokens reported by the model API.", ("kind", "type"))
+DB_POOL_CONNECTIONS = gauge("app_db_pool_connections", "Pooled SQLite connections per database file.",
+                            ("file", "state"))
+
+
+def instrument(service: str):
+    """
+    Class decorator: count calls and errors, time and count the rows
+    returned by each public method of a service.
+    """
+    def decorate(cls):
+        for name, fn in list(vars(cls).items()):
+            if not name.startswith("_") and isinstance(fn, types.FunctionType):
+                setattr(cls, name, _instrumented(service, name, fn))
+        return cls
+
+    return decorate
+
+
+def _instrumented(service: str, method: str, fn):
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        t0 = time.perf_counter()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException:
+            SERVICE_ERRORS.inc(service=service, method=method)
+            raise
+        finally:
+            SERVICE_CALLS.inc(service=service, method=method)
+            SERVICE_LATENCY.observe(time.perf_counter() - t0, service=service, method=method)
+        if isinstance(result, list):
+            SERVICE_ROWS.observe(len(result), service=service, method=method)
+        return result
+
+    return wrapper
+
+
+def cache_lookup(cache: str, hit: bool, n: int = 1) -> None:
+    CACHE_REQUESTS.inc(n, cache=cache, result="hit" if hit else "miss")
+
+
+def _pool_connections():
+    from DB.db import pool_stats
+
+    for pool in pool_stats():
+        yield {"file": pool["file"], "state": "idle"}, pool["idle"]
+        yield {"file": pool["file"], "state": "in_use"}, pool["in_use"]
+
+
+DB_POOL_CONNECTIONS.set_function(_pool_connections)
+
+
+# --------- Exporters ---------
+
+_server = None
+_textfile_thread: Optional[threading.Thread] = None
+_exporter_lock = threading.Lock()
+
+
+def start_http_server(port: int = METRICS_PORT, addr: str = METRICS_ADDR):
+    """Serve /metrics on addr:port from a daemon thread (once per process)."""
+    global _server
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] not in ("/metrics", "/"):
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # one line per scrape would drown the app's output
+
+    with _exporter_lock:
+        if _server is None:
+            try:
+                _server = ThreadingHTTPServer((addr, port), Handler)
+            except OSError as e:
+                # e.g. a second server process on the same machine
+                print(f"metrics: could not listen on {addr}:{port}: {e}")
+                return None
+            threading.Thread(target=_server.serve_forever, name="metrics-http", daemon=True).start()
+        return _server
+
+
+def write_textfile(path) -> None:
+    """Write render() to path atomically (the collector never sees half a file)."""
+    path = Path(path)
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(render(), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def start_textfile_writer(path=METRICS_TEXTFILE, interval_s: float = TEXTFILE_INTERVAL_S):
+    """Rewrite `path` every interval_s seconds from a daemon thread (once per process)."""
+    global _textfile_thread
+
+    def run():
+        while True:
+            try:
+                write_textfile(path)
+            except OSError as e:
+                print(f"metrics: could not write {path}: {e}")
+            time.sleep(interval_s)
+
+    with _exporter_lock:
+        if _textfile_thread is None:
+            _textfile_thread = threading.Thread(target=run, name="metrics-textfile", daemon=True)
+            _textfile_thread.start()
+        return _textfile_thread
+
+
+def start_exporters() -> None:
+    """Start whichever exporters the environment configures."""
+    if METRICS_PORT:
+        start_http_server(METRICS_PORT, METRICS_ADDR)
+    if METRICS_TEXTFILE:
+        start_textfile_writer(METRICS_TEXTFILE)
+
+
+def exporter_status() -> Dict[str, Optional[str]]:
+    """Where the metrics can be read, for the Admin page."""
+    return {
+        "http": f"http://{METRICS_ADDR}:{_server.server_address[1]}/metrics" if _server is not None else None,
+        "textfile": str(METRICS_TEXTFILE) if _textfile_thread is not None else None,
+    }
+
+
+start_exporters()
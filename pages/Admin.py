@@ -0,0 +1,393 @@
+# pages/Admin.py
+import streamlit as st
+import pandas as pd
+
+import ai_telemetry
+import metrics
+import render_timing
+from DB import sql_trace
+from DB.cdc import RETENTION_DAYS as CDC_RETENTION_DAYS, compact, ensure_change_log, log_size
+from DB.crud import KEY_COLUMNS, TABLE_COLUMNS
+from services.analytics import ENGINES, duckdb_available, get_analytics
+from services.archive_service import ArchiveService
+from DB.archive import RETENTION_DAYS
+from DB.db import (
+    DB_LAYOUT,
+    DOMAIN_TABLES,
+    DatabaseManager,
+    ReportingDatabase,
+    database_paths,
+    domain_for,
+    domain_path,
+    snapshot_all,
+    snapshot_history,
+)
+from services.datasets_service import DatasetService
+from services.frames import (
+    DATASET_SCHEMA,
+    INCIDENT_SCHEMA,
+    TICKET_SCHEMA,
+    frame_bytes,
+    memory_report,
+    rows_to_frame,
+)
+from services.incidents_service import IncidentService
+from services.tickets_service import TicketService
+from services.write_queue import get_write_queue
+
+
+def require_admin():
+    if "user" not in st.session_state:
+        st.error("You must be logged in to view this page. Go to the **Login** page first.")
+        st.stop()
+    user = st.session_state["user"]
+    if user.get("role") != "admin":
+        st.error("This page is only available to administrators.")
+        st.stop()
+    return user
+
+
+def ai_telemetry_section():
+    import plotly.express as px
+
+    st.markdown("### 🤖 AI call telemetry")
+
+    records = ai_telemetry.records()
+    if not records:
+        st.info("No AI calls recorded since this server process started.")
+        return
+
+    df = pd.DataFrame(records)
+    st.caption(
+        f"Last {len(df)} AI requests (ring buffer of {ai_telemetry.RING_SIZE}, "
+        "cleared when the server restarts)."
+    )
+
+    total = len(df)
+    fallback_rate = float(df["fallback_reason"].notna().mean())
+    c1, c2, c3, c4 = st.columns(4)
+    c1.metric("AI requests", total)
+    c2.metric("p95 latency (ms)", f"{ai_telemetry.percentile(df['latency_ms'].tolist(), 95):,.0f}")
+    c3.metric("Tokens (prompt + completion)", f"{int(df['prompt_tokens'].sum() + df['completion_tokens'].sum()):,}")
+    c4.metric("Offline fallback rate", f"{fallback_rate:.1%}")
+
+    st.markdown("#### Per dashboard")
+    st.dataframe(pd.DataFrame(ai_telemetry.summarize(("dashboard", "kind"))), use_container_width=True)
+
+    st.markdown("#### Per model")
+    st.dataframe(pd.DataFrame(ai_telemetry.summarize(("model",))), use_container_width=True)
+
+    col1, col2 = st.columns(2)
+    with col1:
+        fig = px.histogram(df, x="latency_ms", color="dashboard", nbins=40, title="End-to-end latency (ms)")
+        st.plotly_chart(fig, use_container_width=True)
+    with col2:
+        reasons = ai_telemetry.fallback_reasons()
+        if reasons:
+            by_reason = pd.DataFrame({"reason": list(reasons), "count": list(reasons.values())})
+            fig2 = px.bar(by_reason, x="reason", y="count", title="Fallback reasons")
+            st.plotly_chart(fig2, use_container_width=True)
+        else:
+            st.success("No offline fallbacks recorded.")
+
+    with st.expander("Raw records"):
+        st.dataframe(df.sort_values("started_at", ascending=False), use_container_width=True)
+
+
+def frame_memory_section():
+    st.markdown("### 🧮 Dashboard frame memory")
+    st.caption(
+        "Deep memory of each domain's DataFrame as plain object columns (before) "
+        "and with the typed schema from services/frames.py (after)."
+    )
+
+    domains = {
+        "cyber_incidents": (IncidentService().list_incidents, INCIDENT_SCHEMA),
+        "it_tickets": (TicketService().list_tickets, TICKET_SCHEMA),
+        "datasets_metadata": (DatasetService().list_datasets, DATASET_SCHEMA),
+    }
+
+    if not st.button("Build memory report", key="mem_report_button"):
+        return
+
+    totals = []
+    for table, (list_rows, schema) in domains.items():
+        rows = list_rows()
+        raw = rows_to_frame(rows, TABLE_COLUMNS[table])
+        typed = rows_to_frame(rows, TABLE_COLUMNS[table], schema)
+        report = memory_report(raw, typed)
+        totals.append(
+            {
+                "table": table,
+                "rows": len(rows),
+                "mb_before": round(report.loc["TOTAL", "bytes_before"] / 1e6, 3),
+                "mb_after": round(report.loc["TOTAL", "bytes_after"] / 1e6, 3),
+                "saved_pct": report.loc["TOTAL", "saved_pct"],
+            }
+        )
+        with st.expander(f"{table}: per-column detail"):
+            st.dataframe(report, use_container_width=True)
+
+    st.dataframe(pd.DataFrame(totals), use_container_width=True, hide_index=True)
+
+    session_mb = sum(frame_bytes(v) for v in st.session_state.values()) / 1e6
+    st.metric("DataFrames held in this session", f"{session_mb:,.2f} MB")
+
+
+def analytics_engine_section():
+    st.markdown("### 📊 Analytics engine")
+    st.caption(
+        "Engine used for the dashboard charts. DuckDB keeps a columnar copy of the "
+        "three domain tables in sync with SQLite (see services/analytics.py)."
+    )
+
+    analytics = get_analytics()
+    has_duckdb = duckdb_available()
+    engine = st.radio(
+        "Engine",
+        ENGINES,
+        index=ENGINES.index(analytics.effective_engine()),
+        horizontal=True,
+        key="analytics_engine",
+    )
+    if engine == "duckdb" and not has_duckdb:
+        st.warning("duckdb is not installed (pip install duckdb); charts keep using SQLite.")
+    analytics.set_engine(engine)
+
+    status = analytics.snapshot_status()
+    if status:
+        df = pd.DataFrame(status)
+        df["synced_at"] = pd.to_datetime(df["synced_at"], unit="s")
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    st.caption("Compare both engines on a larger table with `python -m benchmarks.analytics_engines`.")
+
+
+def archive_section():
+    st.markdown("### 🗄️ Archive")
+    st.caption(
+        "Resolved/Closed incidents and tickets older than the retention window move to "
+        "archive tables; dashboards keep working on the small hot tables."
+    )
+
+    archive_service = ArchiveService()
+    retention = st.number_input(
+        "Retention window (days)", min_value=0, value=RETENTION_DAYS, step=30, key="archive_retention"
+    )
+
+    c1, c2 = st.columns(2)
+    with c1:
+        if st.button("Preview", key="archive_preview"):
+            st.write(archive_service.preview(int(retention)))
+    with c2:
+        if st.button("Archive now", key="archive_run"):
+            moved = archive_service.archive(int(retention))
+            st.success(", ".join(f"{table}: {n} moved" for table, n in moved.items()))
+
+    st.dataframe(pd.DataFrame(archive_service.partition_sizes()), use_container_width=True, hide_index=True)
+
+
+def storage_section():
+    st.markdown("### 🗃️ Storage layout")
+    st.caption(
+        f"DB_LAYOUT={DB_LAYOUT}. In the split layout each domain has its own database file "
+        "and write lock; reporting queries see all of them through ATTACH."
+    )
+
+    rows = []
+    with ReportingDatabase() as db:
+        c = db.cursor()
+        for domain, path in database_paths().items():
+            table = DOMAIN_TABLES[domain][0]
+            c.execute(f"SELECT COUNT(*) FROM {table}")
+            rows.append({
+                "domain": domain,
+                "file": str(path),
+                "bytes": path.stat().st_size if path.exists() else None,
+                "rows": c.fetchone()[0],
+            })
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+    queue = get_write_queue()
+    if queue is None:
+        st.caption("Write-behind is off (WRITE_BEHIND=1 queues service commands into group commits).")
+    else:
+        stats = queue.stats
+        c1, c2, c3, c4 = st.columns(4)
+        c1.metric("Queued commands", queue.pending())
+        c2.metric("Committed", stats["commands"])
+        c3.metric("Avg group size", f"{stats['commands'] / stats['groups']:.1f}" if stats["groups"] else "–")
+        c4.metric("Last group", f"{stats['last_group_ms']} ms")
+
+
+def change_log_section():
+    st.markdown("### 🔁 Change log")
+    st.caption(
+        "Triggers log every insert, update and delete of incidents, tickets and datasets; "
+        "the dashboards apply these deltas instead of reloading their tables."
+    )
+
+    retention = st.number_input(
+        "Keep entries for (days)", min_value=0, value=CDC_RETENTION_DAYS, key="cdc_retention"
+    )
+    compact_now = st.button("Compact", key="cdc_compact")
+    rows = []
+    for path in dict.fromkeys(domain_path(domain_for(table)) for table in KEY_COLUMNS):
+        with DatabaseManager(path) as db:
+            ensure_change_log(db)
+            if compact_now:
+                st.write(str(path), compact(db, int(retention)))
+            rows.extend(log_size(db))
+    st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+
+
+def sql_trace_section():
+    st.markdown("### 🐢 SQL trace")
+    st.caption(
+        "Per-statement latency, rows and calling service method for connections opened while "
+        "tracing is on (SQL_TRACE=1 at start-up, or the switch below for this server process). "
+        f"Statements slower than the threshold go to {sql_trace.SLOW_LOG_PATH.name} with their query plan."
+    )
+
+    c1, c2 = st.columns(2)
+    with c1:
+        on = st.checkbox("Trace SQL", value=sql_trace.is_enabled(), key="sql_trace_on")
+    with c2:
+        slow_ms = st.number_input("Slow threshold (ms)", min_value=1.0, value=sql_trace.SLOW_MS, key="sql_slow_ms")
+    if on:
+        sql_trace.enable(slow_ms)
+    else:
+        sql_trace.disable()
+
+    summary = sql_trace.summarize()
+    if summary:
+        st.dataframe(pd.DataFrame(summary), use_container_width=True, hide_index=True)
+        if st.button("Clear trace", key="sql_trace_clear"):
+            sql_trace.clear()
+    else:
+        st.info("No statements traced yet.")
+
+    slowest = sql_trace.slowest_shapes(sql_trace.slow_queries())
+    if slowest:
+        st.markdown("#### Slow-query log")
+        for row in slowest:
+            with st.expander(f"{row['max_ms']:,.1f} ms max, x{row['count']}: {row['shape'][:100]}"):
+                st.code(row["shape"], language="sql")
+                st.write("Called from:", ", ".join(row["callers"]))
+                st.code("\n".join(row["plan"]) or "(no plan)")
+
+
+def render_timing_section():
+    st.markdown("### ⏱️ Dashboard render timing")
+    st.caption(
+        f"Time per page section and service call over the last {render_timing.WINDOW_S / 60:g} minutes, "
+        "from every session on this server. Nested sections read outer/inner."
+    )
+
+    summary = render_timing.summarize()
+    if not summary:
+        st.info("No dashboard renders recorded yet.")
+    else:
+        df = pd.DataFrame(summary)
+        page = st.selectbox("Page", sorted(df["page"].unique()), key="render_timing_page")
+        st.dataframe(df[df["page"] == page].drop(columns="page"), use_container_width=True, hide_index=True)
+
+    st.markdown("#### Profile one render")
+    c1, c2, c3 = st.columns([2, 2, 1])
+    with c1:
+        target = st.selectbox(
+            "Dashboard", ("Cyber_Dashboard", "IT_Dashboard", "Data_Dashboard"), key="profile_page"
+        )
+    with c2:
+        mode = st.radio(
+            "Profiler", render_timing.PROFILE_MODES, horizontal=True, key="profile_mode",
+            help="cprofile: exact call counts, slower render. sampling: stacks every few ms, near normal speed.",
+        )
+    with c3:
+        if st.button("Profile next render", key="profile_request"):
+            render_timing.request_profile(target, mode)
+    pending = render_timing.pending_profiles()
+    if pending:
+        st.caption("Waiting for: " + ", ".join(f"{p} ({m})" for p, m in pending.items()))
+
+    for profile in reversed(render_timing.profiles()):
+        with st.expander(f"{profile['created_at']} {profile['page']} ({profile['mode']}, {profile['render_ms']:,} ms)"):
+            st.caption(profile["path"])
+            st.code(profile["report"])
+
+
+def metrics_section():
+    st.markdown("### 📈 Metrics export")
+    status = metrics.exporter_status()
+    if status["http"] or status["textfile"]:
+        st.caption("Prometheus text format: " + " · ".join(f"{kind}: `{where}`" for kind, where in status.items() if where))
+    else:
+        st.caption(
+            "No exporter running. Set METRICS_PORT (HTTP /metrics on localhost) or "
+            "METRICS_TEXTFILE (file for node_exporter's textfile collector) before starting the app."
+        )
+
+    calls = metrics.SERVICE_CALLS.values()
+    errors = metrics.SERVICE_ERRORS.values()
+    latency = metrics.SERVICE_LATENCY.totals()
+    rows = [
+        {
+            "service": service,
+            "method": method,
+            "calls": int(n),
+            "errors": int(errors.get((service, method), 0)),
+            "avg_ms": round(latency[(service, method)][1] / latency[(service, method)][0] * 1000, 2)
+            if latency.get((service, method), (0,))[0] else None,
+        }
+        for (service, method), n in sorted(calls.items())
+    ]
+    if rows:
+        st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+    with st.expander("Current exposition"):
+        st.code(metrics.render(), language="text")
+
+
+def snapshot_section():
+    st.markdown("### 💾 Snapshots")
+    st.caption(
+        "Online copies of the database taken with the SQLite backup API; the dashboards "
+        "keep writing while a snapshot runs. Restore with `python -m DB.db restore <file>`."
+    )
+
+    if st.button("Take snapshot now", key="snapshot_run"):
+        with st.spinner("Copying database..."):
+            records = snapshot_all()
+        for record in records:
+            st.success(f"Saved {record['path']} in {record['seconds']}s ({record['pages_per_sec']:,} pages/s)")
+
+    history = snapshot_history()
+    if not history:
+        st.info("No snapshots taken yet.")
+        return
+    df = pd.DataFrame(history[::-1])
+    st.dataframe(
+        df.reindex(columns=["created_at", "path", "bytes", "seconds", "pages", "pages_per_sec", "restarts"]),
+        use_container_width=True,
+        hide_index=True,
+    )
+
+
+def admin_page():
+    user = require_admin()
+
+    st.title("🧰 Admin")
+    st.caption(f"Signed in as {user['username']}.")
+
+    ai_telemetry_section()
+    frame_memory_section()
+    analytics_engine_section()
+    archive_section()
+    storage_section()
+    change_log_section()
+    sql_trace_section()
+    render_timing_section()
+    metrics_section()
+    snapshot_section()
+
+
+if __name__ == "__main__":
+    admin_page()
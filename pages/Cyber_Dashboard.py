@@ -1,12 +1,31 @@
 # pages/Cyber_Dashboard.py
+import uuid
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 
 from ai_helper import ask_cyber_assistant
+from components.date_range import date_range_filter, mask_date_range
+from components.downsample import downsampled_line_chart
+from components.export_panel import export_panel
+from components.notice import notify, show_notice, write_error
+from components.paged_grid import clear_grid_cache, paged_grid
+from DB.crud import TABLE_COLUMNS
+from services import events
+from services.filter_engine import BitmapFilterEngine
+from services.analytics import get_analytics
+from services.frames import INCIDENT_SCHEMA, rows_to_frame, value_counts
+from services.incident_index import warm_incident_index
 from services.incidents_service import IncidentService
+from render_timing import TimedService, render, span, timed
+
+PAGE = "Cyber_Dashboard"
 
-incident_service = IncidentService()
+# with WRITE_BEHIND on, this session's reads wait for its own queued writes;
+# TimedService records each call as a section of this page (render_timing.py)
+incident_service = TimedService(
+    IncidentService(session=st.session_state.setdefault("write_session", uuid.uuid4().hex)), PAGE
+)
 
 
 def require_login():
@@ -17,50 +36,71 @@ def require_login():
 
 
 def incidents_to_df(rows):
-    if not rows:
-        return pd.DataFrame(
-            columns=[
-                "id",
-                "incident_id",
-                "incident_type",
-                "severity",
-                "status",
-                "reported_at",
-                "resolved_at",
-                "assigned_to",
-                "description",
-            ]
-        )
-
-    first = rows[0]
-    if hasattr(first, "keys"):
-        cols = list(first.keys())
-        data = [tuple(r[c] for c in cols) for r in rows]
-        return pd.DataFrame(data, columns=cols)
-
-    # fallback if no row_factory
-    return pd.DataFrame(
-        rows,
-        columns=[
-            "id",
-            "incident_id",
-            "incident_type",
-            "severity",
-            "status",
-            "reported_at",
-            "resolved_at",
-            "assigned_to",
-            "description",
-        ],
+    # typed once here: categoricals for labels, datetime64 for timestamps
+    return rows_to_frame(rows, TABLE_COLUMNS["cyber_incidents"], INCIDENT_SCHEMA)
+
+
+# Filtered frame shared with the AI assistant fragment
+FILTERED_KEY = "cyber_df_filtered"
+# Current filter selection, reused by the server-paged grid
+SELECTION_KEY = "cyber_selection"
+GRID_KEY = "cyber_grid"
+# confirmation of the last write, shown after the rerun
+NOTICE_KEY = "cyber_notice"
+
+
+# Writes from this process reach the engine through services.events;
+# everything else (other processes included) through the change log.
+@st.cache_resource(show_spinner=False)
+def incident_filter_engine():
+    # position in the change log before reading, so nothing written during
+    # the load is missed (re-applying a change is harmless)
+    seq = incident_service.change_seq()
+    engine = BitmapFilterEngine(
+        incidents_to_df(incident_service.list_incidents()),
+        key_column="incident_id",
+        columns=("severity", "status"),
+        schema=INCIDENT_SCHEMA,
     )
+    engine.seq = seq
+    # weak: an engine dropped from the cache stops receiving events
+    events.subscribe("cyber_incidents", engine.apply_event, weak=True)
+    return engine
 
 
+@timed(PAGE)
 def load_incidents_df():
-    rows = incident_service.list_incidents()
-    return incidents_to_df(rows)
-
-
+    engine = incident_filter_engine()
+    # apply only what changed since the last render, by any writer
+    # (the CSV ingest, the archiver, other processes); see DB/cdc.py
+    delta = incident_service.changes_since(engine.seq)
+    if delta.reset:
+        engine.rebuild(incidents_to_df(incident_service.list_incidents()))
+        engine.seq = delta.seq
+    elif delta.rows or delta.deleted:
+        engine.apply_delta(incidents_to_df(delta.rows), delta.deleted, delta.seq)
+    else:
+        engine.seq = delta.seq
+    return engine.live_frame()
+
+
+def refresh_incidents(message: str, level: str = "success"):
+    """
+    Rerun the page after a write, with the confirmation shown after the
+    rerun. A fragment can only rerun itself, and the summary, grid and
+    charts (filtered_view) are a separate fragment above the forms, so
+    the whole page reruns; the filter engine has already applied the
+    change via services.events and the grid drops its cached count and
+    prefetched window.
+    """
+    notify(NOTICE_KEY, message, level)
+    clear_grid_cache(GRID_KEY)
+    st.rerun()
+
+
+@timed(PAGE)
 def apply_filters(df: pd.DataFrame) -> pd.DataFrame:
+    st.session_state[SELECTION_KEY] = {}
     if df.empty:
         return df
 
@@ -68,8 +108,10 @@ def apply_filters(df: pd.DataFrame) -> pd.DataFrame:
 
     col1, col2, col3 = st.columns([1, 1, 2])
 
+    engine = incident_filter_engine()
+
     with col1:
-        severities = sorted(df["severity"].dropna().unique())
+        severities = engine.distinct_values("severity")
         selected_sev = st.multiselect(
             "Severity",
             severities,
@@ -77,7 +119,7 @@ def apply_filters(df: pd.DataFrame) -> pd.DataFrame:
         )
 
     with col2:
-        statuses = sorted(df["status"].dropna().unique())
+        statuses = engine.distinct_values("status")
         selected_status = st.multiselect(
             "Status",
             statuses,
@@ -87,23 +129,33 @@ def apply_filters(df: pd.DataFrame) -> pd.DataFrame:
     with col3:
         search_text = st.text_input("Search ID / description")
 
-    mask = pd.Series(True, index=df.index)
-    if selected_sev:
-        mask &= df["severity"].isin(selected_sev)
-    if selected_status:
-        mask &= df["status"].isin(selected_status)
+    reported = date_range_filter("Reported between", df["reported_at"], key="cyber_reported_range")
+
+    filters = {"severity": selected_sev, "status": selected_status}
+    if reported is not None:
+        filters["reported_at"] = reported
+    st.session_state[SELECTION_KEY] = {"filters": filters, "search": search_text}
+
+    # multiselects are answered from the bitmaps; free-text search only
+    # scans the rows that survive them
+    df = engine.filter({"severity": selected_sev, "status": selected_status})
+    if reported is not None:
+        df = df[mask_date_range(df["reported_at"], reported)]
     if search_text:
         s = search_text.lower()
-        mask &= (
-            df["incident_id"].str.lower().str.contains(s)
-            | df["description"].fillna("").str.lower().str.contains(s)
-        )
+        df = df[
+            df["incident_id"].str.lower().str.contains(s, regex=False)
+            | df["description"].fillna("").str.lower().str.contains(s, regex=False)
+        ]
 
-    return df[mask]
+    return df
 
 
+@st.fragment
+@timed(PAGE)
 def create_incident_form():
     st.markdown("### Create new incident")
+    show_notice(NOTICE_KEY)
 
     with st.form("create_incident_form"):
         col1, col2, col3 = st.columns(3)
@@ -124,7 +176,8 @@ def create_incident_form():
             if not incident_id:
                 st.error("Incident ID is required.")
             else:
-                incident_service.create_incident(
+                error = write_error(
+                    incident_service.create_incident,
                     incident_id=incident_id,
                     incident_type=incident_type,
                     severity=severity,
@@ -134,23 +187,24 @@ def create_incident_form():
                     assigned_to=assigned_to,
                     description=description,
                 )
-                st.success(f"Incident {incident_id} created.")
-                st.rerun()
+                if error is not None:
+                    st.error(f"Could not create incident {incident_id}: {error}")
+                else:
+                    refresh_incidents(f"Incident {incident_id} created.")
 
 
-def update_delete_section(df: pd.DataFrame):
+@st.fragment
+@timed(PAGE)
+def update_delete_section():
     st.markdown("### Update or delete incident")
+    show_notice(NOTICE_KEY)
 
-    if df.empty:
-        st.info("No incidents available yet.")
-        return
-
-    ids = df["incident_id"].tolist()
-
+    # IDs are typed and checked against the service on submit, rather than
+    # listing every incident in a selectbox sent to the browser
     with st.expander("Update incident status", expanded=True):
         col1, col2 = st.columns(2)
         with col1:
-            target_id = st.selectbox("Incident ID", ids, key="update_id")
+            target_id = st.text_input("Incident ID", key="update_id").strip()
         with col2:
             new_status = st.selectbox(
                 "New status",
@@ -159,57 +213,75 @@ def update_delete_section(df: pd.DataFrame):
             )
 
         if st.button("Apply status update"):
-            incident_service.change_status(target_id, new_status)
-            st.success(f"Status for {target_id} updated to {new_status}.")
-            st.rerun()
+            if not incident_service.incident_exists(target_id):
+                st.error(f"No incident with ID {target_id!r}.")
+            else:
+                error = write_error(incident_service.change_status, target_id, new_status)
+                if error is not None:
+                    st.error(f"Could not update incident {target_id}: {error}")
+                else:
+                    refresh_incidents(f"Status for {target_id} updated to {new_status}.")
 
     with st.expander("Delete incident"):
-        delete_id = st.selectbox("Incident ID to delete", ids, key="delete_id")
-        if st.button("Delete selected incident"):
-            incident_service.remove_incident(delete_id)
-            st.warning(f"Incident {delete_id} deleted.")
-            st.rerun()
+        delete_id = st.text_input("Incident ID to delete", key="delete_id").strip()
+        if st.button("Delete incident"):
+            if not incident_service.incident_exists(delete_id):
+                st.error(f"No incident with ID {delete_id!r}.")
+            else:
+                error = write_error(incident_service.remove_incident, delete_id)
+                if error is not None:
+                    st.error(f"Could not delete incident {delete_id}: {error}")
+                else:
+                    refresh_incidents(f"Incident {delete_id} deleted.", "warning")
 
 
+@timed(PAGE)
 def visualisations(df: pd.DataFrame):
+    import plotly.express as px  # loaded on first chart render
+
     st.markdown("### Incident analytics")
 
     if df.empty:
         st.info("No data available for charts.")
         return
 
+    # aggregations run in the analytics engine (SQLite or DuckDB) over
+    # the same filter selection as the grid
+    selection = dict(st.session_state.get(SELECTION_KEY, {}))
+    selection["include_archive"] = st.checkbox(
+        "Include archived incidents", key="cyber_include_archive",
+        help="Also count resolved/closed incidents moved to the archive.",
+    )
+    analytics = get_analytics()
+
     col1, col2 = st.columns(2)
 
     with col1:
-        by_sev = df["severity"].value_counts().reset_index()
-        by_sev.columns = ["severity", "count"]
+        by_sev = analytics.metric("incidents_by_severity", **selection)
         fig = px.bar(by_sev, x="severity", y="count", title="Incidents by severity")
         st.plotly_chart(fig, use_container_width=True)
 
     with col2:
-        by_status = df["status"].value_counts().reset_index()
-        by_status.columns = ["status", "count"]
+        by_status = analytics.metric("incidents_by_status", **selection)
         fig2 = px.bar(by_status, x="status", y="count", title="Incidents by status")
         st.plotly_chart(fig2, use_container_width=True)
 
-    if "reported_at" in df.columns:
-        df_ts = df.copy()
-        df_ts["reported_at"] = pd.to_datetime(df_ts["reported_at"], errors="coerce")
-        df_ts = df_ts.dropna(subset=["reported_at"])
-        if not df_ts.empty:
-            ts = df_ts.groupby("reported_at")["id"].count().reset_index()
-            ts.columns = ["reported_at", "incident_count"]
-            fig3 = px.line(ts, x="reported_at", y="incident_count", title="Incidents over time")
-            st.plotly_chart(fig3, use_container_width=True)
+    ts = analytics.metric("incidents_over_time", **selection)
+    if not ts.empty:
+        downsampled_line_chart(
+            ts, "reported_at", "incident_count", "Incidents over time", key="cyber_ts"
+        )
+    st.caption(f"Aggregated with {analytics.effective_engine()}.")
 
 
+@timed(PAGE)
 def build_incident_context(df: pd.DataFrame) -> str:
     if df.empty:
         return "There are currently no incidents."
 
     total = len(df)
-    by_sev = df["severity"].value_counts().to_dict()
-    by_status = df["status"].value_counts().to_dict()
+    by_sev = value_counts(df["severity"]).to_dict()
+    by_status = value_counts(df["status"]).to_dict()
 
     lines = f"Total incidents: {total}."
     if by_sev:
@@ -222,16 +294,38 @@ def build_incident_context(df: pd.DataFrame) -> str:
     return lines
 
 
-def dashboard():
-    user = require_login()
+@st.fragment
+@timed(PAGE)
+def batch_triage_section():
+    st.markdown("### 🧮 Batch AI triage")
 
-    st.title("🛡️ Cybersecurity Dashboard")
-    st.caption(f"Welcome, {user['username']}.")
+    with st.expander("Triage all open incidents in batches", expanded=False):
+        st.caption(
+            "Sends Open / In Progress incidents to the AI in packed batches. "
+            "Incidents that have not changed since the last run are answered from cache."
+        )
+        c1, c2 = st.columns(2)
+        with c1:
+            token_budget = st.number_input(
+                "Token budget per request", min_value=500, max_value=16000, value=3000, step=500
+            )
+        with c2:
+            rpm = st.number_input("Max requests per minute", min_value=1, max_value=600, value=20)
+
+        if st.button("Run batch triage", key="triage_button"):
+            with st.spinner("Triaging incidents..."):
+                results = incident_service.triage_open_incidents(
+                    token_budget=int(token_budget),
+                    requests_per_minute=int(rpm),
+                )
+            if not results:
+                st.info("No open incidents to triage.")
+            else:
+                st.dataframe(pd.DataFrame(results), use_container_width=True)
 
-    df = load_incidents_df()
-    df_filtered = apply_filters(df)
 
-    # Summary metrics
+@timed(PAGE)
+def summary_metrics(df_filtered: pd.DataFrame):
     st.markdown("### Summary")
     total = len(df_filtered)
     open_count = int((df_filtered["status"] == "Open").sum()) if not df_filtered.empty else 0
@@ -244,21 +338,46 @@ def dashboard():
     c3.metric("High severity incidents", high_count)
     c4.metric("Critical incidents", critical_count)
 
-    # Layout: table + create form side by side
-    col_left, col_right = st.columns([2, 1])
 
-    with col_left:
-        st.markdown("### Incident table")
-        st.dataframe(df_filtered, use_container_width=True, height=380)
-        st.caption(f"Showing {len(df_filtered)} of {len(df)} incidents (after filters).")
-
-    with col_right:
-        create_incident_form()
+@st.fragment
+@timed(PAGE)
+def filtered_view():
+    """
+    Filters plus everything driven by them (summary, table, charts).
+    Changing a filter reruns only this fragment; it reads the data
+    itself, so that rerun shows the latest writes too.
+    """
+    df = load_incidents_df()
+    df_filtered = apply_filters(df)
+    st.session_state[FILTERED_KEY] = df_filtered
+
+    summary_metrics(df_filtered)
+
+    st.markdown("### Incident table")
+    selection = st.session_state[SELECTION_KEY]
+    paged_grid(
+        GRID_KEY,
+        TABLE_COLUMNS["cyber_incidents"],
+        incident_service.count_incidents,
+        incident_service.page_incidents,
+        filters=selection.get("filters"),
+        search=selection.get("search"),
+        version=incident_filter_engine().seq,
+    )
+    st.caption(f"{len(df_filtered)} of {len(df)} incidents match the filters.")
+    export_panel(
+        "cyber_export",
+        incident_service.export_incidents,
+        filters=selection.get("filters"),
+        search=selection.get("search"),
+    )
 
-    update_delete_section(df_filtered)
     visualisations(df_filtered)
 
-    # --- AI Assistant section ---
+
+@st.fragment
+@timed(PAGE)
+def assistant_section():
     st.markdown("### 🔎 AI Security Assistant")
 
     with st.expander("Ask questions about the incidents (ChatGPT-powered)", expanded=False):
@@ -273,12 +392,36 @@ def dashboard():
             if not user_q.strip():
                 st.warning("Please enter a question first.")
             else:
+                # latest filter selection, even if only the filters fragment reran
+                df_filtered = st.session_state.get(FILTERED_KEY, pd.DataFrame())
                 context = build_incident_context(df_filtered)
-                with st.spinner("Contacting AI assistant..."):
+                with st.spinner("Contacting AI assistant..."), span("ask_ai"):
                     answer = ask_cyber_assistant(user_q, context)
                 st.markdown("**Assistant response:**")
                 st.write(answer)
 
 
+def dashboard():
+    user = require_login()
+
+    st.title("🛡️ Cybersecurity Dashboard")
+    st.caption(f"Welcome, {user['username']}.")
+    # the offline assistant's similarity index builds in the background
+    warm_incident_index()
+
+    filtered_view()
+
+    # Layout: create form + update/delete side by side
+    col_left, col_right = st.columns(2)
+    with col_left:
+        create_incident_form()
+    with col_right:
+        update_delete_section()
+
+    batch_triage_section()
+    assistant_section()
+
+
 if __name__ == "__main__":
-    dashboard()
+    with render(PAGE):
+        dashboard()
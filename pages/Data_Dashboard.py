@@ -1,12 +1,30 @@
 # pages/Data_Dashboard.py
+import uuid
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 
 from ai_helper import ask_cyber_assistant
+from components.date_range import date_range_filter, mask_date_range
+from components.downsample import downsampled_line_chart
+from components.export_panel import export_panel
+from components.notice import notify, show_notice, write_error
+from components.paged_grid import clear_grid_cache, paged_grid
+from DB.crud import TABLE_COLUMNS
+from services import events
+from services.filter_engine import BitmapFilterEngine
+from services.analytics import get_analytics
+from services.frames import DATASET_SCHEMA, rows_to_frame, value_counts
 from services.datasets_service import DatasetService
+from render_timing import TimedService, render, span, timed
+
+PAGE = "Data_Dashboard"
 
-dataset_service = DatasetService()
+# with WRITE_BEHIND on, this session's reads wait for its own queued writes;
+# TimedService records each call as a section of this page (render_timing.py)
+dataset_service = TimedService(
+    DatasetService(session=st.session_state.setdefault("write_session", uuid.uuid4().hex)), PAGE
+)
 
 
 def require_login():
@@ -17,60 +35,108 @@ def require_login():
 
 
 def datasets_to_df(rows):
-    if not rows:
-        return pd.DataFrame(
-            columns=["id", "dataset_name", "owner", "source_system", "size_mb", "row_count", "created_at"]
-        )
-
-    first = rows[0]
-    if hasattr(first, "keys"):
-        cols = list(first.keys())
-        data = [tuple(r[c] for c in cols) for r in rows]
-        return pd.DataFrame(data, columns=cols)
-
-    return pd.DataFrame(
-        rows,
-        columns=["id", "dataset_name", "owner", "source_system", "size_mb", "row_count", "created_at"],
+    return rows_to_frame(rows, TABLE_COLUMNS["datasets_metadata"], DATASET_SCHEMA)
+
+
+# Filtered frame shared with the AI assistant fragment
+FILTERED_KEY = "data_df_filtered"
+SELECTION_KEY = "data_selection"
+GRID_KEY = "data_grid"
+# confirmation of the last write, shown after the rerun
+NOTICE_KEY = "data_notice"
+
+
+@st.cache_resource(show_spinner=False)
+def dataset_filter_engine():
+    # position in the change log before reading, so nothing written during
+    # the load is missed (re-applying a change is harmless)
+    seq = dataset_service.change_seq()
+    engine = BitmapFilterEngine(
+        datasets_to_df(dataset_service.list_datasets()),
+        key_column="dataset_name",
+        columns=("owner", "source_system"),
+        schema=DATASET_SCHEMA,
     )
+    engine.seq = seq
+    # weak: an engine dropped from the cache stops receiving events
+    events.subscribe("datasets_metadata", engine.apply_event, weak=True)
+    return engine
 
 
+@timed(PAGE)
 def load_datasets_df():
-    rows = dataset_service.list_datasets()
-    return datasets_to_df(rows)
+    engine = dataset_filter_engine()
+    # apply only what changed since the last render, by any writer
+    # (the CSV ingest, the archiver, other processes); see DB/cdc.py
+    delta = dataset_service.changes_since(engine.seq)
+    if delta.reset:
+        engine.rebuild(datasets_to_df(dataset_service.list_datasets()))
+        engine.seq = delta.seq
+    elif delta.rows or delta.deleted:
+        engine.apply_delta(datasets_to_df(delta.rows), delta.deleted, delta.seq)
+    else:
+        engine.seq = delta.seq
+    return engine.live_frame()
+
+
+def refresh_datasets(message: str, level: str = "success"):
+    """
+    Rerun the page after a write, with the confirmation shown after the
+    rerun. A fragment can only rerun itself, and the summary, grid and
+    charts (filtered_view) are a separate fragment above the forms, so
+    the whole page reruns; the filter engine has already applied the
+    change via services.events and the grid drops its cached count and
+    prefetched window.
+    """
+    notify(NOTICE_KEY, message, level)
+    clear_grid_cache(GRID_KEY)
+    st.rerun()
 
 
+@timed(PAGE)
 def apply_filters(df: pd.DataFrame) -> pd.DataFrame:
+    st.session_state[SELECTION_KEY] = {}
     if df.empty:
         return df
 
     st.subheader("Filters")
     c1, c2, c3 = st.columns([1, 1, 2])
 
+    engine = dataset_filter_engine()
+
     with c1:
-        owners = sorted(df["owner"].dropna().unique())
+        owners = engine.distinct_values("owner")
         owner_sel = st.multiselect("Owner", owners, default=owners)
 
     with c2:
-        sources = sorted(df["source_system"].dropna().unique())
+        sources = engine.distinct_values("source_system")
         src_sel = st.multiselect("Source system", sources, default=sources)
 
     with c3:
         search = st.text_input("Search dataset name")
 
-    mask = pd.Series(True, index=df.index)
-    if owner_sel:
-        mask &= df["owner"].isin(owner_sel)
-    if src_sel:
-        mask &= df["source_system"].isin(src_sel)
+    created = date_range_filter("Created between", df["created_at"], key="data_created_range")
+
+    filters = {"owner": owner_sel, "source_system": src_sel}
+    if created is not None:
+        filters["created_at"] = created
+    st.session_state[SELECTION_KEY] = {"filters": filters, "search": search}
+
+    df = engine.filter({"owner": owner_sel, "source_system": src_sel})
+    if created is not None:
+        df = df[mask_date_range(df["created_at"], created)]
     if search:
         s = search.lower()
-        mask &= df["dataset_name"].str.lower().str.contains(s)
+        df = df[df["dataset_name"].str.lower().str.contains(s, regex=False)]
 
-    return df[mask]
+    return df
 
 
+@st.fragment
+@timed(PAGE)
 def create_dataset_form():
     st.markdown("### Register new dataset")
+    show_notice(NOTICE_KEY)
 
     with st.form("create_dataset_form"):
         col1, col2, col3 = st.columns(3)
@@ -89,7 +155,8 @@ def create_dataset_form():
             if not name:
                 st.error("Dataset name is required.")
             else:
-                dataset_service.register_dataset(
+                error = write_error(
+                    dataset_service.register_dataset,
                     dataset_name=name,
                     owner=owner,
                     source_system=source,
@@ -97,73 +164,85 @@ def create_dataset_form():
                     row_count=int(rows),
                     created_at=str(created_at),
                 )
-                st.success(f"Dataset {name} created.")
-                st.rerun()
+                if error is not None:
+                    st.error(f"Could not register dataset {name}: {error}")
+                else:
+                    refresh_datasets(f"Dataset {name} created.")
 
 
-def update_delete_section(df: pd.DataFrame):
+@st.fragment
+@timed(PAGE)
+def update_delete_section():
     st.markdown("### Update or delete dataset")
+    show_notice(NOTICE_KEY)
 
-    if df.empty:
-        st.info("No datasets available yet.")
-        return
-
-    names = df["dataset_name"].tolist()
-
+    # names are typed and checked against the service on submit, rather
+    # than listing every dataset in a selectbox sent to the browser
     with st.expander("Change dataset owner", expanded=True):
         col1, col2 = st.columns(2)
         with col1:
-            ds_name = st.selectbox("Dataset", names, key="ds_update_name")
+            ds_name = st.text_input("Dataset name", key="ds_update_name").strip()
         with col2:
             new_owner = st.text_input("New owner", key="ds_new_owner")
 
         if st.button("Update owner"):
             if not new_owner:
                 st.error("Please enter a new owner.")
+            elif not dataset_service.dataset_exists(ds_name):
+                st.error(f"No dataset named {ds_name!r}.")
             else:
-                dataset_service.change_owner(ds_name, new_owner)
-                st.success(f"Owner for {ds_name} updated.")
-                st.rerun()
+                error = write_error(dataset_service.change_owner, ds_name, new_owner)
+                if error is not None:
+                    st.error(f"Could not change the owner of {ds_name}: {error}")
+                else:
+                    refresh_datasets(f"Owner for {ds_name} updated.")
 
     with st.expander("Delete dataset"):
-        del_name = st.selectbox("Dataset to delete", names, key="ds_delete_name")
+        del_name = st.text_input("Dataset to delete", key="ds_delete_name").strip()
         if st.button("Delete dataset"):
-            dataset_service.remove_dataset(del_name)
-            st.warning(f"Dataset {del_name} deleted.")
-            st.rerun()
+            if not dataset_service.dataset_exists(del_name):
+                st.error(f"No dataset named {del_name!r}.")
+            else:
+                error = write_error(dataset_service.remove_dataset, del_name)
+                if error is not None:
+                    st.error(f"Could not delete dataset {del_name}: {error}")
+                else:
+                    refresh_datasets(f"Dataset {del_name} deleted.", "warning")
 
 
+@timed(PAGE)
 def visualisations(df: pd.DataFrame):
+    import plotly.express as px
+
     st.markdown("### Dataset analytics")
 
     if df.empty:
         st.info("No data available for charts.")
         return
 
-    df_num = df.copy()
-    df_num["size_mb"] = pd.to_numeric(df_num["size_mb"], errors="coerce")
-    df_num["row_count"] = pd.to_numeric(df_num["row_count"], errors="coerce")
+    selection = st.session_state.get(SELECTION_KEY, {})
+    analytics = get_analytics()
 
     c1, c2 = st.columns(2)
 
     with c1:
-        by_owner = df_num.groupby("owner")["size_mb"].sum().reset_index()
+        by_owner = analytics.metric("datasets_size_by_owner", **selection)
         fig = px.bar(by_owner, x="owner", y="size_mb", title="Total size by owner (MB)")
         st.plotly_chart(fig, use_container_width=True)
 
     with c2:
-        by_source = df_num.groupby("source_system")["row_count"].sum().reset_index()
+        by_source = analytics.metric("datasets_rows_by_source", **selection)
         fig2 = px.bar(by_source, x="source_system", y="row_count", title="Total rows by source system")
         st.plotly_chart(fig2, use_container_width=True)
 
-    df_num["created_at"] = pd.to_datetime(df_num["created_at"], errors="coerce")
-    df_num = df_num.dropna(subset=["created_at"])
-    if not df_num.empty:
-        ts = df_num.groupby("created_at")["size_mb"].sum().reset_index()
-        ts.columns = ["created_at", "total_size_mb"]
-        fig3 = px.line(ts, x="created_at", y="total_size_mb", title="Storage growth over time (MB)")
-        st.plotly_chart(fig3, use_container_width=True)
+    ts = analytics.metric("datasets_size_over_time", **selection)
+    if not ts.empty:
+        downsampled_line_chart(
+            ts, "created_at", "total_size_mb", "Storage growth over time (MB)", key="data_ts"
+        )
+    st.caption(f"Aggregated with {analytics.effective_engine()}.")
 
+@timed(PAGE)
 def build_data_context(df: pd.DataFrame) -> str:
     """
     Build a natural-language summary for the Data Dashboard
@@ -174,16 +253,12 @@ def build_data_context(df: pd.DataFrame) -> str:
 
     total = len(df)
 
-    # Ensure numeric columns
-    df_num = df.copy()
-    df_num["size_mb"] = pd.to_numeric(df_num["size_mb"], errors="coerce")
-    df_num["row_count"] = pd.to_numeric(df_num["row_count"], errors="coerce")
+    # size_mb / row_count are already numeric (see DATASET_SCHEMA)
+    total_rows = int(df["row_count"].sum(skipna=True)) if "row_count" in df.columns else None
+    total_size = float(df["size_mb"].sum(skipna=True)) if "size_mb" in df.columns else None
 
-    total_rows = int(df_num["row_count"].sum(skipna=True)) if "row_count" in df_num.columns else None
-    total_size = float(df_num["size_mb"].sum(skipna=True)) if "size_mb" in df_num.columns else None
-
-    by_owner = df["owner"].value_counts().to_dict() if "owner" in df.columns else {}
-    by_source = df["source_system"].value_counts().to_dict() if "source_system" in df.columns else {}
+    by_owner = value_counts(df["owner"]).to_dict() if "owner" in df.columns else {}
+    by_source = value_counts(df["source_system"]).to_dict() if "source_system" in df.columns else {}
 
     lines = f"Total datasets: {total}."
     if total_rows is not None:
@@ -202,37 +277,59 @@ def build_data_context(df: pd.DataFrame) -> str:
 
 
 
-def dashboard():
-    user = require_login()
-
-    st.title("📚 Data Assets Dashboard")
-    st.caption(f"Welcome, {user['username']}.")
-
-    df = load_datasets_df()
-    df_f = apply_filters(df)
-
+@timed(PAGE)
+def summary_metrics(df_f: pd.DataFrame):
     st.markdown("### Summary")
     total_ds = len(df_f)
-    total_size = float(pd.to_numeric(df_f["size_mb"], errors="coerce").sum()) if not df_f.empty else 0.0
-    avg_rows = float(pd.to_numeric(df_f["row_count"], errors="coerce").mean()) if not df_f.empty else 0.0
+    total_size = float(df_f["size_mb"].sum()) if not df_f.empty else 0.0
+    avg_rows = df_f["row_count"].mean() if not df_f.empty else 0.0
+    avg_rows = float(avg_rows) if pd.notna(avg_rows) else 0.0
 
     c1, c2, c3 = st.columns(3)
     c1.metric("Datasets (filtered)", total_ds)
     c2.metric("Total size (MB)", f"{total_size:,.1f}")
     c3.metric("Average row count", f"{avg_rows:,.0f}")
 
-    col_left, col_right = st.columns([2, 1])
-    with col_left:
-        st.markdown("### Dataset table")
-        st.dataframe(df_f, use_container_width=True, height=380)
-        st.caption(f"Showing {len(df_f)} of {len(df)} datasets (after filters).")
-    with col_right:
-        create_dataset_form()
 
-    update_delete_section(df_f)
+@st.fragment
+@timed(PAGE)
+def filtered_view():
+    """
+    Filters plus the summary, table and charts they drive. Reads the
+    data itself, so a filter change (a rerun of this fragment only) shows
+    the latest writes too.
+    """
+    df = load_datasets_df()
+    df_f = apply_filters(df)
+    st.session_state[FILTERED_KEY] = df_f
+
+    summary_metrics(df_f)
+
+    st.markdown("### Dataset table")
+    selection = st.session_state[SELECTION_KEY]
+    paged_grid(
+        GRID_KEY,
+        TABLE_COLUMNS["datasets_metadata"],
+        dataset_service.count_datasets,
+        dataset_service.page_datasets,
+        filters=selection.get("filters"),
+        search=selection.get("search"),
+        version=dataset_filter_engine().seq,
+    )
+    st.caption(f"{len(df_f)} of {len(df)} datasets match the filters.")
+    export_panel(
+        "data_export",
+        dataset_service.export_datasets,
+        filters=selection.get("filters"),
+        search=selection.get("search"),
+    )
+
     visualisations(df_f)
 
-   # --- AI Assistant section ---
+
+@st.fragment
+@timed(PAGE)
+def assistant_section():
     st.markdown("### 🔎 AI Data Assistant")
 
     with st.expander("Ask questions about the datasets (ChatGPT-powered)", expanded=False):
@@ -249,11 +346,31 @@ def dashboard():
                 st.warning("Please enter a question first.")
             else:
                 # Use the filtered dataframe from this page
+                df_f = st.session_state.get(FILTERED_KEY, pd.DataFrame())
                 context = build_data_context(df_f)
-                with st.spinner("Contacting AI assistant..."):
-                    answer = ask_cyber_assistant(user_q, context)
+                with st.spinner("Contacting AI assistant..."), span("ask_ai"):
+                    answer = ask_cyber_assistant(user_q, context, dashboard="data")
                 st.markdown("**Assistant response:**")
                 st.write(answer)
 
+
+def dashboard():
+    user = require_login()
+
+    st.title("📚 Data Assets Dashboard")
+    st.caption(f"Welcome, {user['username']}.")
+
+    filtered_view()
+
+    col_left, col_right = st.columns(2)
+    with col_left:
+        create_dataset_form()
+    with col_right:
+        update_delete_section()
+
+    assistant_section()
+
+
 if __name__ == "__main__":
-    dashboard()
+    with render(PAGE):
+        dashboard()
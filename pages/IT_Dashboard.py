@@ -1,12 +1,29 @@
 # pages/IT_Dashboard.py
+import uuid
+
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 
 from ai_helper import ask_cyber_assistant
+from components.date_range import date_range_filter, mask_date_range
+from components.export_panel import export_panel
+from components.notice import notify, show_notice, write_error
+from components.paged_grid import clear_grid_cache, paged_grid
+from DB.crud import TABLE_COLUMNS
+from services import events
+from services.filter_engine import BitmapFilterEngine
+from services.analytics import get_analytics
+from services.frames import TICKET_SCHEMA, rows_to_frame, value_counts
 from services.tickets_service import TicketService
+from render_timing import TimedService, render, span, timed
+
+PAGE = "IT_Dashboard"
 
-ticket_service = TicketService()
+# with WRITE_BEHIND on, this session's reads wait for its own queued writes;
+# TimedService records each call as a section of this page (render_timing.py)
+ticket_service = TimedService(
+    TicketService(session=st.session_state.setdefault("write_session", uuid.uuid4().hex)), PAGE
+)
 
 
 def require_login():
@@ -17,86 +34,112 @@ def require_login():
 
 
 def tickets_to_df(rows):
-    if not rows:
-        return pd.DataFrame(
-            columns=[
-                "id",
-                "ticket_id",
-                "category",
-                "priority",
-                "status",
-                "opened_at",
-                "closed_at",
-                "assigned_to",
-            ]
-        )
-
-    first = rows[0]
-    if hasattr(first, "keys"):
-        cols = list(first.keys())
-        data = [tuple(r[c] for c in cols) for r in rows]
-        return pd.DataFrame(data, columns=cols)
-
-    return pd.DataFrame(
-        rows,
-        columns=[
-            "id",
-            "ticket_id",
-            "category",
-            "priority",
-            "status",
-            "opened_at",
-            "closed_at",
-            "assigned_to",
-        ],
+    return rows_to_frame(rows, TABLE_COLUMNS["it_tickets"], TICKET_SCHEMA)
+
+
+# Filtered frame shared with the AI assistant fragment
+FILTERED_KEY = "it_df_filtered"
+SELECTION_KEY = "it_selection"
+GRID_KEY = "it_grid"
+# confirmation of the last write, shown after the rerun
+NOTICE_KEY = "it_notice"
+
+
+@st.cache_resource(show_spinner=False)
+def ticket_filter_engine():
+    # position in the change log before reading, so nothing written during
+    # the load is missed (re-applying a change is harmless)
+    seq = ticket_service.change_seq()
+    engine = BitmapFilterEngine(
+        tickets_to_df(ticket_service.list_tickets()),
+        key_column="ticket_id",
+        columns=("priority", "status", "assigned_to"),
+        schema=TICKET_SCHEMA,
     )
+    engine.seq = seq
+    # weak: an engine dropped from the cache stops receiving events
+    events.subscribe("it_tickets", engine.apply_event, weak=True)
+    return engine
 
 
+@timed(PAGE)
 def load_tickets_df():
-    rows = ticket_service.list_tickets()
-    return tickets_to_df(rows)
+    engine = ticket_filter_engine()
+    # apply only what changed since the last render, by any writer
+    # (the CSV ingest, the archiver, other processes); see DB/cdc.py
+    delta = ticket_service.changes_since(engine.seq)
+    if delta.reset:
+        engine.rebuild(tickets_to_df(ticket_service.list_tickets()))
+        engine.seq = delta.seq
+    elif delta.rows or delta.deleted:
+        engine.apply_delta(tickets_to_df(delta.rows), delta.deleted, delta.seq)
+    else:
+        engine.seq = delta.seq
+    return engine.live_frame()
+
+
+def refresh_tickets(message: str, level: str = "success"):
+    """
+    Rerun the page after a write, with the confirmation shown after the
+    rerun. A fragment can only rerun itself, and the summary, grid and
+    charts (filtered_view) are a separate fragment above the forms, so
+    the whole page reruns; the filter engine has already applied the
+    change via services.events and the grid drops its cached count and
+    prefetched window.
+    """
+    notify(NOTICE_KEY, message, level)
+    clear_grid_cache(GRID_KEY)
+    st.rerun()
 
 
 def add_resolution_days(df: pd.DataFrame) -> pd.DataFrame:
+    # opened_at / closed_at are already datetime64 (see TICKET_SCHEMA)
     df = df.copy()
-    df["opened_at"] = pd.to_datetime(df["opened_at"], errors="coerce")
-    df["closed_at"] = pd.to_datetime(df["closed_at"], errors="coerce")
     df["resolution_days"] = (df["closed_at"] - df["opened_at"]).dt.days
     return df
 
 
+@timed(PAGE)
 def apply_filters(df: pd.DataFrame) -> pd.DataFrame:
+    st.session_state[SELECTION_KEY] = {}
     if df.empty:
         return df
 
     st.subheader("Filters")
     c1, c2, c3 = st.columns([1, 1, 2])
 
+    engine = ticket_filter_engine()
+
     with c1:
-        prios = sorted(df["priority"].dropna().unique())
+        prios = engine.distinct_values("priority")
         p_sel = st.multiselect("Priority", prios, default=prios)
 
     with c2:
-        statuses = sorted(df["status"].dropna().unique())
+        statuses = engine.distinct_values("status")
         s_sel = st.multiselect("Status", statuses, default=statuses)
 
     with c3:
-        assignees = sorted(df["assigned_to"].dropna().unique())
+        assignees = engine.distinct_values("assigned_to")
         a_sel = st.multiselect("Assigned to", assignees, default=assignees)
 
-    mask = pd.Series(True, index=df.index)
-    if p_sel:
-        mask &= df["priority"].isin(p_sel)
-    if s_sel:
-        mask &= df["status"].isin(s_sel)
-    if a_sel:
-        mask &= df["assigned_to"].isin(a_sel)
+    opened = date_range_filter("Opened between", df["opened_at"], key="it_opened_range")
 
-    return df[mask]
+    filters = {"priority": p_sel, "status": s_sel, "assigned_to": a_sel}
+    if opened is not None:
+        filters["opened_at"] = opened
+    st.session_state[SELECTION_KEY] = {"filters": filters}
+
+    df = engine.filter({"priority": p_sel, "status": s_sel, "assigned_to": a_sel})
+    if opened is not None:
+        df = df[mask_date_range(df["opened_at"], opened)]
+    return df
 
 
+@st.fragment
+@timed(PAGE)
 def create_ticket_form():
     st.markdown("### Create new ticket")
+    show_notice(NOTICE_KEY)
 
     with st.form("create_ticket_form"):
         col1, col2, col3 = st.columns(3)
@@ -119,7 +162,8 @@ def create_ticket_form():
                 # If user leaves closed_at equal to opened_at and wants it "empty",
                 # they can later edit via status updates; we still store a date or None.
                 closed_val = str(closed_at) if closed_at else None
-                ticket_service.create_ticket(
+                error = write_error(
+                    ticket_service.create_ticket,
                     ticket_id=ticket_id,
                     category=category,
                     priority=priority,
@@ -128,23 +172,24 @@ def create_ticket_form():
                     closed_at=closed_val,
                     assigned_to=assigned_to,
                 )
-                st.success(f"Ticket {ticket_id} created.")
-                st.rerun()
+                if error is not None:
+                    st.error(f"Could not create ticket {ticket_id}: {error}")
+                else:
+                    refresh_tickets(f"Ticket {ticket_id} created.")
 
 
-def update_delete_section(df: pd.DataFrame):
+@st.fragment
+@timed(PAGE)
+def update_delete_section():
     st.markdown("### Update or delete ticket")
+    show_notice(NOTICE_KEY)
 
-    if df.empty:
-        st.info("No tickets available yet.")
-        return
-
-    ids = df["ticket_id"].tolist()
-
+    # IDs are typed and checked against the service on submit, rather than
+    # listing every ticket in a selectbox sent to the browser
     with st.expander("Update ticket status", expanded=True):
         col1, col2 = st.columns(2)
         with col1:
-            t_id = st.selectbox("Ticket ID", ids, key="tt_update_id")
+            t_id = st.text_input("Ticket ID", key="tt_update_id").strip()
         with col2:
             new_status = st.selectbox(
                 "New status",
@@ -153,43 +198,58 @@ def update_delete_section(df: pd.DataFrame):
             )
 
         if st.button("Apply status update"):
-            ticket_service.change_status(t_id, new_status)
-            st.success(f"Status for {t_id} updated to {new_status}.")
-            st.rerun()
+            if not ticket_service.ticket_exists(t_id):
+                st.error(f"No ticket with ID {t_id!r}.")
+            else:
+                error = write_error(ticket_service.change_status, t_id, new_status)
+                if error is not None:
+                    st.error(f"Could not update ticket {t_id}: {error}")
+                else:
+                    refresh_tickets(f"Status for {t_id} updated to {new_status}.")
 
     with st.expander("Delete ticket"):
-        del_id = st.selectbox("Ticket ID to delete", ids, key="tt_delete_id")
+        del_id = st.text_input("Ticket ID to delete", key="tt_delete_id").strip()
         if st.button("Delete ticket"):
-            ticket_service.remove_ticket(del_id)
-            st.warning(f"Ticket {del_id} deleted.")
-            st.rerun()
+            if not ticket_service.ticket_exists(del_id):
+                st.error(f"No ticket with ID {del_id!r}.")
+            else:
+                error = write_error(ticket_service.remove_ticket, del_id)
+                if error is not None:
+                    st.error(f"Could not delete ticket {del_id}: {error}")
+                else:
+                    refresh_tickets(f"Ticket {del_id} deleted.", "warning")
 
 
+@timed(PAGE)
 def visualisations(df: pd.DataFrame):
+    import plotly.express as px
+
     st.markdown("### Ticket analytics")
 
     if df.empty:
         st.info("No data available for charts.")
         return
 
-    df = add_resolution_days(df)
+    selection = dict(st.session_state.get(SELECTION_KEY, {}))
+    selection["include_archive"] = st.checkbox(
+        "Include archived tickets", key="it_include_archive",
+        help="Also count resolved/closed tickets moved to the archive.",
+    )
+    analytics = get_analytics()
 
     c1, c2 = st.columns(2)
 
     with c1:
-        by_prio = df["priority"].value_counts().reset_index()
-        by_prio.columns = ["priority", "count"]
+        by_prio = analytics.metric("tickets_by_priority", **selection)
         fig = px.bar(by_prio, x="priority", y="count", title="Tickets by priority")
         st.plotly_chart(fig, use_container_width=True)
 
     with c2:
-        by_status = df["status"].value_counts().reset_index()
-        by_status.columns = ["status", "count"]
+        by_status = analytics.metric("tickets_by_status", **selection)
         fig2 = px.bar(by_status, x="status", y="count", title="Tickets by status")
         st.plotly_chart(fig2, use_container_width=True)
 
-    by_assignee = df.groupby("assigned_to")["resolution_days"].mean().reset_index()
-    by_assignee["resolution_days"] = by_assignee["resolution_days"].round(1)
+    by_assignee = analytics.metric("tickets_resolution_by_assignee", **selection)
     fig3 = px.bar(
         by_assignee,
         x="assigned_to",
@@ -197,7 +257,9 @@ def visualisations(df: pd.DataFrame):
         title="Average resolution time by assignee (days)",
     )
     st.plotly_chart(fig3, use_container_width=True)
+    st.caption(f"Aggregated with {analytics.effective_engine()}.")
 
+@timed(PAGE)
 def build_it_context(df: pd.DataFrame) -> str:
     """
     Build a natural-language summary for the IT Dashboard
@@ -209,17 +271,17 @@ def build_it_context(df: pd.DataFrame) -> str:
     total = len(df)
 
     by_priority = (
-        df["priority"].value_counts().to_dict()
+        value_counts(df["priority"]).to_dict()
         if "priority" in df.columns
         else {}
     )
     by_status = (
-        df["status"].value_counts().to_dict()
+        value_counts(df["status"]).to_dict()
         if "status" in df.columns
         else {}
     )
     by_category = (
-        df["category"].value_counts().to_dict()
+        value_counts(df["category"]).to_dict()
         if "category" in df.columns
         else {}
     )
@@ -238,16 +300,8 @@ def build_it_context(df: pd.DataFrame) -> str:
     return lines
 
 
-def dashboard():
-    user = require_login()
-
-    st.title("🛠️ IT Service Desk Dashboard")
-    st.caption(f"Welcome, {user['username']}.")
-
-    df = load_tickets_df()
-    df_f = apply_filters(df)
-    df_f = add_resolution_days(df_f)
-
+@timed(PAGE)
+def summary_metrics(df_f: pd.DataFrame):
     st.markdown("### Summary")
     total = len(df_f)
     open_count = int((df_f["status"] == "Open").sum()) if not df_f.empty else 0
@@ -258,18 +312,44 @@ def dashboard():
     c2.metric("Open tickets", open_count)
     c3.metric("Avg resolution time (days)", f"{avg_res:,.1f}")
 
-    col_left, col_right = st.columns([2, 1])
-    with col_left:
-        st.markdown("### Ticket table")
-        st.dataframe(df_f, use_container_width=True, height=380)
-        st.caption(f"Showing {len(df_f)} of {len(df)} tickets (after filters).")
-    with col_right:
-        create_ticket_form()
 
-    update_delete_section(df_f)
+@st.fragment
+@timed(PAGE)
+def filtered_view():
+    """
+    Filters plus the summary, table and charts they drive. Reads the
+    data itself, so a filter change (a rerun of this fragment only) shows
+    the latest writes too.
+    """
+    df = load_tickets_df()
+    df_f = apply_filters(df)
+    df_f = add_resolution_days(df_f)
+    st.session_state[FILTERED_KEY] = df_f
+
+    summary_metrics(df_f)
+
+    st.markdown("### Ticket table")
+    paged_grid(
+        GRID_KEY,
+        TABLE_COLUMNS["it_tickets"],
+        ticket_service.count_tickets,
+        ticket_service.page_tickets,
+        filters=st.session_state[SELECTION_KEY].get("filters"),
+        version=ticket_filter_engine().seq,
+    )
+    st.caption(f"{len(df_f)} of {len(df)} tickets match the filters.")
+    export_panel(
+        "it_export",
+        ticket_service.export_tickets,
+        filters=st.session_state[SELECTION_KEY].get("filters"),
+    )
+
     visualisations(df_f)
 
-    # --- AI Assistant section ---
+
+@st.fragment
+@timed(PAGE)
+def assistant_section():
     st.markdown("### 🔎 AI IT Support Assistant")
 
     with st.expander("Ask questions about the IT tickets (ChatGPT-powered)", expanded=False):
@@ -285,12 +365,31 @@ def dashboard():
             if not user_q.strip():
                 st.warning("Please enter a question first.")
             else:
+                df_f = st.session_state.get(FILTERED_KEY, pd.DataFrame())
                 context = build_it_context(df_f)
-                with st.spinner("Contacting AI assistant..."):
-                    answer = ask_cyber_assistant(user_q, context)
+                with st.spinner("Contacting AI assistant..."), span("ask_ai"):
+                    answer = ask_cyber_assistant(user_q, context, dashboard="it")
                 st.markdown("**Assistant response:**")
                 st.write(answer)
 
 
+def dashboard():
+    user = require_login()
+
+    st.title("🛠️ IT Service Desk Dashboard")
+    st.caption(f"Welcome, {user['username']}.")
+
+    filtered_view()
+
+    col_left, col_right = st.columns(2)
+    with col_left:
+        create_ticket_form()
+    with col_right:
+        update_delete_section()
+
+    assistant_section()
+
+
 if __name__ == "__main__":
-    dashboard()
+    with render(PAGE):
+        dashboard()
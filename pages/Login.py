@@ -1,6 +1,5 @@
 # pages/Login.py
 import streamlit as st
-import bcrypt
 
 from services.users_service import UserService
 
@@ -47,6 +46,9 @@ def login_page():
                 st.error("Invalid username or password.")
                 return
 
+            # bcrypt is only needed once a login is actually submitted
+            import bcrypt
+
             stored_hash = user_row["password_hash"]
             if isinstance(stored_hash, bytes):
                 stored_hash_bytes = stored_hash
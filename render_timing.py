@@ -0,0 +1,277 @@
+"""
+render_timing.py
+
+Where the time goes when a dashboard renders.
+
+The dashboards wrap their sections (load_*_df, apply_filters, the grid,
+visualisations, the AI assistant, ...) and the calls to their service in
+timing spans. Each finished span is one SpanRecord in an in-memory ring
+buffer (ring_buffer.RecordBuffer, like ai_telemetry.py); the Admin page shows
+p50 / p95 per page and section over the last RENDER_TIMING_WINDOW_S
+seconds.
+
+Spans nest: a span opened inside another one is recorded as
+"outer/inner" (e.g. "filtered_view/apply_filters") and belongs to the
+same page, so shared components such as the paged grid can open spans
+without knowing which page they are on.
+
+The Admin page can also ask for a profile of the next render of a page:
+- "cprofile": exact call counts and times, but slows the render down;
+  the .prof dump opens in pstats or snakeviz
+- "sampling": the rendering thread's stack every SAMPLE_INTERVAL_S,
+  close to normal speed; the .folded dump opens in speedscope or
+  flamegraph.pl
+"""
+
+from __future__ import annotations
+
+import cProfile
+import functools
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter, deque
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from DB.db import DATA_DIR
+from ring_buffer import RecordBuffer
+
+WINDOW_S = float(os.getenv("RENDER_TIMING_WINDOW_S", "900"))
+RING_SIZE = int(os.getenv("RENDER_TIMING_RING_SIZE", "20000"))
+PROFILE_DIR = Path(os.getenv("PROFILE_DIR") or DATA_DIR / "profiles")
+PROFILE_MODES = ("cprofile", "sampling")
+SAMPLE_INTERVAL_S = 0.005
+KEEP_PROFILES = 10
+
+_BUFFER = RecordBuffer(RING_SIZE, time_field="at")
+_PROFILES: deque = deque(maxlen=KEEP_PROFILES)
+_local = threading.local()
+_lock = threading.Lock()
+_pending: Dict[str, str] = {}  # page -> profile mode for its next render
+
+
+@dataclass
+class SpanRecord:
+    page: str
+    section: str
+    ms: float
+    at: float
+    error: bool = False
+
+
+def _stack() -> list:
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def span(section: str, page: Optional[str] = None):
+    """
+    Time the block as `section` of `page` (by default the page of the
+    enclosing span).
+    """
+    stack = _stack()
+    if page is None:
+        page = stack[-1][0] if stack else "-"
+    path = f"{stack[-1][1]}/{section}" if stack and stack[-1][0] == page else section
+    stack.append((page, path))
+    failed = False
+    t0 = time.perf_counter()
+    try:
+        yield
+    except BaseException as e:
+        # st.stop() / st.rerun() end a render by raising; they aren't failures
+        failed = not type(e).__module__.startswith("streamlit")
+        raise
+    finally:
+        stack.pop()
+        _BUFFER.append(SpanRecord(page, path, (time.perf_counter() - t0) * 1000.0, time.time(), failed))
+
+
+def timed(page: Optional[str] = None, section: Optional[str] = None):
+    """Decorator form of span(); the section defaults to the function name."""
+    def decorate(fn):
+        name = section or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, page):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+class TimedService:
+    """
+    Stands in for a service object and times each public method call as
+    a "Service.method" span of the page that made it.
+    """
+
+    def __init__(self, service, page: Optional[str] = None):
+        self._service = service
+        self._page = page
+
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        section = f"{type(self._service).__name__}.{name}"
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            with span(section, self._page):
+                return attr(*args, **kwargs)
+
+        return call
+
+
+# --------- Whole renders and profiles ---------
+
+@contextmanager
+def render(page: str):
+    """
+    Time one full run of a page script (section "render"), profiling it
+    if the Admin page asked for it. Sections run inside it are not
+    prefixed with "render/", so they aggregate with fragment reruns.
+    """
+    with _lock:
+        mode = _pending.pop(page, None)
+    profiler = _start_profiler(mode) if mode else None
+    t0 = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException as e:
+        failed = not type(e).__module__.startswith("streamlit")
+        raise
+    finally:
+        ms = (time.perf_counter() - t0) * 1000.0
+        _BUFFER.append(SpanRecord(page, "render", ms, time.time(), failed))
+        if profiler is not None:
+            _PROFILES.append({"page": page, "created_at": datetime.now().isoformat(timespec="seconds"),
+                              "render_ms": round(ms, 1), **profiler.stop(page)})
+
+
+def request_profile(page: str, mode: str = "cprofile") -> None:
+    """Profile the next render of `page` (in any session)."""
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode {mode!r} (expected one of {PROFILE_MODES})")
+    with _lock:
+        _pending[page] = mode
+
+
+def pending_profiles() -> Dict[str, str]:
+    with _lock:
+        return dict(_pending)
+
+
+def profiles() -> List[dict]:
+    """Finished profiles, newest last: page, mode, render_ms, path, report."""
+    return list(_PROFILES)
+
+
+def _dump_path(page: str, suffix: str) -> Path:
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    return PROFILE_DIR / f"{page}-{datetime.now():%Y%m%d-%H%M%S}{suffix}"
+
+
+class _CProfiler:
+    def __init__(self):
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self, page: str) -> dict:
+        self.profile.disable()
+        path = _dump_path(page, ".prof")
+        self.profile.dump_stats(path)
+        out = io.StringIO()
+        pstats.Stats(self.profile, stream=out).strip_dirs().sort_stats("cumulative").print_stats(40)
+        return {"mode": "cprofile", "path": str(path), "report": out.getvalue()}
+
+
+class _Sampler:
+    """Samples the stack of the thread that started it from a helper thread."""
+
+    def __init__(self, interval_s: float = SAMPLE_INTERVAL_S):
+        self.interval_s = interval_s
+        self.target = threading.get_ident()
+        self.stacks: Counter = Counter()
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="render-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self) -> None:
+        while not self._done.wait(self.interval_s):
+            frame = sys._current_frames().get(self.target)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({Path(code.co_filename).name}:{code.co_firstlineno})")
+                frame = frame.f_back
+            if stack:
+                self.stacks[";".join(reversed(stack))] += 1
+
+    def stop(self, page: str) -> dict:
+        self._done.set()
+        self._thread.join()
+        path = _dump_path(page, ".folded")
+        path.write_text("".join(f"{stack} {n}\n" for stack, n in self.stacks.items()), encoding="utf-8")
+
+        total = sum(self.stacks.values())
+        own: Counter = Counter()
+        inclusive: Counter = Counter()
+        for stack, n in self.stacks.items():
+            frames = stack.split(";")
+            own[frames[-1]] += n
+            for name in set(frames):
+                inclusive[name] += n
+        lines = [f"{total} samples every {self.interval_s * 1000:g} ms", "", "own time:"]
+        lines += [f"  {n / total:6.1%}  {name}" for name, n in own.most_common(20)]
+        lines += ["", "including callees:"]
+        lines += [f"  {n / total:6.1%}  {name}" for name, n in inclusive.most_common(20)]
+        return {"mode": "sampling", "path": str(path), "report": "\n".join(lines) if total else "No samples taken."}
+
+
+def _start_profiler(mode: str):
+    if mode == "cprofile":
+        try:
+            return _CProfiler()
+        except ValueError:
+            pass  # another profiler is already active in this thread
+    return _Sampler()
+
+
+# --------- Reading ---------
+
+def records(window_s: Optional[float] = WINDOW_S) -> List[dict]:
+    """Spans finished in the last window_s seconds (all if None), oldest first."""
+    return _BUFFER.records(window_s)
+
+
+def clear() -> None:
+    _BUFFER.clear()
+
+
+def summarize(page: Optional[str] = None, window_s: Optional[float] = WINDOW_S) -> List[Dict[str, object]]:
+    """
+    p50 / p95 per page and section over the window, slowest p95 first
+    within each page.
+    """
+    rows = _BUFFER.summarize(
+        ("page", "section"), "ms",
+        extra=lambda items: {"errors": sum(1 for r in items if r.error)},
+        where=None if page is None else (lambda r: r.page == page),
+        window_s=window_s,
+    )
+    return sorted(rows, key=lambda row: (row["page"], -row["p95_ms"]))
@@ -0,0 +1,104 @@
+"""
+ring_buffer.py
+
+In-memory record buffer shared by ai_telemetry.py, DB/sql_trace.py and
+render_timing.py.
+
+Each keeps its records (one dataclass per AI call, SQL statement or
+render span) in a bounded deque, so recording is a single append and
+memory use is fixed. RecordBuffer adds the reading side they all need:
+a snapshot (optionally limited to the last window_s seconds), clear(),
+and latency percentiles per group of records for the Admin page.
+"""
+
+from __future__ import annotations
+
+import math
+import time
+from collections import deque
+from dataclasses import asdict
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile (pct in 0..100): the smallest value with at least pct% of values at or below it."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class RecordBuffer:
+    """
+    Bounded buffer of dataclass records, oldest first. `time_field` names
+    the record field (epoch seconds) that window_s is measured against.
+    """
+
+    def __init__(self, size: int, time_field: Optional[str] = None):
+        self.size = size
+        self.time_field = time_field
+        self._items: deque = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def append(self, record: Any) -> None:
+        self._items.append(record)
+
+    def clear(self) -> None:
+        self._items.clear()
+
+    def snapshot(self, window_s: Optional[float] = None) -> List[Any]:
+        """The records (of the last window_s seconds, if given)."""
+        items = list(self._items)
+        if window_s and self.time_field:
+            since = time.time() - window_s
+            items = [r for r in items if getattr(r, self.time_field) >= since]
+        return items
+
+    def records(self, window_s: Optional[float] = None) -> List[dict]:
+        """snapshot() as plain dicts."""
+        return [asdict(r) for r in self.snapshot(window_s)]
+
+    def summarize(
+        self,
+        group_by: Iterable[str],
+        value: str,
+        count_name: str = "calls",
+        percentiles: Sequence[int] = (50, 95),
+        digits: int = 1,
+        extra: Optional[Callable[[List[Any]], Dict[str, Any]]] = None,
+        derived: Optional[Dict[str, Callable[[Any], Any]]] = None,
+        where: Optional[Callable[[Any], bool]] = None,
+        window_s: Optional[float] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        One row per group of records: the group_by fields, the count,
+        p<N>_ms for each percentile, max_ms and total_ms of `value` (a
+        field in milliseconds), plus whatever extra(items) returns.
+        `derived` maps group_by names that are not record fields to a
+        function of the record. Rows come in no particular order.
+        """
+        keys = tuple(group_by)
+        derived = derived or {}
+        groups: Dict[tuple, List[Any]] = {}
+        for r in self.snapshot(window_s):
+            if where is not None and not where(r):
+                continue
+            group_key = tuple(derived[k](r) if k in derived else getattr(r, k) for k in keys)
+            groups.setdefault(group_key, []).append(r)
+
+        rows = []
+        for group_key, items in groups.items():
+            values = [getattr(r, value) for r in items]
+            row: Dict[str, Any] = dict(zip(keys, group_key))
+            row[count_name] = len(items)
+            for pct in percentiles:
+                row[f"p{pct}_ms"] = round(percentile(values, pct), digits)
+            row["max_ms"] = round(max(values), digits)
+            row["total_ms"] = round(sum(values), 1)
+            if extra is not None:
+                row.update(extra(items))
+            rows.append(row)
+        return rows
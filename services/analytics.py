@@ -0,0 +1,401 @@
+# services/analytics.py
+
+"""
+Dashboard metrics with a choice of engine.
+
+- "sqlite": the metric SQL runs directly against the SQLite file.
+- "duckdb": the metric SQL runs against a columnar DuckDB copy of
+            cyber_incidents, it_tickets and datasets_metadata. Large
+            group-bys only scan the columns they use.
+
+The DuckDB copy is loaded chunk by chunk from SQLite (fetchmany) once,
+then patched from the change log (DB/cdc.py): before a query, at most
+every CHECK_INTERVAL_S, the rows of the keys changed since the copy's
+change-log position replace their old rows and deleted keys are removed.
+This catches writes from every writer, other processes included.
+
+Writes made through the services (services.events) are patched in on the
+next query without waiting for CHECK_INTERVAL_S; that includes updates
+of archived rows, which the change log (hot tables only) doesn't see.
+A full reload only happens when the log no longer reaches back to the
+copy's position, and as a backstop every ANALYTICS_MAX_AGE_S.
+
+Both engines count resolution days the same way (days_between).
+
+Both engines take the same filters / search as the paged grid, so the
+charts always describe the rows that match the dashboard filters.
+
+duckdb is optional; without it everything runs on SQLite. The default
+engine comes from the ANALYTICS_ENGINE env var and can be switched at
+runtime from the Admin page.
+"""
+
+from __future__ import annotations
+
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+from metrics import cache_lookup
+from DB.archive import view_name
+from DB.crud import ARCHIVE_TABLES, KEY_COLUMNS, TABLE_COLUMNS, build_where
+from DB.db import DatabaseManager, domain_for
+from DB.cdc import current_seq, fetch_delta
+from services import events
+
+ENGINES = ("sqlite", "duckdb")
+# full reload backstop; changes are normally patched in from the change log
+MAX_AGE_S = float(os.getenv("ANALYTICS_MAX_AGE_S", "3600"))
+# how often the change-log position is checked per table
+CHECK_INTERVAL_S = 2.0
+DUCKDB_PATH = os.getenv("ANALYTICS_DUCKDB_PATH", ":memory:")
+
+# columns stored as TIMESTAMP in the columnar copy
+DATE_COLUMNS = {
+    "cyber_incidents": ("reported_at", "resolved_at"),
+    "it_tickets": ("opened_at", "closed_at"),
+    "datasets_metadata": ("created_at",),
+}
+
+# numeric columns; everything else is loaded as text
+NUMERIC_COLUMNS = {"id": "Int64", "size_mb": "Float64", "row_count": "Int64"}
+
+# free-text search columns, as in the services
+SEARCH_COLUMNS = {
+    "cyber_incidents": ("incident_id", "description"),
+    "it_tickets": (),
+    "datasets_metadata": ("dataset_name",),
+}
+
+
+# seconds from {start} to {end}; NULL if either is missing or not a date
+_SECONDS_BETWEEN = {
+    "sqlite": "(CAST(strftime('%s', {end}) AS INTEGER) - CAST(strftime('%s', {start}) AS INTEGER))",
+    "duckdb": "date_diff('second', {start}, {end})",
+}
+
+
+def days_between(engine: str, start: str, end: str) -> str:
+    """
+    SQL for the whole days elapsed from start to end, rounded down, the
+    same in both engines (and as Timedelta.days on the IT dashboard).
+    """
+    seconds = _SECONDS_BETWEEN[engine].format(start=start, end=end)
+    if engine == "sqlite":
+        # SQLite's integer division truncates toward zero; step negatives down
+        return f"(({seconds}) - 86399 * (({seconds}) < 0)) / 86400"
+    return f"floor(({seconds}) / 86400)"
+
+
+@dataclass(frozen=True)
+class Metric:
+    table: str
+    sql: Dict[str, str]  # engine -> SQL with {source} and {where} placeholders
+    date_column: Optional[str] = None  # parsed to datetime64 in the result
+
+
+def _count_by(table: str, col: str) -> Metric:
+    sql = (
+        f"SELECT {col}, COUNT(*) AS count FROM {{source}}{{where}} "
+        f"GROUP BY {col} HAVING {col} IS NOT NULL ORDER BY count DESC, {col}"
+    )
+    return Metric(table, {"sqlite": sql, "duckdb": sql})
+
+
+def _avg_days_by(table: str, col: str, start: str, end: str, name: str) -> Metric:
+    return Metric(table, {
+        engine: f"SELECT {col}, ROUND(AVG({days_between(engine, start, end)}), 1) AS {name} "
+                f"FROM {{source}}{{where}} GROUP BY {col} HAVING {col} IS NOT NULL ORDER BY {col}"
+        for engine in ENGINES
+    })
+
+
+def _sum_by(table: str, col: str, measure: str) -> Metric:
+    sql = (
+        f"SELECT {col}, SUM({measure}) AS {measure} FROM {{source}}{{where}} "
+        f"GROUP BY {col} HAVING {col} IS NOT NULL ORDER BY {col}"
+    )
+    return Metric(table, {"sqlite": sql, "duckdb": sql})
+
+
+METRICS: Dict[str, Metric] = {
+    "incidents_by_severity": _count_by("cyber_incidents", "severity"),
+    "incidents_by_status": _count_by("cyber_incidents", "status"),
+    "incidents_over_time": Metric(
+        "cyber_incidents",
+        {
+            "sqlite": "SELECT reported_at, COUNT(*) AS incident_count FROM {source}{where} "
+                      "GROUP BY reported_at HAVING reported_at IS NOT NULL AND reported_at != '' "
+                      "ORDER BY reported_at",
+            "duckdb": "SELECT reported_at, COUNT(*) AS incident_count FROM {source}{where} "
+                      "GROUP BY reported_at HAVING reported_at IS NOT NULL ORDER BY reported_at",
+        },
+        date_column="reported_at",
+    ),
+    "tickets_by_priority": _count_by("it_tickets", "priority"),
+    "tickets_by_status": _count_by("it_tickets", "status"),
+    "tickets_resolution_by_assignee": _avg_days_by(
+        "it_tickets", "assigned_to", "opened_at", "closed_at", "resolution_days"
+    ),
+    "datasets_size_by_owner": _sum_by("datasets_metadata", "owner", "size_mb"),
+    "datasets_rows_by_source": _sum_by("datasets_metadata", "source_system", "row_count"),
+    "datasets_size_over_time": Metric(
+        "datasets_metadata",
+        {
+            "sqlite": "SELECT created_at, SUM(size_mb) AS total_size_mb FROM {source}{where} "
+                      "GROUP BY created_at HAVING created_at IS NOT NULL AND created_at != '' "
+                      "ORDER BY created_at",
+            "duckdb": "SELECT created_at, SUM(size_mb) AS total_size_mb FROM {source}{where} "
+                      "GROUP BY created_at HAVING created_at IS NOT NULL ORDER BY created_at",
+        },
+        date_column="created_at",
+    ),
+}
+
+
+def duckdb_available() -> bool:
+    try:
+        import duckdb  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+# --------- Columnar copy ---------
+
+class ColumnarSnapshot:
+    """
+    DuckDB copy of the dashboard tables, loaded in full once and then
+    patched from the change log (see the module docstring).
+    """
+
+    def __init__(self, db_manager_cls=DatabaseManager, path: str = DUCKDB_PATH, max_age: float = MAX_AGE_S):
+        import duckdb
+
+        self._db_manager_cls = db_manager_cls
+        self.con = duckdb.connect(path)
+        self.max_age = max_age
+        self._lock = threading.RLock()
+        self._synced: Dict[str, Dict[str, Any]] = {}  # table -> {"at", "signature", "rows", "checked"}
+        self._pending: Dict[str, set] = {}  # table -> keys written through the services
+        for table in TABLE_COLUMNS:
+            events.subscribe(table, self._on_event)
+
+    def _on_event(self, table, op, key, values=None):
+        for name in (table, view_name(table)):
+            self._pending.setdefault(name, set()).add(key)
+
+    def _signature(self, db, table):
+        # archiving deletes from the hot table, so the hot table's change-log
+        # position also moves for its <table>_all view
+        base = table[: -len("_all")] if table.endswith("_all") else table
+        return current_seq(db, base)
+
+    def _layout(self, table: str):
+        """(base table, columns, DuckDB SELECT list, pandas dtypes) of a table or view."""
+        base = table[: -len("_all")] if table.endswith("_all") else table
+        columns = list(TABLE_COLUMNS[base])
+        dates = DATE_COLUMNS.get(base, ())
+        select = ", ".join(
+            f"TRY_CAST(NULLIF({c}, '') AS TIMESTAMP) AS {c}" if c in dates else c for c in columns
+        )
+        # explicit dtypes, so an all-NULL column in the first chunk still
+        # gets a usable type in DuckDB
+        dtypes = {c: NUMERIC_COLUMNS.get(c, "string") for c in columns}
+        return base, columns, select, dtypes
+
+    def _write_rows(self, statement: str, rows, columns, select, dtypes) -> None:
+        """Run `statement` + SELECT over the SQLite rows, e.g. "INSERT INTO t"."""
+        frame = pd.DataFrame([tuple(r) for r in rows], columns=columns).astype(dtypes)
+        self.con.register("chunk_frame", frame)
+        try:
+            self.con.execute(f"{statement} SELECT {select} FROM chunk_frame")
+        finally:
+            self.con.unregister("chunk_frame")
+
+    def load_table(self, table: str, chunk_size: int = 50_000) -> int:
+        """
+        (Re)load one table, or a <table>_all archive view, from SQLite,
+        chunk by chunk. Returns rows loaded.
+        """
+        base, columns, select, dtypes = self._layout(table)
+        staging = f"{table}__loading"
+        loaded = 0
+        with self._lock, self._db_manager_cls(domain=domain_for(base)) as db:
+            signature = self._signature(db, table)
+            self._pending.pop(table, None)
+            self.con.execute(f"DROP TABLE IF EXISTS {staging}")
+            c = db.cursor()
+            c.execute(f"SELECT {', '.join(columns)} FROM {table}")
+            for chunk in iter(lambda: c.fetchmany(chunk_size), []):
+                statement = f"CREATE TABLE {staging} AS" if loaded == 0 else f"INSERT INTO {staging}"
+                self._write_rows(statement, chunk, columns, select, dtypes)
+                loaded += len(chunk)
+            if loaded == 0:
+                self._write_rows(f"CREATE TABLE {staging} AS", [], columns, select, dtypes)
+            # swap in the new copy so queries never see a half-loaded table
+            self.con.execute(f"DROP TABLE IF EXISTS {table}")
+            self.con.execute(f"ALTER TABLE {staging} RENAME TO {table}")
+            now = time.time()
+            self._synced[table] = {"at": now, "signature": signature, "rows": loaded, "checked": now}
+        return loaded
+
+    def apply_delta(self, table: str) -> Optional[int]:
+        """
+        Patch a loaded table (or view) with the changes logged since its
+        change-log position, plus the keys written through the services.
+        Returns the number of keys patched, or None if the log no longer
+        reaches back that far and the table was reloaded instead.
+        """
+        base, columns, select, dtypes = self._layout(table)
+        key_col = KEY_COLUMNS[base]
+        with self._lock:
+            state = self._synced[table]
+            pending = self._pending.pop(table, set())
+            with self._db_manager_cls(domain=domain_for(base)) as db:
+                delta = fetch_delta(db, base, state["signature"])
+                if not delta.reset:
+                    logged = {row[key_col] for row in delta.rows} | set(delta.deleted)
+                    keys = sorted(logged | pending, key=str)
+                    if table == base and pending <= logged:
+                        rows = delta.rows
+                    else:
+                        # views read the archive too; archived rows aren't in the log
+                        rows = []
+                        c = db.cursor()
+                        for i in range(0, len(keys), 500):
+                            part = keys[i : i + 500]
+                            c.execute(
+                                f"SELECT {', '.join(columns)} FROM {table} "
+                                f"WHERE {key_col} IN ({', '.join('?' for _ in part)})",
+                                part,
+                            )
+                            rows.extend(c.fetchall())
+            if delta.reset:
+                self.load_table(table)
+                return None
+
+            if keys:
+                self.con.register("delta_keys", pd.DataFrame({key_col: pd.Series(keys, dtype="string")}))
+                try:
+                    self.con.execute(f"DELETE FROM {table} WHERE {key_col} IN (SELECT {key_col} FROM delta_keys)")
+                finally:
+                    self.con.unregister("delta_keys")
+                if rows:
+                    self._write_rows(f"INSERT INTO {table}", rows, columns, select, dtypes)
+                state["rows"] = self.con.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            state["signature"] = delta.seq
+            state["checked"] = time.time()
+            return len(keys)
+
+    def ensure_fresh(self, table: str) -> None:
+        with self._lock:
+            state = self._synced.get(table)
+            if state is None or time.time() - state["at"] > self.max_age:
+                cache_lookup("duckdb_snapshot", False)
+                self.load_table(table)
+                return
+            if not self._pending.get(table) and time.time() - state["checked"] < CHECK_INTERVAL_S:
+                cache_lookup("duckdb_snapshot", True)
+                return
+            patched = self.apply_delta(table)
+            cache_lookup("duckdb_snapshot", patched == 0)
+
+    def status(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "table": table,
+                "rows": self._synced.get(table, {}).get("rows"),
+                "synced_at": self._synced.get(table, {}).get("at"),
+                "pending": len(self._pending.get(table, ())),
+            }
+            for table in TABLE_COLUMNS
+        ]
+
+    def query(self, sql: str, params: List[Any], table: str) -> pd.DataFrame:
+        self.ensure_fresh(table)
+        with self._lock:
+            return self.con.execute(sql, params).df()
+
+
+# --------- Public API ---------
+
+class AnalyticsService:
+    def __init__(self, db_manager_cls=DatabaseManager, engine: Optional[str] = None):
+        self._db_manager_cls = db_manager_cls
+        self.engine = engine or os.getenv("ANALYTICS_ENGINE", "sqlite")
+        self._snapshot: Optional[ColumnarSnapshot] = None
+        self._snapshot_lock = threading.Lock()
+
+    def _get_db(self, table: str):
+        return self._db_manager_cls(domain=domain_for(table))
+
+    def effective_engine(self) -> str:
+        """The requested engine, or "sqlite" when duckdb is not installed."""
+        if self.engine == "duckdb" and duckdb_available():
+            return "duckdb"
+        return "sqlite"
+
+    def set_engine(self, engine: str) -> None:
+        if engine not in ENGINES:
+            raise ValueError(f"Unknown analytics engine {engine!r}")
+        self.engine = engine
+
+    def snapshot(self) -> ColumnarSnapshot:
+        with self._snapshot_lock:
+            if self._snapshot is None:
+                self._snapshot = ColumnarSnapshot(self._db_manager_cls)
+            return self._snapshot
+
+    def snapshot_status(self) -> List[Dict[str, Any]]:
+        """Sync state of the columnar copy (empty until it is first used)."""
+        return self._snapshot.status() if self._snapshot is not None else []
+
+    def metric(
+        self,
+        name: str,
+        filters=None,
+        search: str | None = None,
+        engine: str | None = None,
+        include_archive: bool = False,
+    ) -> pd.DataFrame:
+        """
+        Run one of METRICS over the rows matching filters / search.
+        include_archive reads the <table>_all view (hot + archived rows,
+        see DB/archive.py) instead of the hot table.
+        """
+        m = METRICS[name]
+        engine = engine or self.effective_engine()
+        source = view_name(m.table) if include_archive and m.table in ARCHIVE_TABLES else m.table
+        where, params = build_where(m.table, filters, search, SEARCH_COLUMNS[m.table])
+        sql = m.sql[engine].format(source=source, where=where)
+
+        if engine == "duckdb":
+            df = self.snapshot().query(sql, params, source)
+        else:
+            with self._get_db(m.table) as db:
+                c = db.cursor()
+                c.execute(sql, params)
+                rows = c.fetchall()
+                cols = [d[0] for d in c.description]
+            df = pd.DataFrame([tuple(r) for r in rows], columns=cols)
+
+        if m.date_column and m.date_column in df.columns:
+            df[m.date_column] = pd.to_datetime(df[m.date_column], errors="coerce", format="ISO8601")
+            df = df.dropna(subset=[m.date_column])
+        return df
+
+
+_analytics: Optional[AnalyticsService] = None
+
+
+def get_analytics() -> AnalyticsService:
+    """Process-wide AnalyticsService, shared by the dashboards and Admin."""
+    global _analytics
+    if _analytics is None:
+        _analytics = AnalyticsService()
+    return _analytics
@@ -0,0 +1,60 @@
+# services/archive_service.py
+
+from typing import Any, Dict, List
+
+from DB.db import DatabaseManager, domain_for
+from DB.crud import ARCHIVE_TABLES
+from DB.archive import RETENTION_DAYS, archive_closed, partition_sizes, restore
+from services import events
+
+
+class ArchiveService:
+    """
+    Hot/cold partitioning of incidents and tickets (see DB/archive.py).
+    Records that leave the hot tables are published as "archive" events:
+    the dashboard filter engines drop them, the similarity index (which
+    covers the archive too) keeps them.
+    """
+
+    def __init__(self, db_manager_cls=DatabaseManager):
+        self._db_manager_cls = db_manager_cls
+
+    def _get_db(self, table: str):
+        # each table is archived within its own domain's database file
+        return self._db_manager_cls(domain=domain_for(table))
+
+    def partition_sizes(self) -> List[Dict[str, Any]]:
+        sizes = []
+        for table in ARCHIVE_TABLES:
+            with self._get_db(table) as db:
+                sizes.extend(partition_sizes(db, tables=[table]))
+        return sizes
+
+    def preview(self, retention_days: int = RETENTION_DAYS) -> Dict[str, int]:
+        """How many records archive() would move."""
+        counts = {}
+        for table in ARCHIVE_TABLES:
+            with self._get_db(table) as db:
+                counts.update(archive_closed(db, retention_days, dry_run=True, tables=[table]))
+        return counts
+
+    def archive(self, retention_days: int = RETENTION_DAYS) -> Dict[str, int]:
+        def on_batch(table, keys):
+            for key in keys:
+                events.publish(table, "archive", key)
+
+        moved = {}
+        for table in ARCHIVE_TABLES:
+            with self._get_db(table) as db:
+                moved.update(archive_closed(db, retention_days, on_batch=on_batch, tables=[table]))
+        return moved
+
+    def restore(self, table: str, key: str) -> bool:
+        """Bring one archived record back to the hot table."""
+        with self._get_db(table) as db:
+            row = restore(db, table, key)
+        if row is None:
+            return False
+        # back in the hot table: the filter engines pick it up again
+        events.publish(table, "insert", key, dict(row))
+        return True
@@ -1,32 +1,123 @@
 # services/datasets_service.py
 
+from concurrent.futures import Future
 from typing import List, Any
 
+import metrics
 from DB.db import DatabaseManager
+from DB.cdc import Delta, current_seq, fetch_delta
 from DB.crud import (
     get_all_datasets,
-    create_dataset,
-    update_dataset_owner,
-    delete_dataset,
+    count_rows,
+    key_exists,
+    get_rows_page,
+    iter_rows,
+    TABLE_COLUMNS,
 )
+from services.write_queue import get_write_queue, run_command
+from services.export import DEFAULT_CHUNK_SIZE, ExportResult, export_dir, export_filename, export_rows
 
 
+@metrics.instrument("datasets")
 class DatasetService:
     """
     Business logic for data assets (datasets_metadata table).
     """
 
-    def __init__(self, db_manager_cls=DatabaseManager):
+    # columns matched by the free-text search box
+    SEARCH_COLUMNS = ("dataset_name",)
+
+    # database file the table lives in (see DB.db.DOMAIN_TABLES)
+    DOMAIN = "datasets"
+
+    def __init__(self, db_manager_cls=DatabaseManager, write_queue=None, session: str | None = None):
         self._db_manager_cls = db_manager_cls
+        # write-behind queue (services/write_queue.py), None for direct writes
+        self._write_queue = write_queue if write_queue is not None else get_write_queue()
+        self._session = session
 
     def _get_db(self):
-        return self._db_manager_cls()
+        if self._write_queue is not None:
+            # read-your-writes: this session's queued commands land first
+            self._write_queue.wait_for_session(self._session)
+        return self._db_manager_cls(domain=self.DOMAIN)
+
+    def _write(self, command: str, kwargs, event) -> Future | None:
+        return run_command(
+            self._db_manager_cls, self.DOMAIN, command, kwargs, event, self._write_queue, self._session
+        )
 
     def list_datasets(self) -> List[Any]:
         with self._get_db() as db:
             rows = get_all_datasets(db)
         return rows
 
+    def change_seq(self) -> int:
+        """Current position in the change log (DB/cdc.py) for datasets_metadata."""
+        with self._get_db() as db:
+            return current_seq(db, "datasets_metadata")
+
+    def changes_since(self, seq: int) -> Delta:
+        """
+        Rows inserted or updated and keys deleted since change-log
+        position `seq`, by any writer (this app, the ingest, other
+        processes). Delta.reset means the log was compacted past `seq`.
+        """
+        with self._get_db() as db:
+            return fetch_delta(db, "datasets_metadata", seq)
+
+    def dataset_exists(self, dataset_name: str) -> bool:
+        with self._get_db() as db:
+            return key_exists(db, "datasets_metadata", dataset_name)
+
+    def count_datasets(self, filters=None, search: str | None = None) -> int:
+        with self._get_db() as db:
+            return count_rows(db, "datasets_metadata", filters, search, self.SEARCH_COLUMNS)
+
+    def page_datasets(
+        self,
+        filters=None,
+        search: str | None = None,
+        columns: List[str] | None = None,
+        order_by: str = "id",
+        descending: bool = False,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[Any]:
+        with self._get_db() as db:
+            return get_rows_page(
+                db,
+                "datasets_metadata",
+                filters,
+                search,
+                self.SEARCH_COLUMNS,
+                columns=columns,
+                order_by=order_by,
+                descending=descending,
+                limit=limit,
+                offset=offset,
+            )
+
+    def export_datasets(
+        self,
+        fmt: str = "csv",
+        filters=None,
+        search: str | None = None,
+        compress: bool = False,
+        path=None,
+        progress=None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> ExportResult:
+        """
+        Stream the datasets matching the dashboard filters to a CSV or
+        Parquet file, chunk_size rows at a time.
+        """
+        path = path or export_dir() / export_filename("datasets", fmt, compress)
+        with self._get_db() as db:
+            total = count_rows(db, "datasets_metadata", filters, search, self.SEARCH_COLUMNS)
+            chunks = iter_rows(db, "datasets_metadata", filters, search, self.SEARCH_COLUMNS, chunk_size=chunk_size)
+            return export_rows(chunks, TABLE_COLUMNS["datasets_metadata"], path, fmt, compress, total, progress)
+
     def register_dataset(
         self,
         dataset_name: str,
@@ -35,22 +126,27 @@ class DatasetService:
         size_mb: float,
         row_count: int,
         created_at: str,
-    ) -> None:
-        with self._get_db() as db:
-            create_dataset(
-                db,
-                dataset_name=dataset_name,
-                owner=owner,
-                source_system=source_system,
-                size_mb=size_mb,
-                row_count=row_count,
-                created_at=created_at,
-            )
+    ) -> Future | None:
+        values = {
+            "dataset_name": dataset_name,
+            "owner": owner,
+            "source_system": source_system,
+            "size_mb": size_mb,
+            "row_count": row_count,
+            "created_at": created_at,
+        }
+        return self._write("create_dataset", values, ("datasets_metadata", "insert", dataset_name, values))
 
-    def change_owner(self, dataset_name: str, new_owner: str) -> None:
-        with self._get_db() as db:
-            update_dataset_owner(db, dataset_name, new_owner)
+    def change_owner(self, dataset_name: str, new_owner: str) -> Future | None:
+        return self._write(
+            "update_dataset_owner",
+            {"dataset_name": dataset_name, "new_owner": new_owner},
+            ("datasets_metadata", "update", dataset_name, {"owner": new_owner}),
+        )
 
-    def remove_dataset(self, dataset_name: str) -> None:
-        with self._get_db() as db:
-            delete_dataset(db, dataset_name)
+    def remove_dataset(self, dataset_name: str) -> Future | None:
+        return self._write(
+            "delete_dataset",
+            {"dataset_name": dataset_name},
+            ("datasets_metadata", "delete", dataset_name, None),
+        )
@@ -0,0 +1,82 @@
+# services/events.py
+
+"""
+Tiny in-process publish/subscribe hook for service-layer writes.
+
+Services publish one event after each successful write. In-memory
+structures that mirror a table (the incident similarity index, the
+dashboard filter engines) subscribe and update themselves incrementally
+instead of being rebuilt from the database.
+
+Event fields:
+    table:  "cyber_incidents", "it_tickets" or "datasets_metadata"
+    op:     "insert", "update", "delete" or "archive"
+    key:    business key (incident_id / ticket_id / dataset_name)
+    values: column -> new value (full row for inserts, changed columns
+            for updates, None for deletes)
+
+"archive" means the record now lives in the archive table (DB/archive.py):
+it was moved there (values None), or a create_* for an archived key
+updated the archived row (values = the full row). Mirrors of the hot
+table drop the key; the similarity index, which covers the archive too,
+only takes the new values.
+"""
+
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Any, Callable, Dict, List, Optional
+
+Subscriber = Callable[[str, str, Any, Optional[Dict[str, Any]]], None]
+
+_SUBSCRIBERS: Dict[str, List[Subscriber]] = {}
+_LOCK = threading.Lock()
+
+
+def subscribe(table: str, fn: Subscriber, weak: bool = False) -> None:
+    """
+    weak=True (bound methods only) doesn't keep the object alive: once it
+    is garbage collected, e.g. a filter engine dropped from Streamlit's
+    resource cache, it is unsubscribed.
+    """
+    with _LOCK:
+        _SUBSCRIBERS.setdefault(table, []).append(weakref.WeakMethod(fn) if weak else fn)
+
+
+def unsubscribe(table: str, fn: Subscriber) -> None:
+    with _LOCK:
+        subscribers = _SUBSCRIBERS.get(table, [])
+        for entry in list(subscribers):
+            if entry == fn or (isinstance(entry, weakref.WeakMethod) and entry() == fn):
+                subscribers.remove(entry)
+
+
+def _live(table: str) -> List[Subscriber]:
+    # called with _LOCK held; drops weak subscribers that were collected
+    subscribers = _SUBSCRIBERS.get(table, [])
+    live = []
+    for entry in list(subscribers):
+        if isinstance(entry, weakref.WeakMethod):
+            fn = entry()
+            if fn is None:
+                subscribers.remove(entry)
+                continue
+            live.append(fn)
+        else:
+            live.append(entry)
+    return live
+
+
+def publish(table: str, op: str, key: Any, values: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Call every subscriber of `table`. A failing subscriber must not undo or
+    block a write that already committed, so errors are swallowed here.
+    """
+    with _LOCK:
+        subscribers = _live(table)
+    for fn in subscribers:
+        try:
+            fn(table, op, key, values)
+        except Exception as e:
+            print(f"events: subscriber {fn!r} failed for {table}/{op}: {e}")
@@ -0,0 +1,136 @@
+# services/export.py
+
+"""
+Streaming export of filtered result sets to CSV or Parquet.
+
+Rows arrive in chunks from DB.crud.iter_rows() and are written out chunk
+by chunk, so memory use depends on the chunk size, not on how many rows
+match the filters.
+
+- CSV:     csv.writer, optionally gzip-compressed
+- Parquet: one row group per chunk via pyarrow.parquet.ParquetWriter
+           (pyarrow is optional and only imported for Parquet exports)
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import os
+import tempfile
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Iterable, List, Optional, Sequence
+
+from DB.crud import NUMERIC_COLUMNS
+
+EXPORT_FORMATS = ("csv", "parquet")
+DEFAULT_CHUNK_SIZE = 5000
+
+# progress(rows_written, total_rows or None)
+ProgressFn = Callable[[int, Optional[int]], None]
+
+
+@dataclass
+class ExportResult:
+    path: Path
+    fmt: str
+    rows: int
+    chunks: int
+    bytes_written: int
+    seconds: float
+
+    @property
+    def rows_per_sec(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+
+def export_dir() -> Path:
+    """Where exports are written (EXPORT_DIR env var, else the temp dir)."""
+    path = Path(os.getenv("EXPORT_DIR") or Path(tempfile.gettempdir()) / "coursework_exports")
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def export_filename(stem: str, fmt: str, compress: bool = False) -> str:
+    suffix = ".csv.gz" if fmt == "csv" and compress else f".{fmt}"
+    return f"{stem}_{time.strftime('%Y%m%d_%H%M%S')}{suffix}"
+
+
+def _write_csv(chunks, columns, path, compress, on_chunk):
+    opener = gzip.open if compress else open
+    with opener(path, "wt", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for chunk in chunks:
+            writer.writerows(tuple(r) for r in chunk)
+            on_chunk(len(chunk))
+
+
+def _parquet_schema(pa, columns):
+    # fixed up front: types inferred from the first chunk would make a
+    # column that happens to be all-NULL there "null" for the whole file
+    types = {"INTEGER": pa.int64(), "REAL": pa.float64()}
+    return pa.schema([(col, types.get(NUMERIC_COLUMNS.get(col), pa.string())) for col in columns])
+
+
+def _write_parquet(chunks, columns, path, on_chunk):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow).")
+
+    schema = _parquet_schema(pa, columns)
+    with pq.ParquetWriter(str(path), schema, compression="snappy") as writer:
+        for chunk in chunks:
+            data = {col: [r[i] for r in chunk] for i, col in enumerate(columns)}
+            writer.write_table(pa.Table.from_pydict(data, schema=schema))
+            on_chunk(len(chunk))
+
+
+def export_rows(
+    chunks: Iterable[List[Any]],
+    columns: Sequence[str],
+    path: Path,
+    fmt: str = "csv",
+    compress: bool = False,
+    total: Optional[int] = None,
+    progress: Optional[ProgressFn] = None,
+) -> ExportResult:
+    """
+    Write row chunks (lists of sqlite3.Row / tuples in `columns` order)
+    to `path`. progress, if given, is called after every chunk.
+    """
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}")
+
+    path = Path(path)
+    started = time.perf_counter()
+    counts = {"rows": 0, "chunks": 0}
+
+    def on_chunk(n):
+        counts["rows"] += n
+        counts["chunks"] += 1
+        if progress is not None:
+            progress(counts["rows"], total)
+
+    try:
+        if fmt == "csv":
+            _write_csv(chunks, list(columns), path, compress, on_chunk)
+        else:
+            _write_parquet(chunks, list(columns), path, on_chunk)
+    except Exception:
+        # don't leave a half-written file behind
+        path.unlink(missing_ok=True)
+        raise
+
+    return ExportResult(
+        path=path,
+        fmt=fmt,
+        rows=counts["rows"],
+        chunks=counts["chunks"],
+        bytes_written=path.stat().st_size,
+        seconds=time.perf_counter() - started,
+    )
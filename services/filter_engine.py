@@ -0,0 +1,319 @@
+# services/filter_engine.py
+
+"""
+Bitmap-indexed filter engine for the dashboard multiselects.
+
+For every filterable column (severity, status, priority, assignee, owner,
+source system) the engine keeps one bitmap per distinct value: bit i is
+set when row i has that value. A multiselect combination is answered
+with bitwise OR inside a column and AND across columns, on bit-packed
+uint8 arrays (n / 8 bytes each). This is much cheaper than re-running
+`isin` on every column and combining boolean Series.
+
+The engine owns its copy of the frame and is kept current through
+services.events: inserts fill the next row of the frame and set its bits
+(the frame is preallocated to the bitmaps' capacity and grows with them,
+so an insert never copies it), updates move a
+row's bit from the old value's bitmap to the new one, and deletes clear
+the row's "alive" bit. Dead rows are compacted once they pile up.
+Writes made elsewhere (the ingest, other processes) arrive as change-log
+deltas (DB/cdc.py) through apply_delta(); `seq` is the last change-log
+position the engine has applied.
+"""
+
+from __future__ import annotations
+
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from services.frames import apply_schema
+
+_MIN_CAPACITY_BITS = 1024
+
+
+def _set_bit(bitmap: np.ndarray, pos: int) -> None:
+    bitmap[pos >> 3] |= np.uint8(0x80 >> (pos & 7))
+
+
+def _clear_bit(bitmap: np.ndarray, pos: int) -> None:
+    bitmap[pos >> 3] &= np.uint8(~(0x80 >> (pos & 7)) & 0xFF)
+
+
+def _padded(df: pd.DataFrame, n_rows: int) -> pd.DataFrame:
+    """df followed by blank rows up to n_rows, keeping every column's dtype."""
+    extra = n_rows - len(df)
+    if extra <= 0:
+        return df
+    blank = df.iloc[:0].reindex(range(extra))
+    for col in df.columns:
+        # numpy int / bool columns have no missing value; reindex would
+        # turn them into float
+        if df[col].dtype.kind in "iub":
+            blank[col] = np.zeros(extra, dtype=df[col].dtype)
+    return pd.concat([df, blank], ignore_index=True)
+
+
+class BitmapFilterEngine:
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        key_column: str,
+        columns: Sequence[str],
+        schema: Optional[Dict[str, Any]] = None,
+    ):
+        self.key_column = key_column
+        self.columns = tuple(columns)
+        self.schema = schema
+        self._lock = threading.RLock()
+        self.seq = 0
+        self._build(df)
+
+    # --------- Building ---------
+
+    def rebuild(self, df: pd.DataFrame) -> None:
+        """Replace all rows, e.g. to pick up writes made by other processes."""
+        with self._lock:
+            self._build(df)
+
+    @property
+    def frame(self) -> pd.DataFrame:
+        """The rows inserted so far (deleted ones included), without the spare capacity."""
+        return self._frame.iloc[: self._n]
+
+    def _build(self, df: pd.DataFrame) -> None:
+        df = df.reset_index(drop=True)
+        n = len(df)
+        self._n = n
+        self._capacity = max(_MIN_CAPACITY_BITS, 1 << max(0, (n - 1).bit_length()))
+        self._frame = _padded(df, self._capacity)
+        n_bytes = self._capacity // 8
+
+        self._alive = np.zeros(n_bytes, dtype=np.uint8)
+        self._alive[: n // 8] = 0xFF
+        for pos in range(n - n % 8, n):
+            _set_bit(self._alive, pos)
+        self._dead = 0
+
+        self._bitmaps: Dict[str, Dict[Any, np.ndarray]] = {}
+        for col in self.columns:
+            series = df[col]
+            if isinstance(series.dtype, pd.CategoricalDtype):
+                codes = series.cat.codes.to_numpy()
+                values = list(series.cat.categories)
+            else:
+                codes, uniques = pd.factorize(series, use_na_sentinel=True)
+                values = list(uniques)
+
+            col_maps: Dict[Any, np.ndarray] = {}
+            for code, value in enumerate(values):
+                bits = np.zeros(n_bytes, dtype=np.uint8)
+                packed = np.packbits(codes == code)
+                bits[: len(packed)] = packed
+                col_maps[value] = bits
+            self._bitmaps[col] = col_maps
+
+        self._positions: Dict[Any, List[int]] = {}
+        for pos, key in enumerate(df[self.key_column].tolist()):
+            self._positions.setdefault(key, []).append(pos)
+
+    def _grow(self) -> None:
+        extra = np.zeros(self._capacity // 8, dtype=np.uint8)
+        self._alive = np.concatenate([self._alive, extra])
+        for col_maps in self._bitmaps.values():
+            for value in col_maps:
+                col_maps[value] = np.concatenate([col_maps[value], extra])
+        self._capacity *= 2
+        self._frame = _padded(self._frame, self._capacity)
+
+    def _bitmap_for(self, col: str, value: Any) -> np.ndarray:
+        col_maps = self._bitmaps[col]
+        if value not in col_maps:
+            col_maps[value] = np.zeros(self._capacity // 8, dtype=np.uint8)
+        return col_maps[value]
+
+    # --------- Queries ---------
+
+    def __len__(self) -> int:
+        return self._n - self._dead
+
+    def mask(self, selections: Dict[str, Sequence[Any]]) -> np.ndarray:
+        """
+        Boolean mask over self.frame rows for the given selections
+        ({column: allowed values}). Empty selections mean "no filter",
+        matching the dashboards' multiselect behaviour.
+        """
+        with self._lock:
+            result = self._alive.copy()
+            for col, selected in selections.items():
+                if not selected or col not in self._bitmaps:
+                    continue
+                col_maps = self._bitmaps[col]
+                combined = np.zeros_like(result)
+                for value in selected:
+                    bits = col_maps.get(value)
+                    if bits is not None:
+                        np.bitwise_or(combined, bits, out=combined)
+                np.bitwise_and(result, combined, out=result)
+            return np.unpackbits(result, count=self._n).astype(bool)
+
+    def live_frame(self) -> pd.DataFrame:
+        """All rows that have not been deleted."""
+        with self._lock:
+            return self.frame[self.mask({})]
+
+    def filter(self, selections: Dict[str, Sequence[Any]]) -> pd.DataFrame:
+        with self._lock:
+            return self.frame[self.mask(selections)]
+
+    def distinct_values(self, col: str) -> List[Any]:
+        """Values of `col` present in at least one live row, sorted."""
+        with self._lock:
+            values = [
+                v for v, bits in self._bitmaps[col].items()
+                if pd.notna(v) and np.any(bits & self._alive)
+            ]
+        return sorted(values, key=str)
+
+    # --------- Incremental maintenance ---------
+
+    def apply_event(self, table: str, op: str, key: Any, values: Optional[Dict[str, Any]] = None) -> None:
+        """services.events subscriber."""
+        if op == "insert":
+            self.insert(values or {})
+        elif op == "update":
+            self.update(key, values or {})
+        elif op in ("delete", "archive"):
+            self.delete(key)
+
+    def _coerce_values(self, values: Dict[str, Any]) -> pd.DataFrame:
+        """
+        One-row frame of `values` with the same dtypes as self.frame,
+        adding any new category levels to self.frame first.
+        """
+        cols = [c for c in self._frame.columns if c in values]
+        row_df = pd.DataFrame([{c: values[c] for c in cols}], columns=cols)
+        if self.schema:
+            row_df = apply_schema(row_df, self.schema)
+        for col in cols:
+            dtype = self._frame[col].dtype
+            if isinstance(dtype, pd.CategoricalDtype):
+                value = row_df.at[0, col]
+                if pd.notna(value) and value not in dtype.categories:
+                    self._frame[col] = self._frame[col].cat.add_categories([value])
+                row_df[col] = row_df[col].astype(self._frame[col].dtype)
+        return row_df
+
+    def _set_value(self, pos: int, col: str, value: Any) -> None:
+        if pd.isna(value) and self._frame[col].dtype.kind in "iub":
+            return  # no missing value to store; the blank row already holds 0
+        self._frame.at[pos, col] = value
+
+    def insert(self, row: Dict[str, Any]) -> None:
+        with self._lock:
+            key = row.get(self.key_column)
+            if self._positions.get(key):
+                # create_* upserts on the business key: an existing key is an update
+                self.update(key, {c: v for c, v in row.items() if c != self.key_column})
+                return
+            if self._n >= self._capacity:
+                self._grow()
+            pos = self._n
+            row_df = self._coerce_values({c: row.get(c) for c in self._frame.columns})
+            for col in row_df.columns:
+                self._set_value(pos, col, row_df.at[0, col])
+            self._n += 1
+            _set_bit(self._alive, pos)
+            for col in self.columns:
+                value = row_df.at[0, col]
+                if pd.notna(value):
+                    _set_bit(self._bitmap_for(col, value), pos)
+            self._positions.setdefault(key, []).append(pos)
+
+    def append_frame(self, df: pd.DataFrame) -> None:
+        """
+        Append a frame of new rows (typed with the same schema) in one go,
+        e.g. rows tailed from the database after an ingest.
+        """
+        if df.empty:
+            return
+        with self._lock:
+            while self._n + len(df) > self._capacity:
+                self._grow()
+            start = self._n
+            df = df.reset_index(drop=True)
+            for j, col in enumerate(self._frame.columns):
+                if col not in df.columns:
+                    continue
+                dtype = self._frame[col].dtype
+                if isinstance(dtype, pd.CategoricalDtype):
+                    new = [v for v in pd.unique(df[col].dropna()) if v not in dtype.categories]
+                    if new:
+                        self._frame[col] = self._frame[col].cat.add_categories(new)
+                    df[col] = df[col].astype(object).astype(self._frame[col].dtype)
+                self._frame.iloc[start : start + len(df), j] = df[col].array
+
+            positions = np.arange(start, start + len(df))
+            n_bits = self._capacity
+
+            def bits_for(pos):
+                flags = np.zeros(n_bits, dtype=bool)
+                flags[pos] = True
+                return np.packbits(flags)
+
+            np.bitwise_or(self._alive, bits_for(positions), out=self._alive)
+            for col in self.columns:
+                values = df[col].to_numpy()
+                for value in pd.unique(df[col].dropna()):
+                    bitmap = self._bitmap_for(col, value)
+                    np.bitwise_or(bitmap, bits_for(positions[values == value]), out=bitmap)
+            for pos, key in zip(positions, df[self.key_column].tolist()):
+                self._positions.setdefault(key, []).append(int(pos))
+            self._n += len(df)
+
+    def apply_delta(self, df: pd.DataFrame, deleted: Sequence[Any] = (), seq: Optional[int] = None) -> None:
+        """
+        Apply a change-log delta: `df` holds the current rows of inserted
+        or updated keys (typed with the same schema), `deleted` the keys
+        that are gone. Known keys are updated in place, new ones appended.
+        """
+        with self._lock:
+            for key in deleted:
+                self.delete(key)
+            if not df.empty:
+                known = df[self.key_column].map(lambda k: bool(self._positions.get(k))).to_numpy(dtype=bool)
+                for row in df[known].to_dict("records"):
+                    self.update(row[self.key_column], {c: v for c, v in row.items() if c != self.key_column})
+                self.append_frame(df[~known])
+            if seq is not None:
+                self.seq = seq
+
+    def update(self, key: Any, changes: Dict[str, Any]) -> None:
+        with self._lock:
+            positions = self._positions.get(key, [])
+            if not positions:
+                return
+            coerced = self._coerce_values(changes)
+            for col in changes:
+                if col not in self._frame.columns:
+                    continue
+                new_value = coerced.at[0, col]
+                for pos in positions:
+                    if col in self._bitmaps:
+                        old_value = self._frame.at[pos, col]
+                        if pd.notna(old_value):
+                            _clear_bit(self._bitmap_for(col, old_value), pos)
+                        if pd.notna(new_value):
+                            _set_bit(self._bitmap_for(col, new_value), pos)
+                    self._set_value(pos, col, new_value)
+
+    def delete(self, key: Any) -> None:
+        with self._lock:
+            for pos in self._positions.pop(key, []):
+                _clear_bit(self._alive, pos)
+                self._dead += 1
+            # compact once a quarter of the rows are tombstones
+            if self._dead and self._dead * 4 > self._n:
+                self._build(self.live_frame())
@@ -0,0 +1,140 @@
+# services/frames.py
+
+"""
+Typed DataFrame schemas for the three dashboard domains.
+
+Rows from SQLite come back as plain Python objects, so a naive
+DataFrame has only object columns: every "High" or "Alice" is a separate
+Python string and every date stays a string that each chart re-parses.
+The schemas below are applied once, when rows are turned into a frame:
+
+- low-cardinality labels (severity, status, owner, ...) -> category
+- timestamps -> datetime64[ns]
+- numeric measures -> nullable Int64 / Float64
+
+memory_report() compares the footprint of the untyped and typed frames.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Dict, List, Sequence
+
+import pandas as pd
+
+SEVERITY_ORDER = ["Low", "Medium", "High", "Critical"]
+STATUS_ORDER = ["Open", "In Progress", "Resolved", "Closed"]
+
+# column -> dtype; "datetime" means pd.to_datetime(errors="coerce")
+INCIDENT_SCHEMA: Dict[str, Any] = {
+    "id": "int64",
+    "incident_id": object,
+    "incident_type": "category",
+    "severity": pd.CategoricalDtype(SEVERITY_ORDER, ordered=True),
+    "status": pd.CategoricalDtype(STATUS_ORDER),
+    "reported_at": "datetime",
+    "resolved_at": "datetime",
+    "assigned_to": "category",
+    "description": object,
+}
+
+TICKET_SCHEMA: Dict[str, Any] = {
+    "id": "int64",
+    "ticket_id": object,
+    "category": "category",
+    "priority": pd.CategoricalDtype(SEVERITY_ORDER, ordered=True),
+    "status": pd.CategoricalDtype(STATUS_ORDER),
+    "opened_at": "datetime",
+    "closed_at": "datetime",
+    "assigned_to": "category",
+}
+
+DATASET_SCHEMA: Dict[str, Any] = {
+    "id": "int64",
+    "dataset_name": object,
+    "owner": "category",
+    "source_system": "category",
+    "size_mb": "Float64",
+    "row_count": "Int64",
+    "created_at": "datetime",
+}
+
+
+def apply_schema(df: pd.DataFrame, schema: Dict[str, Any]) -> pd.DataFrame:
+    """
+    Convert the columns of df named in schema. Unknown columns are left
+    alone; values that don't parse become missing (NaT / <NA>).
+    """
+    out = {}
+    for col in df.columns:
+        dtype = schema.get(col)
+        series = df[col]
+        if dtype is None or dtype is object:
+            out[col] = series
+        elif dtype == "datetime":
+            # stored as strict ISO-8601 (DB.crud.normalize_timestamp)
+            out[col] = pd.to_datetime(series, errors="coerce", format="ISO8601")
+        elif dtype in ("int64", "Int64", "Float64"):
+            numeric = pd.to_numeric(series, errors="coerce")
+            if dtype == "int64" and numeric.isna().any():
+                dtype = "Int64"
+            out[col] = numeric.astype(dtype)
+        elif isinstance(dtype, pd.CategoricalDtype):
+            # values outside the known levels are kept as extra categories
+            extra = sorted(set(series.dropna().unique()) - set(dtype.categories))
+            if extra:
+                dtype = pd.CategoricalDtype(list(dtype.categories) + extra, ordered=dtype.ordered)
+            out[col] = series.astype(dtype)
+        else:
+            out[col] = series.astype(dtype)
+    return pd.DataFrame(out, index=df.index)
+
+
+def rows_to_frame(rows: List[Any], columns: Sequence[str], schema: Dict[str, Any] | None = None) -> pd.DataFrame:
+    """
+    Build a frame from sqlite3.Row objects (or plain tuples in `columns`
+    order) and apply the schema, if given.
+    """
+    if not rows:
+        df = pd.DataFrame(columns=list(columns))
+    elif hasattr(rows[0], "keys"):
+        cols = list(rows[0].keys())
+        df = pd.DataFrame([tuple(r) for r in rows], columns=cols)
+    else:
+        df = pd.DataFrame(rows, columns=list(columns))
+
+    return apply_schema(df, schema) if schema else df
+
+
+def value_counts(series: pd.Series) -> pd.Series:
+    """
+    value_counts() without the zero rows pandas reports for categories
+    that are absent after filtering.
+    """
+    counts = series.value_counts()
+    return counts[counts > 0]
+
+
+def memory_report(raw: pd.DataFrame, typed: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per-column deep memory usage (bytes) before and after typing.
+    """
+    before = raw.memory_usage(deep=True, index=False)
+    after = typed.memory_usage(deep=True, index=False)
+    report = pd.DataFrame(
+        {
+            "dtype_before": raw.dtypes.astype(str),
+            "dtype_after": typed.dtypes.astype(str),
+            "bytes_before": before,
+            "bytes_after": after,
+        }
+    )
+    report.loc["TOTAL"] = ["", "", int(before.sum()), int(after.sum())]
+    report["saved_pct"] = (1 - report["bytes_after"] / report["bytes_before"].where(report["bytes_before"] > 0)).mul(100).round(1)
+    return report
+
+
+def frame_bytes(obj: Any) -> int:
+    """Deep memory of a DataFrame (0 for anything else)."""
+    if isinstance(obj, pd.DataFrame):
+        return int(obj.memory_usage(deep=True).sum())
+    return 0
@@ -0,0 +1,404 @@
+# services/incident_index.py
+
+"""
+Local similarity index over cyber_incidents, archived ones included.
+
+Used by the offline assistant (ai_helper._offline_response) to answer with
+the most similar past incidents and how they were resolved, even when the
+OpenRouter API is unavailable.
+
+Each incident is turned into a sparse term-frequency vector built from its
+type, description and severity. Vectors are stored as an inverted index
+(term -> postings of doc ids and weights), so a query only touches the
+postings of its own terms. Postings live in `array.array` buffers which
+numpy can view without copying, keeping queries well under 100 ms at a
+million rows. Per document the index keeps only its incident_id and norm;
+the fields shown for the top-k hits are read from SQLite at query time.
+
+The shared index is built in one pass (build()) on a background thread
+started by warm_incident_index(), off the request path; until it is ready
+the assistant answers without similar incidents. New incidents are
+appended incrementally. Replaced and removed incidents are only flagged
+dead at first, and don't count towards IDF; once more than
+COMPACT_FRACTION of the documents are dead the postings are rewritten
+without them.
+"""
+
+from __future__ import annotations
+
+import math
+import re
+import threading
+from array import array
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has",
+    "have", "in", "is", "it", "of", "on", "or", "our", "the", "to", "was",
+    "were", "we", "what", "which", "why", "with", "how", "should", "do",
+    "does", "can", "this", "that", "these", "those", "my", "i",
+}
+
+# Relative weight of each field in the document vector
+FIELD_WEIGHTS = {"incident_type": 2.0, "description": 1.0}
+
+# compact once this share of the documents is dead (and there are enough
+# documents for it to matter)
+COMPACT_FRACTION = 0.25
+COMPACT_MIN_DOCS = 1000
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [t for t in TOKEN_RE.findall(str(text).lower()) if len(t) > 1 and t not in STOPWORDS]
+
+
+def _row_value(row: Any, key: str) -> Any:
+    try:
+        return row[key]
+    except (KeyError, IndexError, TypeError):
+        return None
+
+
+# fetch(incident_ids) -> {incident_id: record} for the hits of a query
+Fetch = Callable[[List[Any]], Dict[Any, Dict[str, Any]]]
+
+
+def _ids_only(incident_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+    return {incident_id: {"incident_id": incident_id} for incident_id in incident_ids}
+
+
+class IncidentSimilarityIndex:
+    """
+    Incremental sparse-vector index of incidents.
+
+    Scoring is cosine-style: sum over shared terms of
+    idf(term)^2 * tf_query * tf_doc, divided by the document norm. IDF is
+    computed from the live posting lengths at query time, so adding a
+    document never requires touching the others.
+
+    `fetch` looks up the records of the top-k hits; without it a hit is
+    just its incident_id and score.
+    """
+
+    def __init__(self, fetch: Optional[Fetch] = None):
+        self._fetch = fetch or _ids_only
+        self._lock = threading.Lock()
+        self._postings: Dict[str, tuple[array, array]] = {}
+        self._norms = array("f")
+        self._alive = bytearray()
+        self._keys: List[Any] = []  # incident_id per doc id
+        self._by_incident_id: Dict[str, int] = {}
+        self._dead = 0
+        # events that arrive while build() runs, applied once it's done
+        self._deferred: Optional[List[tuple]] = None
+
+    def __len__(self) -> int:
+        return len(self._by_incident_id)
+
+    # --------- Building ---------
+
+    def _vectorize(self, row: Any) -> Dict[str, float]:
+        vec: Dict[str, float] = {}
+        for field, weight in FIELD_WEIGHTS.items():
+            for term in tokenize(_row_value(row, field)):
+                vec[term] = vec.get(term, 0.0) + weight
+        severity = _row_value(row, "severity")
+        if severity:
+            vec[f"sev:{str(severity).lower()}"] = 1.0
+        return vec
+
+    def build(self, rows: Iterable[Any]) -> None:
+        """
+        Replace the contents with `rows` (sqlite3.Row or dicts) in one
+        pass. The new postings are filled without taking the lock and
+        swapped in at the end, so queries keep using the old contents
+        meanwhile.
+        """
+        with self._lock:
+            self._deferred = []
+        postings: Dict[str, tuple[array, array]] = {}
+        norms = array("f")
+        keys: List[Any] = []
+        for doc_id, row in enumerate(rows):
+            vec = self._vectorize(row)
+            keys.append(_row_value(row, "incident_id"))
+            norms.append(math.sqrt(sum(w * w for w in vec.values())) or 1.0)
+            for term, weight in vec.items():
+                entry = postings.get(term)
+                if entry is None:
+                    entry = postings[term] = (array("i"), array("f"))
+                entry[0].append(doc_id)
+                entry[1].append(weight)
+        n_docs = len(keys)
+
+        # a key listed twice keeps its last row
+        by_incident_id: Dict[str, int] = {}
+        alive = bytearray(b"\x01" * n_docs)
+        dead = 0
+        for doc_id, incident_id in enumerate(keys):
+            if incident_id is None:
+                continue
+            if incident_id in by_incident_id:
+                alive[by_incident_id[incident_id]] = 0
+                dead += 1
+            by_incident_id[incident_id] = doc_id
+
+        with self._lock:
+            self._postings = postings
+            self._norms = norms
+            self._alive = alive
+            self._keys = keys
+            self._by_incident_id = by_incident_id
+            self._dead = dead
+            self._maybe_compact()
+            deferred, self._deferred = self._deferred, None
+        # writes committed during the build may or may not be in `rows`;
+        # applying them again is harmless
+        for event in deferred:
+            self.apply_event(*event)
+
+    def add(self, row: Any) -> None:
+        """
+        Add (or replace) one incident. `row` can be a sqlite3.Row or dict.
+        """
+        incident_id = _row_value(row, "incident_id")
+        vec = self._vectorize(row)
+
+        with self._lock:
+            if incident_id in self._by_incident_id:
+                self._alive[self._by_incident_id[incident_id]] = 0
+                self._dead += 1
+
+            doc_id = len(self._keys)
+            self._keys.append(incident_id)
+            self._alive.append(1)
+            self._norms.append(math.sqrt(sum(w * w for w in vec.values())) or 1.0)
+            if incident_id is not None:
+                self._by_incident_id[incident_id] = doc_id
+
+            for term, weight in vec.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    postings = (array("i"), array("f"))
+                    self._postings[term] = postings
+                postings[0].append(doc_id)
+                postings[1].append(weight)
+            self._maybe_compact()
+
+    def add_many(self, rows: Iterable[Any]) -> None:
+        for row in rows:
+            self.add(row)
+
+    def remove(self, incident_id: str) -> None:
+        with self._lock:
+            doc_id = self._by_incident_id.pop(incident_id, None)
+            if doc_id is not None:
+                self._alive[doc_id] = 0
+                self._dead += 1
+                self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        """
+        Drop dead documents from the postings and renumber the rest.
+        Called with the lock held.
+        """
+        n_docs = len(self._keys)
+        if n_docs < COMPACT_MIN_DOCS or self._dead <= COMPACT_FRACTION * n_docs:
+            return
+
+        import numpy as np
+
+        alive = np.frombuffer(self._alive, dtype=np.uint8).astype(bool)
+        new_ids = (np.cumsum(alive) - 1).astype(np.int32)
+        postings: Dict[str, tuple[array, array]] = {}
+        for term, (doc_ids, weights) in self._postings.items():
+            old = np.frombuffer(doc_ids, dtype=np.int32)
+            keep = alive[old]
+            if keep.any():
+                ids, kept = array("i"), array("f")
+                ids.frombytes(new_ids[old[keep]].tobytes())
+                kept.frombytes(np.frombuffer(weights, dtype=np.float32)[keep].tobytes())
+                postings[term] = (ids, kept)
+            del old
+
+        self._postings = postings
+        self._keys = [key for key, live in zip(self._keys, self._alive) if live]
+        self._norms = array("f", (v for v, live in zip(self._norms, self._alive) if live))
+        self._alive = bytearray(b"\x01" * len(self._keys))
+        self._by_incident_id = {key: doc_id for doc_id, key in enumerate(self._keys) if key is not None}
+        self._dead = 0
+
+    def apply_event(self, table: str, op: str, key: Any, values: Optional[Dict[str, Any]] = None) -> None:
+        """
+        services.events subscriber for cyber_incidents writes. Status
+        updates need nothing: the fields of a hit are read at query time.
+        """
+        with self._lock:
+            if self._deferred is not None:
+                self._deferred.append((table, op, key, values))
+                return
+        if op == "insert":
+            self.add(values or {})
+        elif op == "delete":
+            self.remove(key)
+        elif op == "archive" and values:
+            # archived incidents stay searchable; only new contents matter
+            self.add(values)
+
+    # --------- Queries ---------
+
+    def query(self, text: str, k: int = 5, min_score: float = 0.0) -> List[Dict[str, Any]]:
+        """
+        Return up to k incident records most similar to `text`, each with
+        an added "score" key (higher is more similar; only comparable
+        within one query).
+        """
+        q_vec: Dict[str, float] = {}
+        for term in tokenize(text):
+            q_vec[term] = q_vec.get(term, 0.0) + 1.0
+            # allow questions like "high severity" to match the severity term
+            q_vec.setdefault(f"sev:{term}", 0.0)
+            q_vec[f"sev:{term}"] += 1.0
+        if not q_vec:
+            return []
+
+        # numpy is only needed for queries; keep importing the service cheap
+        import numpy as np
+
+        with self._lock:
+            n_docs = len(self._keys)
+            n_live = n_docs - self._dead
+            if n_live <= 0:
+                return []
+
+            alive = np.frombuffer(self._alive, dtype=np.uint8)
+            scores = np.zeros(n_docs, dtype=np.float32)
+            q_norm = 0.0
+            matched = False
+            for term, q_weight in q_vec.items():
+                postings = self._postings.get(term)
+                if postings is None:
+                    continue
+                doc_ids = np.frombuffer(postings[0], dtype=np.int32)
+                # document frequency among live documents only
+                n_term = int(alive[doc_ids].sum())
+                if n_term:
+                    matched = True
+                    idf = math.log((n_live + 1) / (n_term + 1)) + 1.0
+                    q_component = q_weight * idf
+                    q_norm += q_component * q_component
+                    weights = np.frombuffer(postings[1], dtype=np.float32)
+                    # doc ids are unique within one posting list, so fancy
+                    # indexed += is safe here
+                    scores[doc_ids] += weights * (q_component * idf)
+                    del weights
+                # the views pin the arrays' buffers; an add() after the lock
+                # is released would fail to append while one is alive
+                del doc_ids
+
+            if matched:
+                scores /= np.frombuffer(self._norms, dtype=np.float32)
+                scores *= alive
+                scores /= math.sqrt(q_norm)
+
+                k = min(k, n_docs)
+                top = np.argpartition(-scores, k - 1)[:k]
+                top = top[np.argsort(-scores[top])]
+                hits = []
+                for doc_id in top:
+                    score = float(scores[doc_id])
+                    if score <= min_score:
+                        break
+                    hits.append((self._keys[doc_id], round(score, 3)))
+            del alive
+        if not matched:
+            return []
+
+        records = self._fetch([key for key, _ in hits])
+        results = []
+        for key, score in hits:
+            record = records.get(key)
+            if record is not None:  # deleted by another process since
+                results.append({**record, "score": score})
+        return results
+
+
+# -------------------------------------------------------------------
+# Process-wide index, built in the background from the database
+# -------------------------------------------------------------------
+_INDEX: Optional[IncidentSimilarityIndex] = None
+_INDEX_LOCK = threading.Lock()
+_BUILT = threading.Event()
+
+
+def _fetch_incidents(incident_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+    from DB.db import DatabaseManager
+    from DB.crud import get_incidents_by_ids
+
+    with DatabaseManager(domain="incidents") as db:
+        return {row["incident_id"]: dict(row) for row in get_incidents_by_ids(db, incident_ids)}
+
+
+def _build_shared(index: IncidentSimilarityIndex) -> None:
+    from itertools import chain
+
+    from DB.db import DatabaseManager
+    from DB.crud import iter_incident_texts
+
+    try:
+        with DatabaseManager(domain="incidents") as db:
+            index.build(chain.from_iterable(iter_incident_texts(db)))
+    except Exception as e:
+        print(f"incident index: build failed: {e}")
+    finally:
+        _BUILT.set()
+
+
+def warm_incident_index() -> IncidentSimilarityIndex:
+    """
+    Create the shared index and start building it on a background thread
+    from the hot and archived incidents (cyber_incidents_all). Events are
+    subscribed first, so writes made during the build are not lost.
+    """
+    global _INDEX
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            from services import events
+
+            index = IncidentSimilarityIndex(fetch=_fetch_incidents)
+            events.subscribe("cyber_incidents", index.apply_event)
+            threading.Thread(target=_build_shared, args=(index,), name="incident-index", daemon=True).start()
+            _INDEX = index
+        return _INDEX
+
+
+def get_incident_index(timeout: Optional[float] = None) -> Optional[IncidentSimilarityIndex]:
+    """
+    The shared index once it is built. Waits up to `timeout` seconds
+    (forever if None) and returns None if it is still building.
+    """
+    index = warm_incident_index()
+    return index if _BUILT.wait(timeout) else None
+
+
+def format_similar_incidents(matches: List[Dict[str, Any]]) -> str:
+    lines = []
+    for m in matches:
+        status = m.get("status") or "Unknown status"
+        if m.get("resolved_at"):
+            outcome = f"{status} on {m['resolved_at']}"
+        else:
+            outcome = status
+        who = f" by {m['assigned_to']}" if m.get("assigned_to") else ""
+        desc = (m.get("description") or "").strip()
+        if len(desc) > 120:
+            desc = desc[:117] + "..."
+        lines.append(
+            f"- {m.get('incident_id')} ({m.get('incident_type')}, {m.get('severity')}) - "
+            f"{outcome}{who}; score {m['score']:.2f}. {desc}"
+        )
+    return "\n".join(lines)
@@ -1,27 +1,53 @@
 # services/incidents_service.py
 
+from concurrent.futures import Future
 from typing import List, Any
 
+import metrics
 from DB.db import DatabaseManager
+from DB.cdc import Delta, current_seq, fetch_delta
 from DB.crud import (
     get_all_incidents,
-    create_incident,
-    update_incident_status,
-    delete_incident,
+    count_rows,
+    key_exists,
+    get_rows_page,
+    iter_rows,
+    TABLE_COLUMNS,
 )
+from services.write_queue import get_write_queue, run_command
+from services.export import DEFAULT_CHUNK_SIZE, ExportResult, export_dir, export_filename, export_rows
+from services.incident_index import get_incident_index
 
 
+@metrics.instrument("incidents")
 class IncidentService:
     """
     Business logic for cybersecurity incidents.
     Streamlit pages use this instead of calling CRUD functions directly.
     """
 
-    def __init__(self, db_manager_cls=DatabaseManager):
+    # columns matched by the free-text search box
+    SEARCH_COLUMNS = ("incident_id", "description")
+
+    # database file the table lives in (see DB.db.DOMAIN_TABLES)
+    DOMAIN = "incidents"
+
+    def __init__(self, db_manager_cls=DatabaseManager, write_queue=None, session: str | None = None):
         self._db_manager_cls = db_manager_cls
+        # write-behind queue (services/write_queue.py), None for direct writes
+        self._write_queue = write_queue if write_queue is not None else get_write_queue()
+        self._session = session
 
     def _get_db(self):
-        return self._db_manager_cls()
+        if self._write_queue is not None:
+            # read-your-writes: this session's queued commands land first
+            self._write_queue.wait_for_session(self._session)
+        return self._db_manager_cls(domain=self.DOMAIN)
+
+    def _write(self, command: str, kwargs, event) -> Future | None:
+        return run_command(
+            self._db_manager_cls, self.DOMAIN, command, kwargs, event, self._write_queue, self._session
+        )
 
     # --------- Queries ---------
 
@@ -30,6 +56,76 @@ class IncidentService:
             rows = get_all_incidents(db)
         return rows
 
+    def change_seq(self) -> int:
+        """Current position in the change log (DB/cdc.py) for cyber_incidents."""
+        with self._get_db() as db:
+            return current_seq(db, "cyber_incidents")
+
+    def changes_since(self, seq: int) -> Delta:
+        """
+        Rows inserted or updated and keys deleted since change-log
+        position `seq`, by any writer (this app, the ingest, other
+        processes). Delta.reset means the log was compacted past `seq`.
+        """
+        with self._get_db() as db:
+            return fetch_delta(db, "cyber_incidents", seq)
+
+    def incident_exists(self, incident_id: str) -> bool:
+        with self._get_db() as db:
+            return key_exists(db, "cyber_incidents", incident_id)
+
+    def count_incidents(self, filters=None, search: str | None = None) -> int:
+        with self._get_db() as db:
+            return count_rows(db, "cyber_incidents", filters, search, self.SEARCH_COLUMNS)
+
+    def page_incidents(
+        self,
+        filters=None,
+        search: str | None = None,
+        columns: List[str] | None = None,
+        order_by: str = "id",
+        descending: bool = False,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[Any]:
+        """
+        One window of rows, filtered and sorted in SQLite, so the grid
+        never has to load the whole table.
+        """
+        with self._get_db() as db:
+            return get_rows_page(
+                db,
+                "cyber_incidents",
+                filters,
+                search,
+                self.SEARCH_COLUMNS,
+                columns=columns,
+                order_by=order_by,
+                descending=descending,
+                limit=limit,
+                offset=offset,
+            )
+
+    def export_incidents(
+        self,
+        fmt: str = "csv",
+        filters=None,
+        search: str | None = None,
+        compress: bool = False,
+        path=None,
+        progress=None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> ExportResult:
+        """
+        Stream the incidents matching the dashboard filters to a CSV or
+        Parquet file, chunk_size rows at a time.
+        """
+        path = path or export_dir() / export_filename("incidents", fmt, compress)
+        with self._get_db() as db:
+            total = count_rows(db, "cyber_incidents", filters, search, self.SEARCH_COLUMNS)
+            chunks = iter_rows(db, "cyber_incidents", filters, search, self.SEARCH_COLUMNS, chunk_size=chunk_size)
+            return export_rows(chunks, TABLE_COLUMNS["cyber_incidents"], path, fmt, compress, total, progress)
+
     # --------- Commands ---------
 
     def create_incident(
@@ -42,24 +138,59 @@ class IncidentService:
         resolved_at: str | None,
         assigned_to: str,
         description: str,
-    ) -> None:
-        with self._get_db() as db:
-            create_incident(
-                db,
-                incident_id=incident_id,
-                incident_type=incident_type,
-                severity=severity,
-                status=status,
-                reported_at=reported_at,
-                resolved_at=resolved_at,
-                assigned_to=assigned_to,
-                description=description,
-            )
+    ) -> Future | None:
+        values = {
+            "incident_id": incident_id,
+            "incident_type": incident_type,
+            "severity": severity,
+            "status": status,
+            "reported_at": reported_at,
+            "resolved_at": resolved_at,
+            "assigned_to": assigned_to,
+            "description": description,
+        }
+        # In-memory mirrors (similarity index, filter engine) update from the event
+        return self._write("create_incident", values, ("cyber_incidents", "insert", incident_id, values))
 
-    def change_status(self, incident_id: str, new_status: str) -> None:
-        with self._get_db() as db:
-            update_incident_status(db, incident_id, new_status)
+    def change_status(self, incident_id: str, new_status: str) -> Future | None:
+        return self._write(
+            "update_incident_status",
+            {"incident_id": incident_id, "new_status": new_status},
+            ("cyber_incidents", "update", incident_id, {"status": new_status}),
+        )
+
+    def remove_incident(self, incident_id: str) -> Future | None:
+        return self._write(
+            "delete_incident",
+            {"incident_id": incident_id},
+            ("cyber_incidents", "delete", incident_id, None),
+        )
+
+    def triage_open_incidents(
+        self,
+        token_budget: int = 3000,
+        max_workers: int = 4,
+        requests_per_minute: int = 20,
+    ) -> List[dict]:
+        """
+        Batch AI triage of every Open / In Progress incident.
+        See ai_helper.triage_incidents for batching, rate limiting and caching.
+        """
+        # imported here so the service layer does not need the HTTP stack
+        from ai_helper import triage_incidents
 
-    def remove_incident(self, incident_id: str) -> None:
         with self._get_db() as db:
-            delete_incident(db, incident_id)
+            chunks = iter_rows(db, "cyber_incidents", {"status": ["Open", "In Progress"]})
+            open_incidents = [dict(row) for chunk in chunks for row in chunk]
+        return triage_incidents(
+            open_incidents,
+            token_budget=token_budget,
+            max_workers=max_workers,
+            requests_per_minute=requests_per_minute,
+        )
+
+    def similar_incidents(self, text: str, k: int = 5) -> List[Any]:
+        """
+        Top-k past incidents most similar to `text` (see incident_index).
+        """
+        return get_incident_index().query(text, k=k)
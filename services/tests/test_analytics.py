@@ -0,0 +1,54 @@
+# services/tests/test_analytics.py
+
+import pandas as pd
+import pytest
+
+from DB.crud import create_dataset, create_incident, create_ticket
+from services.analytics import METRICS, AnalyticsService
+
+
+@pytest.fixture
+def analytics(db_manager_cls):
+    with db_manager_cls() as db:
+        create_incident(db, "INC-1", "Malware", "High", "Open", "2024-01-01", None, "amy", "worm outbreak")
+        create_incident(db, "INC-2", "Phishing", "Low", "Resolved", "2024-01-01", "2024-01-03", "bob", "fake invoice")
+        create_incident(db, "INC-3", "DDoS", "High", "Resolved", "2024-01-02", "2024-01-02", "amy", "traffic spike")
+        # 1 day 12 hours, 2 days, and a closing stamp 12 hours before opening
+        create_ticket(db, "T-1", "Hardware", "High", "Closed", "2024-01-01 00:00:00", "2024-01-02 12:00:00", "amy")
+        create_ticket(db, "T-2", "Network", "Low", "Closed", "2024-01-01 08:00:00", "2024-01-03 08:00:00", "amy")
+        create_ticket(db, "T-3", "Access", "Low", "Closed", "2024-01-05 12:00:00", "2024-01-05 00:00:00", "bob")
+        create_ticket(db, "T-4", "Access", "Medium", "Open", "2024-01-06 09:00:00", None, "bob")
+        create_dataset(db, "sales", "amy", "crm", 10.5, 100, "2024-01-01")
+        create_dataset(db, "hr", "bob", "erp", 4.0, 50, "2024-01-02")
+    return AnalyticsService(db_manager_cls, engine="sqlite")
+
+
+def test_resolution_days_match_timedelta_days(analytics):
+    df = analytics.metric("tickets_resolution_by_assignee", engine="sqlite")
+
+    expected = pd.DataFrame({
+        "assigned_to": ["amy", "amy", "bob"],
+        "days": (pd.to_datetime(["2024-01-02 12:00", "2024-01-03 08:00", "2024-01-05 00:00"])
+                 - pd.to_datetime(["2024-01-01 00:00", "2024-01-01 08:00", "2024-01-05 12:00"])).days,
+    }).groupby("assigned_to")["days"].mean().round(1)
+    assert dict(zip(df["assigned_to"], df["resolution_days"])) == expected.to_dict() == {"amy": 1.5, "bob": -1.0}
+
+
+def test_metrics_follow_the_filters(analytics):
+    df = analytics.metric("incidents_by_severity", filters={"status": ["Resolved"]}, engine="sqlite")
+    assert list(zip(df["severity"], df["count"])) == [("High", 1), ("Low", 1)]
+
+    df = analytics.metric("incidents_over_time", search="worm", engine="sqlite")
+    assert list(df["incident_count"]) == [1]
+    assert df["reported_at"].dtype.kind == "M"
+
+
+def test_duckdb_matches_sqlite(analytics):
+    pytest.importorskip("duckdb")
+    for name in METRICS:
+        sqlite_df = analytics.metric(name, engine="sqlite")
+        duckdb_df = analytics.metric(name, engine="duckdb")
+        pd.testing.assert_frame_equal(
+            sqlite_df.reset_index(drop=True), duckdb_df.reset_index(drop=True),
+            check_dtype=False, check_index_type=False, obj=name,
+        )
@@ -0,0 +1,32 @@
+# services/tests/test_export.py
+
+import csv
+
+import pytest
+
+from services.export import export_rows
+
+COLUMNS = ["id", "dataset_name", "size_mb", "row_count", "created_at"]
+
+
+def test_csv_export_writes_every_chunk(tmp_path):
+    chunks = [[(1, "a", 1.5, 10, "2024-01-01")], [(2, "b", None, None, None)]]
+    result = export_rows(chunks, COLUMNS, tmp_path / "out.csv")
+
+    assert (result.rows, result.chunks) == (2, 2)
+    with open(result.path, newline="", encoding="utf-8") as f:
+        assert list(csv.reader(f)) == [COLUMNS, ["1", "a", "1.5", "10", "2024-01-01"], ["2", "b", "", "", ""]]
+
+
+def test_parquet_schema_does_not_depend_on_the_first_chunk(tmp_path):
+    pa = pytest.importorskip("pyarrow")
+    pq = pytest.importorskip("pyarrow.parquet")
+    # size_mb / row_count / created_at are all NULL in the first chunk
+    chunks = [[(1, "a", None, None, None)], [(2, "b", 2.5, 20, "2024-01-01")]]
+    result = export_rows(chunks, COLUMNS, tmp_path / "out.parquet", fmt="parquet")
+
+    table = pq.read_table(result.path)
+    assert table.schema.field("size_mb").type == pa.float64()
+    assert table.schema.field("row_count").type == pa.int64()
+    assert table.schema.field("created_at").type == pa.string()
+    assert table.column("row_count").to_pylist() == [None, 20]
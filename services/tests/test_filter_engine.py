@@ -0,0 +1,103 @@
+# services/tests/test_filter_engine.py
+
+import numpy as np
+import pandas as pd
+
+from services.filter_engine import BitmapFilterEngine
+
+
+def _frame(n):
+    return pd.DataFrame({
+        "id": np.arange(1, n + 1, dtype="int64"),
+        "incident_id": [f"INC-{i}" for i in range(n)],
+        "severity": pd.Categorical(["Low", "High", "Medium"][i % 3] for i in range(n)),
+        "status": pd.Categorical(["Open", "Resolved"][i % 2] for i in range(n)),
+    })
+
+
+def _engine(n=6):
+    return BitmapFilterEngine(_frame(n), "incident_id", ("severity", "status"))
+
+
+def _ids(df):
+    return sorted(df["incident_id"])
+
+
+def test_mask_matches_isin():
+    df = _frame(50)
+    engine = BitmapFilterEngine(df, "incident_id", ("severity", "status"))
+    selections = {"severity": ["High", "Low"], "status": ["Open"], "assigned_to": ["ignored"]}
+
+    expected = df[df["severity"].isin(["High", "Low"]) & df["status"].isin(["Open"])]
+    assert _ids(engine.filter(selections)) == _ids(expected)
+    assert len(engine.filter({"severity": []})) == 50
+
+
+def test_insert_sets_bits_and_adds_categories():
+    engine = _engine()
+    engine.insert({"id": 7, "incident_id": "INC-new", "severity": "Critical", "status": "Open"})
+
+    assert _ids(engine.filter({"severity": ["Critical"]})) == ["INC-new"]
+    assert "Critical" in engine.distinct_values("severity")
+    assert engine.frame["id"].dtype == np.int64
+    assert len(engine) == 7
+
+
+def test_insert_past_capacity_grows():
+    engine = _engine(1024)
+    engine.insert({"id": 1025, "incident_id": "INC-last", "severity": "High", "status": "Open"})
+
+    assert len(engine) == 1025
+    assert "INC-last" in _ids(engine.filter({"severity": ["High"], "status": ["Open"]}))
+
+
+def test_insert_of_known_key_is_an_update():
+    engine = _engine()
+    engine.insert({"incident_id": "INC-0", "severity": "High", "status": "Open"})
+
+    assert len(engine) == 6
+    assert "INC-0" in _ids(engine.filter({"severity": ["High"]}))
+    assert "INC-0" not in _ids(engine.filter({"severity": ["Low"]}))
+
+
+def test_update_moves_the_bit():
+    engine = _engine()
+    engine.apply_event("cyber_incidents", "update", "INC-0", {"status": "Resolved"})
+
+    assert "INC-0" not in _ids(engine.filter({"status": ["Open"]}))
+    assert "INC-0" in _ids(engine.filter({"status": ["Resolved"]}))
+    assert len(engine.filter({"status": ["Open"]})) == 2
+
+
+def test_delete_then_compaction():
+    engine = _engine(8)
+    engine.delete("INC-0")
+    assert len(engine) == 7
+    assert len(engine.frame) == 8  # tombstoned, not yet compacted
+    assert "INC-0" not in _ids(engine.live_frame())
+
+    engine.delete("INC-1")
+    engine.delete("INC-2")  # 3 of 8 dead: more than a quarter
+    assert len(engine.frame) == 5
+    assert _ids(engine.live_frame()) == ["INC-3", "INC-4", "INC-5", "INC-6", "INC-7"]
+    assert _ids(engine.filter({"severity": ["Low"]})) == ["INC-3", "INC-6"]
+
+    engine.insert({"id": 9, "incident_id": "INC-8", "severity": "Low", "status": "Open"})
+    assert _ids(engine.filter({"severity": ["Low"]})) == ["INC-3", "INC-6", "INC-8"]
+
+
+def test_apply_delta_updates_known_keys_and_appends_new_ones():
+    engine = _engine()
+    delta = pd.DataFrame({
+        "id": np.array([2, 10], dtype="int64"),
+        "incident_id": ["INC-1", "INC-9"],
+        "severity": pd.Categorical(["Low", "Critical"]),
+        "status": pd.Categorical(["Open", "Open"]),
+    })
+    engine.apply_delta(delta, deleted=["INC-5"], seq=42)
+
+    assert engine.seq == 42
+    assert len(engine) == 6
+    assert _ids(engine.filter({"severity": ["Critical"]})) == ["INC-9"]
+    assert "INC-1" in _ids(engine.filter({"severity": ["Low"], "status": ["Open"]}))
+    assert "INC-5" not in _ids(engine.live_frame())
@@ -0,0 +1,118 @@
+# services/tests/test_incident_index.py
+
+from services import incident_index
+from services.incident_index import IncidentSimilarityIndex
+
+
+def incident(incident_id, description, incident_type="Phishing", severity="High"):
+    return {"incident_id": incident_id, "incident_type": incident_type, "severity": severity,
+            "status": "Open", "description": description}
+
+
+def found(index, text, k=10):
+    return [r["incident_id"] for r in index.query(text, k=k)]
+
+
+def test_an_archive_move_keeps_the_incident_searchable():
+    index = IncidentSimilarityIndex()
+    index.add(incident("INC-1", "ransomware on the file server"))
+
+    index.apply_event("cyber_incidents", "archive", "INC-1", None)
+
+    assert found(index, "ransomware") == ["INC-1"]
+    assert index._dead == 0
+
+
+def test_a_write_to_an_archived_incident_replaces_its_document():
+    index = IncidentSimilarityIndex()
+    index.add(incident("INC-1", "ransomware on the file server"))
+
+    index.apply_event("cyber_incidents", "archive", "INC-1", incident("INC-1", "credential stuffing"))
+
+    assert found(index, "ransomware") == []
+    assert found(index, "credential") == ["INC-1"]
+    assert len(index) == 1
+
+
+# --------- Bulk build, tombstones, IDF ---------
+
+def test_build_matches_adding_one_by_one():
+    rows = [incident(f"INC-{i}", f"{word} on host {i}") for i, word in enumerate(["malware", "phishing"] * 5)]
+    built, added = IncidentSimilarityIndex(), IncidentSimilarityIndex()
+    built.build(rows)
+    added.add_many(rows)
+
+    assert built.query("malware host", k=10) == added.query("malware host", k=10)
+    assert len(built) == 10
+
+
+def test_deleted_incidents_are_tombstoned_until_compaction(monkeypatch):
+    monkeypatch.setattr(incident_index, "COMPACT_MIN_DOCS", 8)
+    index = IncidentSimilarityIndex()
+    index.build(incident(f"INC-{i}", f"malware sample {i}", incident_type="Malware") for i in range(8))
+
+    index.remove("INC-0")
+    index.remove("INC-1")
+    # 2 of 8 dead is not over COMPACT_FRACTION yet: flagged only
+    assert (index._dead, len(index._keys)) == (2, 8)
+    assert "INC-0" not in found(index, "malware")
+
+    index.remove("INC-2")
+    assert (index._dead, len(index._keys)) == (0, 5)
+    assert sorted(found(index, "malware")) == [f"INC-{i}" for i in range(3, 8)]
+
+    # doc ids were renumbered: later writes still land on the right document
+    index.add(incident("INC-7", "phishing email"))
+    assert found(index, "phishing") == ["INC-7"]
+    assert "INC-7" not in found(index, "malware")
+
+
+def test_idf_ignores_dead_documents():
+    index = IncidentSimilarityIndex()
+    index.add(incident("INC-1", "ransomware"))
+    index.add(incident("INC-2", "worm"))
+    before = index.query("ransomware worm", k=2)
+
+    # replaced and removed documents must not change how rare a term looks
+    for i in range(5):
+        index.add(incident(f"TMP-{i}", "ransomware"))
+        index.remove(f"TMP-{i}")
+    assert index.query("ransomware worm", k=2) == before
+
+
+def test_hits_are_fetched_from_the_database(db_manager_cls):
+    from DB.crud import create_incident, get_incidents_by_ids, iter_incident_texts
+
+    with db_manager_cls() as db:
+        create_incident(db, "INC-1", "Malware", "High", "Resolved", "2024-01-01", "2024-01-03", "amy", "worm outbreak")
+        create_incident(db, "INC-2", "Phishing", "Low", "Open", "2024-01-02", None, "bob", "fake invoice")
+        db.commit()
+
+    def fetch(ids):
+        with db_manager_cls() as db:
+            return {row["incident_id"]: dict(row) for row in get_incidents_by_ids(db, ids)}
+
+    index = IncidentSimilarityIndex(fetch=fetch)
+    with db_manager_cls() as db:
+        index.build(row for chunk in iter_incident_texts(db) for row in chunk)
+
+    [hit] = index.query("worm", k=5)
+    assert (hit["incident_id"], hit["status"], hit["assigned_to"]) == ("INC-1", "Resolved", "amy")
+
+    # a hit deleted by another process since is skipped
+    with db_manager_cls() as db:
+        db.cursor().execute("DELETE FROM cyber_incidents WHERE incident_id = 'INC-1'")
+        db.commit()
+    assert index.query("worm", k=5) == []
+
+
+def test_events_during_a_build_are_applied_after_it():
+    index = IncidentSimilarityIndex()
+
+    def rows():
+        yield incident("INC-1", "malware")
+        # a write published while the build is still reading
+        index.apply_event("cyber_incidents", "insert", "INC-2", incident("INC-2", "malware dropper"))
+
+    index.build(rows())
+    assert sorted(found(index, "malware")) == ["INC-1", "INC-2"]
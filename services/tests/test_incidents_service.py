@@ -0,0 +1,20 @@
+# services/tests/test_incidents_service.py
+
+import ai_helper
+from DB.crud import create_incident
+from services.incidents_service import IncidentService
+
+
+def test_triage_only_sends_open_incidents(db_manager_cls, monkeypatch):
+    with db_manager_cls() as db:
+        create_incident(db, "INC-1", "Malware", "High", "Open", "2024-01-01", None, "amy", "worm outbreak")
+        create_incident(db, "INC-2", "Phishing", "Low", "Resolved", "2024-01-02", "2024-01-03", "bob", "fake invoice")
+        create_incident(db, "INC-3", "DDoS", "Medium", "In Progress", "2024-01-04", None, "amy", "traffic spike")
+        create_incident(db, "INC-4", "Malware", "Low", "Closed", "2024-01-05", "2024-01-06", "bob", "adware")
+    sent = []
+    monkeypatch.setattr(ai_helper, "triage_incidents", lambda incidents, **kwargs: sent.extend(incidents) or [])
+
+    IncidentService(db_manager_cls).triage_open_incidents()
+
+    assert sorted(i["incident_id"] for i in sent) == ["INC-1", "INC-3"]
+    assert {i["status"] for i in sent} == {"Open", "In Progress"}
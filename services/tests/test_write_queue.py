@@ -0,0 +1,98 @@
+# services/tests/test_write_queue.py
+
+import json
+import sqlite3
+import time
+
+import pytest
+
+from DB.crud import key_exists
+from services.write_queue import WriteBehindQueue
+
+# long enough that commands submitted together land in one group
+SLOW_FLUSH_MS = 10_000
+
+
+def incident(incident_id, reported_at="2024-01-01"):
+    return {
+        "incident_id": incident_id, "incident_type": "Phishing", "severity": "High", "status": "Open",
+        "reported_at": reported_at, "resolved_at": None, "assigned_to": "amy", "description": "x",
+    }
+
+
+def journal_lines(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_a_failing_command_only_rolls_back_itself(db_manager_cls, tmp_path):
+    queue = WriteBehindQueue(db_manager_cls, flush_ms=SLOW_FLUSH_MS, max_batch=2, journal_path=tmp_path / "j.jsonl")
+    good = queue.submit("incidents", "create_incident", incident("INC-1"))
+    bad = queue.submit("incidents", "create_incident", incident("INC-2", reported_at="not a date"))
+
+    assert good.result(timeout=5).id > 0
+    assert isinstance(bad.exception(timeout=5), ValueError)
+    # both are settled: the good one is written, the bad one reported failed
+    assert {"settled": [1, 2]} in journal_lines(tmp_path / "j.jsonl")
+    queue.close()
+
+    with db_manager_cls() as db:
+        assert key_exists(db, "cyber_incidents", "INC-1")
+        assert not key_exists(db, "cyber_incidents", "INC-2")
+    assert not (tmp_path / "j.jsonl").exists()
+
+
+def test_a_failed_commit_is_not_applied_after_a_restart(db_manager_cls, tmp_path):
+    class FailingCommit(db_manager_cls):
+        def commit(self):
+            raise sqlite3.OperationalError("disk I/O error")
+
+    journal = tmp_path / "j.jsonl"
+    queue = WriteBehindQueue(FailingCommit, journal_path=journal)
+    future = queue.submit("incidents", "create_incident", incident("INC-1"))
+    assert isinstance(future.exception(timeout=5), sqlite3.OperationalError)
+    queue.close()
+
+    # the user was told the write failed: the next start must not apply it
+    queue = WriteBehindQueue(db_manager_cls, journal_path=journal)
+    assert queue.stats["replayed"] == 0
+    queue.close()
+    with db_manager_cls() as db:
+        assert not key_exists(db, "cyber_incidents", "INC-1")
+
+
+def test_commands_of_an_unfinished_group_are_replayed(db_manager_cls, tmp_path):
+    # what a crash leaves behind: journaled commands without a settled marker
+    journal = tmp_path / "j.jsonl"
+    entries = [
+        {"seq": 1, "domain": "incidents", "name": "create_incident", "kwargs": incident("INC-1")},
+        {"seq": 2, "domain": "incidents", "name": "create_incident", "kwargs": incident("INC-2")},
+        {"settled": [1]},
+    ]
+    journal.write_text("".join(json.dumps(e) + "\n" for e in entries) + '{"seq": 3, "dom', encoding="utf-8")
+
+    queue = WriteBehindQueue(db_manager_cls, journal_path=journal)
+    assert queue.stats["replayed"] == 1
+    queue.close()
+    with db_manager_cls() as db:
+        assert not key_exists(db, "cyber_incidents", "INC-1")
+        assert key_exists(db, "cyber_incidents", "INC-2")
+
+
+def test_waiting_for_a_session_ignores_other_sessions(db_manager_cls, tmp_path):
+    queue = WriteBehindQueue(db_manager_cls, flush_ms=SLOW_FLUSH_MS, journal_path=tmp_path / "j.jsonl")
+    future = queue.submit("incidents", "create_incident", incident("INC-1"), session="a")
+
+    queue.wait_for_session("b", timeout=5)
+    assert not future.done()
+
+    started = time.monotonic()
+    queue.wait_for_session("a", timeout=5)
+    assert future.done() and time.monotonic() - started < SLOW_FLUSH_MS / 1000
+    queue.close()
+
+
+def test_unknown_commands_are_refused(db_manager_cls, tmp_path):
+    queue = WriteBehindQueue(db_manager_cls, journal_path=None)
+    with pytest.raises(ValueError):
+        queue.submit("incidents", "drop_everything", {})
+    queue.close()
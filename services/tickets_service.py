@@ -1,32 +1,123 @@
 # services/tickets_service.py
 
+from concurrent.futures import Future
 from typing import List, Any
 
+import metrics
 from DB.db import DatabaseManager
+from DB.cdc import Delta, current_seq, fetch_delta
 from DB.crud import (
     get_all_tickets,
-    create_ticket,
-    update_ticket_status,
-    delete_ticket,
+    count_rows,
+    key_exists,
+    get_rows_page,
+    iter_rows,
+    TABLE_COLUMNS,
 )
+from services.write_queue import get_write_queue, run_command
+from services.export import DEFAULT_CHUNK_SIZE, ExportResult, export_dir, export_filename, export_rows
 
 
+@metrics.instrument("tickets")
 class TicketService:
     """
     Business logic for IT support tickets (it_tickets table).
     """
 
-    def __init__(self, db_manager_cls=DatabaseManager):
+    # columns matched by the free-text search box
+    SEARCH_COLUMNS = ()
+
+    # database file the table lives in (see DB.db.DOMAIN_TABLES)
+    DOMAIN = "tickets"
+
+    def __init__(self, db_manager_cls=DatabaseManager, write_queue=None, session: str | None = None):
         self._db_manager_cls = db_manager_cls
+        # write-behind queue (services/write_queue.py), None for direct writes
+        self._write_queue = write_queue if write_queue is not None else get_write_queue()
+        self._session = session
 
     def _get_db(self):
-        return self._db_manager_cls()
+        if self._write_queue is not None:
+            # read-your-writes: this session's queued commands land first
+            self._write_queue.wait_for_session(self._session)
+        return self._db_manager_cls(domain=self.DOMAIN)
+
+    def _write(self, command: str, kwargs, event) -> Future | None:
+        return run_command(
+            self._db_manager_cls, self.DOMAIN, command, kwargs, event, self._write_queue, self._session
+        )
 
     def list_tickets(self) -> List[Any]:
         with self._get_db() as db:
             rows = get_all_tickets(db)
         return rows
 
+    def change_seq(self) -> int:
+        """Current position in the change log (DB/cdc.py) for it_tickets."""
+        with self._get_db() as db:
+            return current_seq(db, "it_tickets")
+
+    def changes_since(self, seq: int) -> Delta:
+        """
+        Rows inserted or updated and keys deleted since change-log
+        position `seq`, by any writer (this app, the ingest, other
+        processes). Delta.reset means the log was compacted past `seq`.
+        """
+        with self._get_db() as db:
+            return fetch_delta(db, "it_tickets", seq)
+
+    def ticket_exists(self, ticket_id: str) -> bool:
+        with self._get_db() as db:
+            return key_exists(db, "it_tickets", ticket_id)
+
+    def count_tickets(self, filters=None, search: str | None = None) -> int:
+        with self._get_db() as db:
+            return count_rows(db, "it_tickets", filters, search, self.SEARCH_COLUMNS)
+
+    def page_tickets(
+        self,
+        filters=None,
+        search: str | None = None,
+        columns: List[str] | None = None,
+        order_by: str = "id",
+        descending: bool = False,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> List[Any]:
+        with self._get_db() as db:
+            return get_rows_page(
+                db,
+                "it_tickets",
+                filters,
+                search,
+                self.SEARCH_COLUMNS,
+                columns=columns,
+                order_by=order_by,
+                descending=descending,
+                limit=limit,
+                offset=offset,
+            )
+
+    def export_tickets(
+        self,
+        fmt: str = "csv",
+        filters=None,
+        search: str | None = None,
+        compress: bool = False,
+        path=None,
+        progress=None,
+        chunk_size: int = DEFAULT_CHUNK_SIZE,
+    ) -> ExportResult:
+        """
+        Stream the tickets matching the dashboard filters to a CSV or
+        Parquet file, chunk_size rows at a time.
+        """
+        path = path or export_dir() / export_filename("tickets", fmt, compress)
+        with self._get_db() as db:
+            total = count_rows(db, "it_tickets", filters, search, self.SEARCH_COLUMNS)
+            chunks = iter_rows(db, "it_tickets", filters, search, self.SEARCH_COLUMNS, chunk_size=chunk_size)
+            return export_rows(chunks, TABLE_COLUMNS["it_tickets"], path, fmt, compress, total, progress)
+
     def create_ticket(
         self,
         ticket_id: str,
@@ -36,23 +127,28 @@ class TicketService:
         opened_at: str,
         closed_at: str | None,
         assigned_to: str,
-    ) -> None:
-        with self._get_db() as db:
-            create_ticket(
-                db,
-                ticket_id=ticket_id,
-                category=category,
-                priority=priority,
-                status=status,
-                opened_at=opened_at,
-                closed_at=closed_at,
-                assigned_to=assigned_to,
-            )
+    ) -> Future | None:
+        values = {
+            "ticket_id": ticket_id,
+            "category": category,
+            "priority": priority,
+            "status": status,
+            "opened_at": opened_at,
+            "closed_at": closed_at,
+            "assigned_to": assigned_to,
+        }
+        return self._write("create_ticket", values, ("it_tickets", "insert", ticket_id, values))
 
-    def change_status(self, ticket_id: str, new_status: str) -> None:
-        with self._get_db() as db:
-            update_ticket_status(db, ticket_id, new_status)
+    def change_status(self, ticket_id: str, new_status: str) -> Future | None:
+        return self._write(
+            "update_ticket_status",
+            {"ticket_id": ticket_id, "new_status": new_status},
+            ("it_tickets", "update", ticket_id, {"status": new_status}),
+        )
 
-    def remove_ticket(self, ticket_id: str) -> None:
-        with self._get_db() as db:
-            delete_ticket(db, ticket_id)
+    def remove_ticket(self, ticket_id: str) -> Future | None:
+        return self._write(
+            "delete_ticket",
+            {"ticket_id": ticket_id},
+            ("it_tickets", "delete", ticket_id, None),
+        )
@@ -2,22 +2,27 @@
 
 from typing import Optional, Dict, Any
 
+import metrics
 from DB.db import DatabaseManager
 from DB.crud import insert_user, get_user_by_username
 
 
+@metrics.instrument("users")
 class UserService:
     """
     Encapsulates all user-related operations.
     The Streamlit UI calls this, instead of working with the DB directly.
     """
 
+    # database file the users table lives in (see DB.db.DOMAIN_TABLES)
+    DOMAIN = "users"
+
     def __init__(self, db_manager_cls=DatabaseManager):
         self._db_manager_cls = db_manager_cls
 
     def _get_db(self):
         # Tiny helper so we can override db manager in tests if needed
-        return self._db_manager_cls()
+        return self._db_manager_cls(domain=self.DOMAIN)
 
     def find_user(self, username: str) -> Optional[Dict[str, Any]]:
         """
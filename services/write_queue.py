@@ -0,0 +1,366 @@
+# services/write_queue.py
+
+"""
+Optional write-behind mode for the service commands.
+
+By default every command (create_ticket, change_status, change_owner, ...)
+runs in its own transaction, and each commit waits for the disk to sync.
+With WRITE_BEHIND=1 the commands are queued instead and a background
+thread applies them in group commits: one transaction per database file
+every WRITE_BEHIND_FLUSH_MS milliseconds, or as soon as
+WRITE_BEHIND_MAX_BATCH commands are waiting. A whole group then costs a
+single sync.
+
+- Durable: each command is appended to a journal file before it is
+  queued, and the journal is fsynced before each group is applied.
+  Commands whose group the process never finished (it crashed or was
+  killed) stay in the journal and are applied again on the next start.
+  Every command is an upsert, an update or a delete by business key, so
+  replaying one is harmless.
+- Acknowledged: submit() returns a concurrent.futures.Future. It resolves
+  once the command's group has committed and its event has been
+  published; it holds the crud.Upserted result for creates, or the
+  exception. A command whose future holds an exception was not written
+  and never will be: when a group's commit fails, its commands are
+  settled as failed rather than left for replay, so a write the user was
+  told had failed can't land later (e.g. after a delete they made since).
+- Isolated: each command runs under its own SAVEPOINT, so one failing
+  command doesn't take its group down with it.
+- Read-your-writes: services wait for their session's pending commands
+  (wait_for_session) before they read; only their own session's, so a
+  slow group elsewhere doesn't hold up every reader.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from DB.db import DATA_DIR, DatabaseManager
+from DB import crud
+from services import events
+
+WRITE_BEHIND = os.getenv("WRITE_BEHIND", "0").lower() in ("1", "true", "yes", "on")
+FLUSH_MS = float(os.getenv("WRITE_BEHIND_FLUSH_MS", "50"))
+MAX_BATCH = int(os.getenv("WRITE_BEHIND_MAX_BATCH", "200"))
+JOURNAL_PATH = Path(os.getenv("WRITE_BEHIND_JOURNAL") or DATA_DIR / "write_behind.jsonl")
+JOURNAL_ROTATE_BYTES = 1024 * 1024
+
+# commands that may be queued: name -> DB.crud function(db, **kwargs)
+COMMANDS = {
+    name: getattr(crud, name)
+    for name in (
+        "create_incident", "update_incident_status", "delete_incident",
+        "create_ticket", "update_ticket_status", "delete_ticket",
+        "create_dataset", "update_dataset_owner", "delete_dataset",
+    )
+}
+
+# (table, op, key, values) published once the command has committed
+Event = Tuple[str, str, Any, Optional[Dict[str, Any]]]
+
+
+class _Command:
+    __slots__ = ("seq", "domain", "name", "kwargs", "event", "session", "future")
+
+    def __init__(self, seq, domain, name, kwargs, event, session):
+        self.seq = seq
+        self.domain = domain
+        self.name = name
+        self.kwargs = kwargs
+        self.event = event
+        self.session = session
+        self.future = Future()
+
+
+def _publish(event: Optional[Event], result) -> None:
+    if event is None:
+        return
+    table, op, key, values = event
+    if op == "insert" and isinstance(result, crud.Upserted):
+        if result.archived:
+            # the key was archived: the archived row got the write and
+            # nothing was inserted into the hot table
+            op = "archive"
+        if values is not None:
+            values = {**values, "id": result.id}
+    events.publish(table, op, key, values)
+
+
+def run_command(db_manager_cls, domain: str, name: str, kwargs: Dict[str, Any], event: Optional[Event] = None,
+                queue: Optional["WriteBehindQueue"] = None, session: Optional[str] = None) -> Optional[Future]:
+    """
+    Run one service command: straight away in its own transaction, or,
+    when a queue is given, through write-behind. Returns the queue's
+    Future, or None for a direct write.
+    """
+    if queue is not None:
+        return queue.submit(domain, name, kwargs, event, session)
+    with db_manager_cls(domain=domain) as db:
+        result = COMMANDS[name](db, **kwargs)
+    _publish(event, result)
+    return None
+
+
+class WriteBehindQueue:
+    def __init__(self, db_manager_cls=DatabaseManager, flush_ms: float = FLUSH_MS, max_batch: int = MAX_BATCH,
+                 journal_path: Optional[Path] = JOURNAL_PATH):
+        self._db_manager_cls = db_manager_cls
+        self.flush_s = flush_ms / 1000
+        self.max_batch = max_batch
+        self.journal_path = Path(journal_path) if journal_path else None
+        self._queue: List[_Command] = []
+        self._first_at = 0.0
+        self._flush_now = False
+        self._closed = False
+        self._cond = threading.Condition()
+        self._seq = 0
+        self._by_session: Dict[Optional[str], List[Future]] = {}
+        # journaled commands whose group hasn't finished: seq -> journal entry
+        self._unsettled: Dict[int, dict] = {}
+        self._journal = None
+        self.stats = {"commands": 0, "groups": 0, "failed": 0, "replayed": 0, "last_group_ms": 0.0}
+
+        if self.journal_path is not None:
+            self.journal_path.parent.mkdir(parents=True, exist_ok=True)
+            self._replay()
+            self._journal = self.journal_path.open("a", encoding="utf-8")
+
+        self._thread = threading.Thread(target=self._run, name="write-behind", daemon=True)
+        self._thread.start()
+
+    # --------- Journal ---------
+
+    def _replay(self) -> None:
+        """Apply journaled commands that never reached a commit, then start a fresh journal."""
+        if not self.journal_path.exists():
+            return
+        pending: Dict[int, dict] = {}
+        with self.journal_path.open(encoding="utf-8") as journal:
+            for line in journal:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from a crash
+                # "committed": journals written before failed commands were settled too
+                settled = entry.get("settled", entry.get("committed"))
+                if settled is not None:
+                    for seq in settled:
+                        pending.pop(seq, None)
+                else:
+                    pending[entry["seq"]] = entry
+
+        for entry in sorted(pending.values(), key=lambda e: e["seq"]):
+            try:
+                with self._db_manager_cls(domain=entry["domain"]) as db:
+                    COMMANDS[entry["name"]](db, **entry["kwargs"])
+                self.stats["replayed"] += 1
+            except Exception as e:
+                print(f"write-behind: could not replay {entry['name']} #{entry['seq']}: {e}")
+        if pending:
+            print(f"write-behind: replayed {self.stats['replayed']} of {len(pending)} unfinished commands")
+        self.journal_path.unlink()
+
+    def _journal_write(self, entry: dict) -> None:
+        if self._journal is None:
+            return
+        # flushed to the OS here; _journal_sync() makes it durable
+        self._journal.write(json.dumps(entry, default=str) + "\n")
+        self._journal.flush()
+
+    def _journal_sync(self) -> None:
+        """fsync the journal: once per group, before the group is applied."""
+        with self._cond:
+            if self._journal is not None:
+                self._journal.flush()
+                os.fsync(self._journal.fileno())
+
+    def _rotate_journal(self) -> None:
+        # start the file over, keeping only what is not settled yet
+        with self._cond:
+            if self._journal is None or self._journal.tell() < JOURNAL_ROTATE_BYTES:
+                return
+            self._journal.seek(0)
+            self._journal.truncate()
+            for seq in sorted(self._unsettled):
+                self._journal.write(json.dumps(self._unsettled[seq], default=str) + "\n")
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+
+    # --------- Submitting ---------
+
+    def submit(self, domain: str, name: str, kwargs: Dict[str, Any], event: Optional[Event] = None,
+               session: Optional[str] = None) -> Future:
+        if name not in COMMANDS:
+            raise ValueError(f"Unknown command {name!r}")
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("write-behind queue is closed")
+            self._seq += 1
+            command = _Command(self._seq, domain, name, kwargs, event, session)
+            entry = {"seq": command.seq, "domain": domain, "name": name, "kwargs": kwargs}
+            self._journal_write(entry)
+            if self._journal is not None:
+                self._unsettled[command.seq] = entry
+            if not self._queue:
+                self._first_at = time.monotonic()
+            self._queue.append(command)
+            self._by_session.setdefault(session, []).append(command.future)
+            self._cond.notify_all()
+        return command.future
+
+    def wait_for_session(self, session: Optional[str], timeout: Optional[float] = None) -> None:
+        """
+        Block until every command the session submitted has committed, so
+        its next read sees them. session=None is a session of its own (the
+        commands submitted without one), not "every session".
+        """
+        with self._cond:
+            futures = list(self._by_session.get(session, []))
+        self._wait(futures, timeout)
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Block until everything queued, by any session, has committed."""
+        with self._cond:
+            futures = [f for pending in self._by_session.values() for f in pending]
+        self._wait(futures, timeout)
+
+    def _wait(self, futures: List[Future], timeout: Optional[float]) -> None:
+        if not futures:
+            return
+        with self._cond:
+            self._flush_now = True
+            self._cond.notify_all()
+        for future in futures:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass  # the writer got the error through its own future
+
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._queue)
+
+    def close(self) -> None:
+        """Commit what is queued and stop the background thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+            # keep unfinished commands for the next start to replay
+            if not self._unsettled:
+                self.journal_path.unlink(missing_ok=True)
+
+    # --------- Group commit ---------
+
+    def _next_group(self) -> List[_Command]:
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            while self._queue and len(self._queue) < self.max_batch and not (self._flush_now or self._closed):
+                remaining = self._first_at + self.flush_s - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            group = self._queue[: self.max_batch]
+            del self._queue[: self.max_batch]
+            if self._queue:
+                self._first_at = time.monotonic()
+            else:
+                self._flush_now = False
+            return group
+
+    def _run(self) -> None:
+        while True:
+            group = self._next_group()
+            if not group:
+                if self._closed:
+                    return
+                continue
+            self._commit_group(group)
+
+    def _commit_group(self, group: List[_Command]) -> None:
+        started = time.perf_counter()
+        self._journal_sync()
+        by_domain: Dict[str, List[_Command]] = {}
+        for command in group:
+            by_domain.setdefault(command.domain, []).append(command)
+
+        outcomes = []  # (command, result, error)
+        commit_failed = False
+        for domain, commands in by_domain.items():
+            results = []
+            try:
+                with self._db_manager_cls(domain=domain) as db:
+                    # explicit BEGIN: the savepoints below must not commit on release
+                    db.conn.execute("BEGIN")
+                    for command in commands:
+                        db.conn.execute("SAVEPOINT command")
+                        try:
+                            result = COMMANDS[command.name](db, **command.kwargs)
+                            db.conn.execute("RELEASE command")
+                            results.append((command, result, None))
+                        except Exception as e:
+                            db.conn.execute("ROLLBACK TO command")
+                            db.conn.execute("RELEASE command")
+                            results.append((command, None, e))
+            except Exception as e:
+                # the commit itself failed: nothing for this domain was
+                # written, and its commands fail with the commit's error
+                results = [(command, None, e) for command in commands]
+                commit_failed = True
+            outcomes.extend(results)
+
+        # every command of the group is settled, written or failed: the
+        # journal must not replay a write whose future reports a failure
+        settled = [command.seq for command in group]
+        with self._cond:
+            self._journal_write({"settled": settled})
+            for seq in settled:
+                self._unsettled.pop(seq, None)
+        if commit_failed:
+            # durable before the failure is reported
+            self._journal_sync()
+        self._rotate_journal()
+        self.stats["groups"] += 1
+        self.stats["commands"] += len(group)
+        self.stats["last_group_ms"] = round((time.perf_counter() - started) * 1000, 2)
+
+        for command, result, error in outcomes:
+            if error is None:
+                _publish(command.event, result)
+            else:
+                self.stats["failed"] += 1
+            with self._cond:
+                pending = self._by_session.get(command.session, [])
+                if command.future in pending:
+                    pending.remove(command.future)
+                if not pending:
+                    self._by_session.pop(command.session, None)
+            if error is None:
+                command.future.set_result(result)
+            else:
+                command.future.set_exception(error)
+
+
+_queue: Optional[WriteBehindQueue] = None
+_queue_lock = threading.Lock()
+
+
+def get_write_queue() -> Optional[WriteBehindQueue]:
+    """The process-wide queue when WRITE_BEHIND is on, otherwise None."""
+    global _queue
+    if not WRITE_BEHIND:
+        return None
+    with _queue_lock:
+        if _queue is None:
+            _queue = WriteBehindQueue()
+        return _queue
@@ -0,0 +1,38 @@
+# tests/test_ai_helper.py
+
+from collections import OrderedDict
+
+import ai_helper
+
+
+def test_triage_cache_drops_least_recently_used(monkeypatch):
+    monkeypatch.setattr(ai_helper, "_TRIAGE_CACHE", OrderedDict())
+    monkeypatch.setattr(ai_helper, "TRIAGE_CACHE_SIZE", 2)
+
+    ai_helper._cache_put("a", {"category": "A"})
+    ai_helper._cache_put("b", {"category": "B"})
+    assert ai_helper._cache_get("a") == {"category": "A"}  # "b" is now the oldest
+    ai_helper._cache_put("c", {"category": "C"})
+
+    assert ai_helper._cache_get("b") is None
+    assert list(ai_helper._TRIAGE_CACHE) == ["a", "c"]
+
+
+def test_triage_runs_share_one_rate_limiter(monkeypatch):
+    monkeypatch.setattr(ai_helper, "_TRIAGE_CACHE", OrderedDict())
+    monkeypatch.setattr(ai_helper, "_load_env", lambda: None)
+    monkeypatch.setenv("OPENROUTER_API_KEY", "test-key")
+    limiters = []
+
+    def fake_batch(api_key, batch, limiter, trace=None):
+        limiters.append(limiter)
+        return {}
+
+    monkeypatch.setattr(ai_helper, "_triage_batch", fake_batch)
+    incident = {"incident_id": "INC-1", "incident_type": "Phishing", "severity": "High",
+                "status": "Open", "description": "fake invoice email"}
+    ai_helper.triage_incidents([incident], requests_per_minute=30)
+    ai_helper.triage_incidents([{**incident, "incident_id": "INC-2"}], requests_per_minute=30)
+
+    assert len(limiters) == 2
+    assert limiters[0] is limiters[1] is ai_helper._TRIAGE_LIMITER
@@ -0,0 +1,63 @@
+# tests/test_metrics.py
+
+import metrics
+from metrics import Counter, Gauge, Histogram
+
+
+def test_function_gauge_swaps_in_a_full_reading():
+    gauge = Gauge("test_pool_connections", "Pooled connections.", ("state",))
+    seen_while_reading = []
+    readings = iter([{"idle": 2, "in_use": 1}, {"idle": 0, "in_use": 3}])
+
+    def read():
+        for state, value in next(readings).items():
+            # what a concurrent scrape would see half way through
+            seen_while_reading.append(dict(gauge._series))
+            yield {"state": state}, value
+
+    gauge.set_function(read)
+    assert gauge.values() == {("idle",): 2, ("in_use",): 1}
+    assert gauge.values() == {("idle",): 0, ("in_use",): 3}
+    assert seen_while_reading[2:] == [{("idle",): 2, ("in_use",): 1}] * 2
+
+
+def test_counter_exposition_format():
+    calls = Counter("test_calls_total", "Calls.\nPer method.", ("method",))
+    calls.inc(method="list")
+    calls.inc(2.5, method='say "hi"')
+
+    assert calls.render().splitlines() == [
+        "# HELP test_calls_total Calls.\\nPer method.",
+        "# TYPE test_calls_total counter",
+        'test_calls_total{method="list"} 1',
+        'test_calls_total{method="say \\"hi\\""} 2.5',
+    ]
+
+
+def test_histogram_buckets_are_cumulative():
+    latency = Histogram("test_latency_seconds", "Latency.", ("method",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        latency.observe(value, method="get")
+
+    assert latency.samples() == [
+        'test_latency_seconds_bucket{method="get",le="0.1"} 2',
+        'test_latency_seconds_bucket{method="get",le="1"} 3',
+        'test_latency_seconds_bucket{method="get",le="+Inf"} 4',
+        'test_latency_seconds_sum{method="get"} 3.65',
+        'test_latency_seconds_count{method="get"} 4',
+    ]
+
+
+def test_series_past_the_limit_fold_into_other():
+    calls = Counter("test_limited_total", "Calls.", ("user",), max_series=2)
+    for user in ("amy", "bob", "cat", "dan"):
+        calls.inc(user=user)
+
+    assert calls.values() == {("amy",): 1, ("bob",): 1, ("other",): 2}
+    assert metrics.SERIES_OVERFLOW.values()[("test_limited_total",)] == 2
+
+
+def test_render_ends_with_a_newline():
+    text = metrics.render()
+    assert text.endswith("\n")
+    assert "# TYPE app_service_calls_total counter" in text
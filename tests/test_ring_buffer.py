@@ -0,0 +1,32 @@
+# tests/test_ring_buffer.py
+
+from dataclasses import dataclass
+
+from ring_buffer import RecordBuffer, percentile
+
+
+def test_percentile_is_nearest_rank():
+    assert percentile(list(range(1, 11)), 50) == 5
+    assert percentile(list(range(1, 101)), 95) == 95
+    assert percentile(list(range(1, 101)), 99) == 99
+    assert percentile(list(range(1, 101)), 100) == 100
+    assert percentile([7, 3], 0) == 3
+    assert percentile([], 95) == 0.0
+
+
+@dataclass
+class Call:
+    model: str
+    ms: float
+    at: float
+
+
+def test_summarize_groups_and_windows():
+    buffer = RecordBuffer(3, time_field="at")
+    for ms, at in ((10, 0), (20, 1e12), (30, 1e12), (40, 1e12)):
+        buffer.append(Call("m", ms, at))
+
+    # the oldest record fell out of the ring
+    [row] = buffer.summarize(("model",), "ms")
+    assert row == {"model": "m", "calls": 3, "p50_ms": 30, "p95_ms": 40, "max_ms": 40, "total_ms": 90}
+    assert len(buffer.snapshot(window_s=60)) == 3